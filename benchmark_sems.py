@@ -0,0 +1,334 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Offline throughput benchmarks for the exporter and the merger.
+
+Usage
+-----
+    # Exporter against the local mock portal: days/s, request p50/p99, retries
+    python benchmark_sems.py exporter --days 120 --workers 1,4,8 --latency-ms 80 --error-rate 0.02
+
+    # Async engine against a portal that throttles beyond 12 concurrent calls
+    python benchmark_sems.py exporter --engine async --days 365 --workers 2 --capacity 12
+
+    # Merger over a synthetic archive: rows/s and peak RSS (per-day JSON or gz bundles)
+    python benchmark_sems.py merge --days 730 --jobs 1,4 --archive gz
+
+Each run executes in a fresh child process so module-level configuration and
+peak RSS are measured per run. `--json results.json` keeps the numbers for
+comparing branches.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from sems_archive import CODECS, RawArchive
+from sems_mock_server import MockConfig, MockSemsServer, station_ids, synthetic_payload
+
+HERE = Path(__file__).resolve().parent
+RESULT_ENV = "SEMS_BENCH_RESULT"
+
+
+def _percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def _int_list(spec: str) -> List[int]:
+    return [int(p) for p in spec.split(",") if p.strip()]
+
+
+def _run_child(mode: str, env: Dict[str, str], argv: Sequence[str] = ()) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as fh:
+        result_path = fh.name
+    try:
+        proc = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), mode, *argv],
+            env={**os.environ, **env, RESULT_ENV: result_path},
+            cwd=str(HERE),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{mode} failed ({proc.returncode}): {proc.stderr.strip()[-2000:]}")
+        return json.loads(Path(result_path).read_text(encoding="utf-8"))
+    finally:
+        os.unlink(result_path)
+
+
+def _write_result(obj: dict) -> None:
+    Path(os.environ[RESULT_ENV]).write_text(json.dumps(obj), encoding="utf-8")
+
+
+def _peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+    return {
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1),
+        "peak_rss_children_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1),
+    }
+
+
+# ========= Child processes =========
+def _child_exporter() -> None:
+    """Import the exporter with the mock env already set, instrument it and run main()."""
+    import sems_plant_power_v2 as exporter
+
+    latencies: List[float] = []
+    retries: List[int] = []
+    logins = [0]
+    lock = threading.Lock()
+
+    original_post = exporter.SemsClient.post
+
+    def timed_post(self, url, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return original_post(self, url, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    original_fetch = exporter.fetch_day
+
+    def counted_fetch(*args, **kwargs):
+        result = original_fetch(*args, **kwargs)
+        with lock:
+            retries.append(result[-1])
+        return result
+
+    original_login = exporter.TokenManager._login
+
+    def counted_login(self):
+        logins[0] += 1
+        return original_login(self)
+
+    exporter.SemsClient.post = timed_post
+    exporter.fetch_day = counted_fetch
+    exporter.TokenManager._login = counted_login
+
+    try:
+        import httpx
+    except ModuleNotFoundError:
+        httpx = None
+    if httpx is not None:
+        original_apost = httpx.AsyncClient.post
+
+        async def timed_apost(self, url, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await original_apost(self, url, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - t0)
+
+        original_afetch = exporter.fetch_day_async
+
+        async def counted_afetch(*args, **kwargs):
+            result = await original_afetch(*args, **kwargs)
+            retries.append(result[-1])
+            return result
+
+        httpx.AsyncClient.post = timed_apost
+        exporter.fetch_day_async = counted_afetch
+
+    t0 = time.perf_counter()
+    exporter.main([])
+    wall = time.perf_counter() - t0
+
+    _write_result(
+        {
+            "wall_s": wall,
+            "plant_days": len(retries),
+            "requests": len(latencies),
+            "latency_p50_ms": (_percentile(latencies, 50) or 0) * 1000,
+            "latency_p99_ms": (_percentile(latencies, 99) or 0) * 1000,
+            "retries": sum(retries),
+            "logins": logins[0],
+            **_peak_rss_mb(),
+        }
+    )
+
+
+def _child_merge(argv: Sequence[str]) -> None:
+    import merge_sems_json_to_parquet as merger
+    import pyarrow.parquet as pq
+
+    sys.argv = ["merge_sems_json_to_parquet.py", *argv]
+    t0 = time.perf_counter()
+    merger.main()
+    wall = time.perf_counter() - t0
+
+    args = merger.parse_args()
+    src = Path(args.source)
+    output = src / args.output if Path(args.output).name == args.output else Path(args.output)
+    rows = pq.ParquetFile(output).metadata.num_rows
+    _write_result({"wall_s": wall, "rows": rows, **_peak_rss_mb()})
+
+
+# ========= Benchmarks =========
+def bench_exporter(args: argparse.Namespace) -> List[dict]:
+    end = dt.date.today() - dt.timedelta(days=2)  # complete days only
+    start = end - dt.timedelta(days=args.days - 1)
+    results = []
+    for workers in _int_list(args.workers):
+        config = MockConfig(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+            auth_error_rate=args.auth_error_rate,
+            token_ttl=args.token_ttl,
+            stations=args.stations,
+            capacity=args.capacity,
+            seed=args.seed,
+        )
+        server = MockSemsServer(config=config)
+        server.start_background()
+        try:
+            with tempfile.TemporaryDirectory(prefix="sems-bench-") as out:
+                env = {
+                    **server.exporter_env(),
+                    "SEMS_ACCOUNT": "bench@example.com",
+                    "SEMS_PASSWORD": "bench",
+                    "SEMS_STATION_ID": ",".join(station_ids(args.stations)),
+                    "SEMS_START": start.isoformat(),
+                    "SEMS_END": end.isoformat(),
+                    "SEMS_OUT": out,
+                    "SEMS_WORKERS": str(workers),
+                    "SEMS_ENGINE": args.engine,
+                    "SEMS_MAX_INFLIGHT": str(args.max_inflight),
+                    "SEMS_RETRY_BASE": str(args.retry_base),
+                    "SEMS_RESYNC": "1",
+                }
+                if args.rate is not None:
+                    env["SEMS_RATE_PER_SEC"] = str(args.rate)
+                elif args.engine == "threads":
+                    env["SEMS_RATE_PER_SEC"] = "0"
+                res = _run_child("_exporter", env)
+        finally:
+            server.shutdown()
+            server.server_close()
+        res.update(
+            bench="exporter",
+            engine=args.engine,
+            workers=workers,
+            days_per_s=res["plant_days"] / res["wall_s"] if res["wall_s"] else 0.0,
+            server=dict(server.state.counters),
+        )
+        results.append(res)
+        print(
+            f"  {args.engine} workers={workers:<3} {res['plant_days']:>5} plant-days in {res['wall_s']:6.2f}s "
+            f"→ {res['days_per_s']:7.1f} days/s | p50 {res['latency_p50_ms']:6.1f} ms "
+            f"p99 {res['latency_p99_ms']:6.1f} ms | retries {res['retries']} logins {res['logins']}"
+            f" | server peak in-flight {res['server'].get('peak_inflight', 0)}"
+            f", 429s {res['server'].get('throttled', 0)}"
+        )
+    return results
+
+
+def bench_merge(args: argparse.Namespace) -> List[dict]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="sems-bench-merge-") as src:
+        first = dt.date.today() - dt.timedelta(days=args.days + 1)
+        archive = RawArchive(Path(src), args.archive) if args.archive != "json" else None
+        for i in range(args.days):
+            day = first + dt.timedelta(days=i)
+            payload = synthetic_payload(station_ids(1)[0], day)
+            if archive is not None:
+                archive.put(day, payload)
+                continue
+            # Same on-disk shape as the exporter's save_json.
+            Path(src, f"raw_v2_{day}.json").write_text(
+                json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8"
+            )
+        disk = sum(p.stat().st_size for p in Path(src).iterdir())
+        print(f"  {args.days} days stored as {args.archive}: {disk / 1e6:.1f} MB")
+        for jobs in _int_list(args.jobs):
+            res = _run_child("_merge", {}, [src, "-o", "bench.parquet", "-j", str(jobs), "--no-rollups"])
+            res.update(bench="merge", jobs=jobs, files=args.days, archive=args.archive, source_bytes=disk,
+                       rows_per_s=res["rows"] / res["wall_s"] if res["wall_s"] else 0.0)
+            results.append(res)
+            print(
+                f"  merge jobs={jobs:<3} {res['rows']:>9,} rows from {args.days} days in {res['wall_s']:6.2f}s "
+                f"→ {res['rows_per_s']:10,.0f} rows/s | peak RSS {res['peak_rss_mb']} MB "
+                f"(workers {res['peak_rss_children_mb']} MB)"
+            )
+    return results
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline SEMS exporter/merger benchmarks.")
+    parser.add_argument("--json", type=Path, help="Write all results to this JSON file")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    exp = sub.add_parser("exporter", help="Run sems_plant_power_v2.py against the mock portal")
+    exp.add_argument("--days", type=int, default=60)
+    exp.add_argument("--stations", type=int, default=1)
+    exp.add_argument("--workers", default="1,4",
+                     help="Comma-separated SEMS_WORKERS values (the async engine's starting limit)")
+    exp.add_argument("--engine", choices=("threads", "async"), default="threads", help="SEMS_ENGINE")
+    exp.add_argument("--max-inflight", type=int, default=32, help="SEMS_MAX_INFLIGHT for the async engine")
+    exp.add_argument("--rate", type=float, default=None,
+                     help="SEMS_RATE_PER_SEC (default: unlimited; 0 = unlimited)")
+    exp.add_argument("--retry-base", type=float, default=0.5, help="SEMS_RETRY_BASE seconds")
+    exp.add_argument("--latency-ms", type=float, default=50.0)
+    exp.add_argument("--jitter-ms", type=float, default=20.0)
+    exp.add_argument("--error-rate", type=float, default=0.0)
+    exp.add_argument("--auth-error-rate", type=float, default=0.0)
+    exp.add_argument("--token-ttl", type=float, default=0.0)
+    exp.add_argument("--capacity", type=int, default=0,
+                     help="Mock portal concurrency before it answers 429 (0 = unlimited)")
+    exp.add_argument("--seed", type=int, default=0)
+
+    mrg = sub.add_parser("merge", help="Run merge_sems_json_to_parquet.py over a synthetic archive")
+    mrg.add_argument("--days", type=int, default=365)
+    mrg.add_argument("--jobs", default="1,4", help="Comma-separated --jobs values")
+    mrg.add_argument("--archive", choices=("json",) + CODECS, default="json",
+                     help="Store the synthetic days as per-day JSON or monthly bundles")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv and argv[0] == "_exporter":
+        _child_exporter()
+        return
+    if argv and argv[0] == "_merge":
+        _child_merge(argv[1:])
+        return
+
+    args = parse_args(argv)
+    print(f"[*] Benchmark: {args.bench}")
+    results = bench_exporter(args) if args.bench == "exporter" else bench_merge(args)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"[✓] Results → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
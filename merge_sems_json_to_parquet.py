@@ -12,95 +12,739 @@
 
 
 #!/usr/bin/env python3
-"""Merge SEMS raw JSON exports into a single Parquet file."""
+"""Merge SEMS raw JSON exports into Parquet.
+
+Reads per-day `raw_v2_YYYY-MM-DD.json` files and/or the exporter's compressed
+monthly bundles (`raw_v2_YYYY-MM.jsonl.gz|zst`, see sems_archive.py). Points
+land in one table (UTC `period_start`, dictionary-encoded `series`, float32
+`value`, `unit`); the daily `generateData` totals go to a separate
+aggregates table.
+"""
 
 from __future__ import annotations
 
 import argparse
+import datetime as dt
+import hashlib
 import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Iterable, List
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 try:
-    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
 except ModuleNotFoundError as exc:  # pragma: no cover - import guard for convenience
-    pd = None
-    _PANDAS_IMPORT_ERROR = exc
+    pa = pc = pq = None
+    _PYARROW_IMPORT_ERROR = exc
 else:
-    _PANDAS_IMPORT_ERROR = None
+    _PYARROW_IMPORT_ERROR = None
+
+from sems_archive import find_bundles, is_bundle, iter_bundle_raw, load_index
+from sems_metrics import METRICS, PROFILERS, finish as finish_metrics, profiled
+from sems_payload import DayColumns, columns_from_payload, decode_columns, decode_record, flatten_rows
+from sems_payload import loads as json_loads
+
+DEFAULT_ROW_GROUP_SIZE = 256 * 1024
+INGEST_LOG = "_ingested.json"
+POINTS_DIR = "points"
+AGGREGATES_DIR = "aggregates"
+ROLLUPS_DIR = "rollups"
+ROLLUP_VERSION = "_version.json"
+# Intraday point fragments written by sems_live.py; replaced when the full day is converted.
+LIVE_FRAGMENT_PREFIX = "live-"
+# name -> (floor_temporal multiple, unit); buckets are in the portal's local time.
+ROLLUPS = {
+    "15min": (15, "minute"),
+    "hourly": (1, "hour"),
+    "daily": (1, "day"),
+    "monthly": (1, "month"),
+}
+POINT_HOURS = 5 / 60  # cadence of the chart `xy` points, used to turn W into kWh
+DEFAULT_PLANT = "default"
+DEFAULT_TZ_OFFSET = "+08:00"  # same fallback as the exporter's SEMS_TZ_OFFSET
+# Bump when the written layout/schema changes; older datasets are re-ingested.
+SCHEMA_VERSION = 2
 
 
 def flatten_payload(payload: dict) -> List[dict]:
-    rows: List[dict] = []
-    data = payload.get("data") or {}
-
-    aggregates = data.get("generateData")
-    if isinstance(aggregates, list):
-        for item in aggregates:
-            key = item.get("key")
-            value = item.get("value")
-            if key is not None and value is not None:
-                rows.append({"series": f"aggregate:{key}", "timestamp": "daily", "value": value})
-
-    lines = data.get("lines")
-    if isinstance(lines, list):
-        for line in lines:
-            line_key = line.get("key") or "line"
-            points = line.get("xy") or []
-            if isinstance(points, list):
-                for point in points:
-                    x = point.get("x")
-                    y = point.get("y")
-                    if x is not None and y is not None:
-                        rows.append({"series": line_key, "timestamp": x, "value": y})
-
-    return rows
-
-
-def iter_payload_rows(files: Iterable[Path]) -> List[dict]:
-    merged: List[dict] = []
-    skipped = 0
+    """Long-format rows (series, timestamp, value), same as the exporter CSV."""
+    return flatten_rows(columns_from_payload(payload))
+
+
+def points_schema():
+    """5-minute points: UTC instants plus the portal's local offset, compact encodings."""
+    return pa.schema(
+        [
+            pa.field("period_start", pa.timestamp("ms", tz="UTC")),
+            pa.field("utc_offset", pa.int16()),  # minutes east of UTC, as requested from the portal
+            pa.field("series", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("value", pa.float32()),
+            pa.field("unit", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("source", pa.dictionary(pa.int32(), pa.string())),
+        ]
+    )
+
+
+def aggregates_schema():
+    """Daily `generateData` totals (e.g. Generation kWh, Income EUR), one row per key and day."""
+    return pa.schema(
+        [
+            pa.field("day", pa.date32()),
+            pa.field("series", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("value", pa.float64()),
+            pa.field("unit", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("source", pa.dictionary(pa.int32(), pa.string())),
+        ]
+    )
+
+
+def parse_utc_offset(offset: str) -> int:
+    """'+08:00' / '-0130' / 'Z' → minutes east of UTC."""
+    offset = offset.strip()
+    if offset in ("", "Z", "z"):
+        return 0
+    sign = -1 if offset[0] == "-" else 1
+    digits = offset.lstrip("+-").replace(":", "")
+    return sign * (int(digits[:2]) * 60 + int(digits[2:4] or 0))
+
+
+def payload_utc_offset(payload: dict, default: int) -> int:
+    """Offset of the request date the portal echoes back in `components.para`."""
+    return para_utc_offset(columns_from_payload(payload).para, default)
+
+
+def para_utc_offset(para: Optional[str], default: int) -> int:
+    """Offset of the request date in a `components.para` string, else `default`."""
+    try:
+        body = json_loads(para) if isinstance(para, str) else {}
+        date = (body.get("model") or body).get("date")
+        offset = dt.datetime.fromisoformat(date).utcoffset()
+    except (TypeError, ValueError, AttributeError):
+        return default
+    return default if offset is None else int(offset.total_seconds() // 60)
+
+
+def _dictionary(indices: List[int], values: List[str]) -> "pa.DictionaryArray":
+    return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(values, pa.string()))
+
+
+def payload_tables(payload: dict, day: dt.date, source: str, utc_offset: int):
+    """Build (points batch, aggregates batch) for one day; either may be None when empty."""
+    return columns_tables(columns_from_payload(payload), day, source, utc_offset)
+
+
+def columns_tables(cols: DayColumns, day: dt.date, source: str, utc_offset: int):
+    """Arrow batches from decoded `DayColumns`; see `payload_tables`."""
+    base_ms = ((day - dt.date(1970, 1, 1)).days * 86400 - utc_offset * 60) * 1000
+    points = None
+    if cols.values:
+        n = len(cols.values)
+        minutes = pa.array(cols.minutes, pa.int64())
+        stamps = pc.add(pc.multiply(minutes, 60_000), base_ms)
+        points = pa.RecordBatch.from_arrays(
+            [
+                stamps.cast(pa.timestamp("ms", tz="UTC")),
+                pa.array([utc_offset] * n, pa.int16()),
+                _dictionary(cols.series, cols.line_keys),
+                pa.array(cols.values, pa.float32()),
+                _dictionary(cols.series, cols.line_units),
+                _dictionary([0] * n, [source]),
+            ],
+            schema=points_schema(),
+        )
+
+    aggs = None
+    if cols.agg_keys:
+        n = len(cols.agg_keys)
+        aggs = pa.RecordBatch.from_arrays(
+            [
+                pa.array([day] * n, pa.date32()),
+                _dictionary(list(range(n)), cols.agg_keys),
+                pa.array(cols.agg_values, pa.float64()),
+                pa.array(cols.agg_units, pa.string()).dictionary_encode(),
+                _dictionary([0] * n, [source]),
+            ],
+            schema=aggregates_schema(),
+        )
+    return points, aggs
+
+
+def file_to_batch(path: Path, tz_offset: str = DEFAULT_TZ_OFFSET):
+    """Parse one raw_v2 file into Arrow batches. Runs inside worker processes.
+
+    Returns (file name, points batch, aggregates batch, decode error message or
+    None); batches are None when the file holds no such rows.
+    """
+    try:
+        with METRICS.timer("file.read"):
+            raw = Path(path).read_bytes()
+        with METRICS.timer("json.parse"):
+            cols = decode_columns(raw)
+    except ValueError as exc:  # json.JSONDecodeError and msgspec decode errors
+        return path.name, None, None, str(exc)
+
+    try:
+        day = dt.date.fromisoformat(path.stem.split("raw_v2_")[-1])
+    except ValueError as exc:
+        return path.name, None, None, f"no day in file name ({exc})"
+
+    return _columns_batch(cols, day, path.name, tz_offset)
+
+
+def _columns_batch(cols: DayColumns, day: dt.date, name: str, tz_offset: str) -> tuple:
+    offset = para_utc_offset(cols.para, parse_utc_offset(tz_offset))
+    with METRICS.timer("arrow.build"):
+        points, aggs = columns_tables(cols, day, name, offset)
+    return name, points, aggs, None
+
+
+def bundle_to_batches(path: Path, tz_offset: str = DEFAULT_TZ_OFFSET) -> List[tuple]:
+    """Parse every live day of a monthly archive bundle. Runs inside worker processes.
+
+    Days are named `raw_v2_YYYY-MM-DD.json` like the per-day files they replace,
+    so `source` values and dataset partitions do not depend on the storage format.
+    """
+    results = []
+    try:
+        for raw in iter_bundle_raw(path):
+            with METRICS.timer("json.parse"):
+                day, cols = decode_record(raw)
+            results.append(_columns_batch(cols, day, f"raw_v2_{day}.json", tz_offset))
+    except Exception as exc:  # corrupt member: zlib/zstd, gzip or JSON errors
+        results.append((path.name, None, None, f"unreadable archive member ({exc})"))
+    return results
+
+
+def source_to_batches(path: Path, tz_offset: str = DEFAULT_TZ_OFFSET) -> List[tuple]:
+    with METRICS.timer("merge.source"):
+        if is_bundle(path):
+            return bundle_to_batches(path, tz_offset)
+        return [file_to_batch(path, tz_offset)]
+
+
+def _source_job(path: Path, tz_offset: str) -> Tuple[List[tuple], dict]:
+    """`source_to_batches` in a worker process, returning that source's stage timings too."""
+    METRICS.reset()
+    results = source_to_batches(path, tz_offset)
+    return results, METRICS.drain()
+
+
+def _job_result(future) -> List[tuple]:
+    with METRICS.timer("merge.wait_workers"):
+        results, timings = future.result()
+    METRICS.merge(timings)
+    return results
+
+
+def iter_source_batches(sources: Iterable[Path], jobs: int = 1,
+                        tz_offset: str = DEFAULT_TZ_OFFSET) -> Iterator[Tuple[Path, List[tuple]]]:
+    """Yield (source, [`file_to_batch`-style results]) in source order, parsing on `jobs` processes.
+
+    Only `jobs * 4` sources (day files or monthly bundles) are in flight at a
+    time, so memory stays bounded no matter how large the archive is.
+    """
+    if jobs <= 1:
+        for path in sources:
+            yield path, source_to_batches(path, tz_offset)
+        return
+
+    window = jobs * 4
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for path in sources:
+            pending.append((path, pool.submit(_source_job, path, tz_offset)))
+            if len(pending) >= window:
+                path, future = pending.popleft()
+                yield path, _job_result(future)
+        while pending:
+            path, future = pending.popleft()
+            yield path, _job_result(future)
+
+
+def iter_file_batches(files: Iterable[Path], jobs: int = 1,
+                      tz_offset: str = DEFAULT_TZ_OFFSET) -> Iterator[tuple]:
+    """Yield one `file_to_batch`-style result per day, in source order."""
+    for _, results in iter_source_batches(files, jobs, tz_offset):
+        yield from results
+
+
+def drop_archived_days(files: Iterable[Path]) -> Tuple[List[Path], int]:
+    """Drop day files whose day is also stored in a bundle of the same folder.
+
+    Bundles win: they are what `sems_archive.py pack` and the exporter's
+    archive mode write, so the day file is the older copy. Returns (kept, dropped).
+    """
+    archived: Dict[Path, set] = {}
+    kept: List[Path] = []
+    dropped = 0
     for path in files:
-        try:
-            payload = json.loads(path.read_text(encoding="utf-8"))
-        except json.JSONDecodeError as exc:
-            print(f"    ! skip {path.name}: {exc}")
-            skipped += 1
+        if is_bundle(path):
+            kept.append(path)
+            continue
+        folder = path.parent
+        if folder not in archived:
+            archived[folder] = {day for bundle in find_bundles(folder)
+                                for day in load_index(bundle)["days"]}
+        if path.stem.split("raw_v2_")[-1] in archived[folder]:
+            dropped += 1
+            continue
+        kept.append(path)
+    return kept, dropped
+
+
+class _BufferedParquet:
+    """ParquetWriter that groups small per-day batches into `row_group_size` row groups."""
+
+    def __init__(self, path: Path, schema, row_group_size: int):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._writer = pq.ParquetWriter(self.tmp_path, schema)
+        self._buffered: List["pa.RecordBatch"] = []
+        self._buffered_rows = 0
+
+    def add(self, batch) -> None:
+        self._buffered.append(batch)
+        self._buffered_rows += batch.num_rows
+        if self._buffered_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buffered:
+            self._writer.write_table(pa.Table.from_batches(self._buffered, self.schema), self.row_group_size)
+            self.rows += self._buffered_rows
+            self._buffered, self._buffered_rows = [], 0
+
+    def commit(self) -> None:
+        """Close and rename into place, or drop the file if nothing was written."""
+        self._flush()
+        self._writer.close()
+        if self.rows:
+            os.replace(self.tmp_path, self.path)
+        else:
+            self.tmp_path.unlink()
+
+    def abort(self) -> None:
+        self._writer.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def aggregates_path(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}_aggregates{output_path.suffix}")
+
+
+def write_parquet(files: Iterable[Path], output_path: Path, *, jobs: int = 1,
+                  row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                  tz_offset: str = DEFAULT_TZ_OFFSET) -> Tuple[int, int]:
+    """Stream every file into `output_path` (points) and `<stem>_aggregates` (daily totals).
+
+    Both are written to temporary files and renamed into place at the end,
+    so a failed merge never leaves a truncated Parquet file behind. Returns
+    (point rows, aggregate rows).
+    """
+    if pa is None:
+        raise RuntimeError(f"pyarrow not available ({_PYARROW_IMPORT_ERROR}). Install pyarrow first.")
+
+    points_out = _BufferedParquet(output_path, points_schema(), row_group_size)
+    aggs_out = _BufferedParquet(aggregates_path(output_path), aggregates_schema(), row_group_size)
+    skipped = 0
+    try:
+        for name, points, aggs, error in iter_file_batches(files, jobs, tz_offset):
+            if error is not None:
+                print(f"    ! skip {name}: {error}")
+                skipped += 1
+                continue
+            with METRICS.timer("parquet.write"):
+                if points is not None:
+                    points_out.add(points)
+                if aggs is not None:
+                    aggs_out.add(aggs)
+    except BaseException:
+        points_out.abort()
+        aggs_out.abort()
+        raise
+
+    with METRICS.timer("parquet.write"):
+        points_out.commit()
+        aggs_out.commit()
+    if skipped:
+        print(f'    • skipped {skipped} files due to JSON decode errors')
+    return points_out.rows, aggs_out.rows
+
+
+def plant_of(path: Path, default: str = DEFAULT_PLANT) -> str:
+    """Plant ID from an exporter `plant=<id>/` folder, else `default`."""
+    parent = path.parent.name
+    return parent.split("=", 1)[1] if parent.startswith("plant=") else default
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_ingest_log(dataset_dir: Path) -> Optional[dict]:
+    """The raw ingest log, or None when missing or unreadable."""
+    try:
+        log = json.loads((dataset_dir / INGEST_LOG).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    return log if isinstance(log, dict) else None
+
+
+def ingest_log_files(dataset_dir: Path) -> Dict[str, dict]:
+    """Per-source fingerprints of a current-schema log, else {}. Never touches the dataset."""
+    log = _read_ingest_log(dataset_dir)
+    if log is None or log.get("schema_version") != SCHEMA_VERSION:
+        return {}
+    return log.get("files", {})
+
+
+def _remove_v1_partitions(dataset_dir: Path, log: dict) -> int:
+    """Delete the `plant=…/month=…/day=…/*.parquet` files a v1 log says it wrote; returns the count."""
+    removed = 0
+    for entry in log.values():
+        rel = entry.get("partition") if isinstance(entry, dict) else None
+        parts = Path(rel).parts if isinstance(rel, str) else ()
+        if (len(parts) != 4 or not parts[3].endswith(".parquet")
+                or [p.split("=", 1)[0] for p in parts[:3]] != ["plant", "month", "day"]):
             continue
+        target = dataset_dir.joinpath(*parts)
+        if target.is_file():
+            target.unlink()
+            removed += 1
+        for parent in (target.parent, target.parent.parent, target.parent.parent.parent):
+            try:
+                parent.rmdir()  # only once empty
+            except OSError:
+                break
+    return removed
+
+
+def _load_ingest_log(dataset_dir: Path) -> Dict[str, dict]:
+    """Ingest log for a merge run; a v1 log's partitions are removed so everything is re-ingested."""
+    path = dataset_dir / INGEST_LOG
+    if not path.exists():
+        return {}
+    log = _read_ingest_log(dataset_dir)
+    if log is None:
+        print(f"    ! {INGEST_LOG} unreadable; re-ingesting everything")
+        return {}
+    if log.get("schema_version") != SCHEMA_VERSION:
+        print(f"    • dataset schema changed (→ v{SCHEMA_VERSION}); re-ingesting everything")
+        if "schema_version" not in log:  # v1 kept partitions at the top level
+            removed = _remove_v1_partitions(dataset_dir, log)
+            if removed:
+                print(f"    • removed {removed} v1 partition file(s)")
+        return {}
+    return log.get("files", {})
+
+
+def _save_ingest_log(dataset_dir: Path, files: Dict[str, dict]) -> None:
+    path = dataset_dir / INGEST_LOG
+    tmp = path.with_name(path.name + ".tmp")
+    log = {"schema_version": SCHEMA_VERSION, "files": files}
+    tmp.write_text(json.dumps(log, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def partition_path(dataset_dir: Path, table: str, plant: str, source: Path) -> Path:
+    """Hive-style location of one source day: <table>/plant=<id>/month=YYYY-MM/day=YYYY-MM-DD/."""
+    day = source.stem.split("raw_v2_")[-1]
+    return (dataset_dir / table / f"plant={plant}" / f"month={day[:7]}" / f"day={day}"
+            / f"{source.stem}.parquet")
+
 
-        rows = flatten_payload(payload)
-        if not rows:
+def _replace_partition(target: Path, table) -> None:
+    if table is None:
+        target.unlink(missing_ok=True)
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, target)
+
+
+def write_dataset(files: Iterable[Path], src_dir: Path, dataset_dir: Path, *, jobs: int = 1,
+                  plant: str = DEFAULT_PLANT,
+                  tz_offset: str = DEFAULT_TZ_OFFSET) -> Tuple[int, int, int]:
+    """Convert only new or changed source files into a day-partitioned dataset.
+
+    Points go to `<dataset>/points/…` and daily totals to `<dataset>/aggregates/…`.
+    Sources are tracked in `<dataset>/_ingested.json` by relative path, mtime,
+    size and SHA-256; a touched-but-identical file is re-fingerprinted without
+    being converted again. A changed monthly bundle re-converts all of its days.
+    Returns (files converted, files unchanged, point rows written).
+    """
+    if pa is None:
+        raise RuntimeError(f"pyarrow not available ({_PYARROW_IMPORT_ERROR}). Install pyarrow first.")
+
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    log = _load_ingest_log(dataset_dir)
+
+    todo: List[Tuple[Path, str, dict]] = []
+    unchanged = 0
+    for path in files:
+        key = path.relative_to(src_dir).as_posix()
+        st = path.stat()
+        fingerprint = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        seen = log.get(key)
+        if seen and seen.get("mtime_ns") == st.st_mtime_ns and seen.get("size") == st.st_size:
+            unchanged += 1
+            continue
+        with METRICS.timer("ingest.hash"):
+            fingerprint["sha256"] = _file_sha256(path)
+        if seen and seen.get("sha256") == fingerprint["sha256"]:
+            log[key] = {**seen, **fingerprint}
+            unchanged += 1
             continue
+        todo.append((path, key, fingerprint))
+
+    converted = 0
+    rows = 0
+    skipped = 0
+    for (path, key, fingerprint), (_, results) in zip(
+        todo, iter_source_batches([t[0] for t in todo], jobs, tz_offset)
+    ):
+        plant_id = plant_of(path, plant)
+        source_rows = 0
+        partitions = []
+        failed = False
+        for name, points, aggs, error in results:
+            if error is not None:
+                print(f"    ! skip {name}: {error}")
+                skipped += 1
+                failed = True
+                continue
+            # Bundle days carry their day file name, so both formats share partitions.
+            points_path = partition_path(dataset_dir, POINTS_DIR, plant_id, Path(name))
+            with METRICS.timer("parquet.write"):
+                _replace_partition(points_path, None if points is None else pa.Table.from_batches([points]))
+                for fragment in points_path.parent.glob(f"{LIVE_FRAGMENT_PREFIX}*.parquet"):
+                    fragment.unlink()
+                # `day` is implied by the partition path, so it is not stored twice.
+                _replace_partition(partition_path(dataset_dir, AGGREGATES_DIR, plant_id, Path(name)),
+                                   None if aggs is None else pa.Table.from_batches([aggs]).drop_columns(["day"]))
+            source_rows += 0 if points is None else points.num_rows
+            partitions.append(points_path.relative_to(dataset_dir).as_posix())
+        rows += source_rows
+        if failed:
+            continue  # not logged, so the source is retried next run
+        entry = {**fingerprint, "rows": source_rows}
+        if is_bundle(path):
+            entry["partitions"] = partitions
+        elif partitions:
+            entry["partition"] = partitions[0]
+        log[key] = entry
+        converted += 1
+        if converted % 500 == 0:
+            _save_ingest_log(dataset_dir, log)
 
-        day = path.stem.split("raw_v2_")[-1]
-        for row in rows:
-            record = dict(row)
-            record["day"] = day
-            record["source"] = path.name
-            merged.append(record)
+    _save_ingest_log(dataset_dir, log)
     if skipped:
         print(f'    • skipped {skipped} files due to JSON decode errors')
-    return merged
+    return converted, unchanged, rows
 
 
-def build_dataframe(rows: List[dict]):
-    if pd is None:
-        raise RuntimeError(f"pandas not available ({_PANDAS_IMPORT_ERROR}). Install pandas and pyarrow first.")
-    if not rows:
-        raise RuntimeError("No rows found in provided JSON files.")
+def dataset_root(path: Path) -> Optional[Path]:
+    """Root of a --dataset directory given the root or its points/ folder; None for files."""
+    if not path.is_dir():
+        return None
+    return path.parent if path.name == POINTS_DIR else path
 
-    frame = pd.DataFrame(rows)
-    frame["day"] = pd.to_datetime(frame["day"], errors="coerce")
-    return frame
 
+def rollup_dir_for(points_path: Path) -> Path:
+    """`<dataset>/rollups/` for a dataset, `<stem>_rollups/` next to a single Parquet file."""
+    root = dataset_root(points_path)
+    if root is not None:
+        return root / ROLLUPS_DIR
+    return points_path.with_name(f"{points_path.stem}_{ROLLUPS_DIR}")
+
+
+def points_fingerprint(points_path: Path) -> str:
+    """Cheap identity of the current points data, recorded next to the rollups."""
+    root = dataset_root(points_path)
+    if root is None:
+        st = points_path.stat()
+        return f"{st.st_mtime_ns}:{st.st_size}"
+    entries = dict(ingest_log_files(root))
+    for fragment in (root / POINTS_DIR).glob(f"**/{LIVE_FRAGMENT_PREFIX}*.parquet"):
+        st = fragment.stat()
+        entries[fragment.relative_to(root).as_posix()] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    return sources_version(entries)
+
+
+def sources_version(entries: Dict[str, dict]) -> str:
+    """Hash over every ingested source and its content (or mtime/size when not hashed)."""
+    digest = hashlib.sha256()
+    for key in sorted(entries):
+        e = entries[key]
+        digest.update(f"{key}\0{e.get('sha256') or (e.get('mtime_ns'), e.get('size'))}\n".encode())
+    return digest.hexdigest()
+
+
+def read_rollup_version(rollup_dir: Path) -> dict:
+    try:
+        return json.loads((rollup_dir / ROLLUP_VERSION).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _points_slices(points_path: Path, source_version: str) -> Dict[str, str]:
+    """Fingerprint per rollup slice: `plant=<id>/month=YYYY-MM` of a dataset, or `all` for one file."""
+    root = dataset_root(points_path)
+    if root is None:
+        return {"all": source_version}
+    points_dir = root / POINTS_DIR
+    slices = {}
+    for month_dir in sorted(points_dir.glob("plant=*/month=*")):
+        stats = sorted((p.relative_to(month_dir).as_posix(), p.stat().st_mtime_ns, p.stat().st_size)
+                       for p in month_dir.glob("**/*.parquet"))
+        if stats:
+            slices[month_dir.relative_to(points_dir).as_posix()] = hashlib.sha256(repr(stats).encode()).hexdigest()
+    return slices
+
+
+def _local_points(points_path: Path, slice_key: str):
+    """One slice's points with local-time `period_start`, string `series` and (if partitioned) `plant`."""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as pads
+
+    root = dataset_root(points_path)
+    source = root / POINTS_DIR / slice_key if root is not None else points_path
+    dataset = pads.dataset(source, format="parquet")
+    columns = [c for c in ("period_start", "utc_offset", "series", "value") if c in dataset.schema.names]
+    table = dataset.to_table(columns=columns)
+
+    millis = pc.cast(table["period_start"], pa.int64())
+    offset = pc.multiply(pc.cast(table["utc_offset"], pa.int64()), 60_000)
+    local = pc.cast(pc.add(millis, offset), pa.timestamp("ms"))
+    out = {"period_start": local, "series": pc.cast(table["series"], pa.string()), "value": table["value"]}
+    if root is not None:
+        plant = slice_key.split("/", 1)[0].split("=", 1)[1]
+        out["plant"] = pa.array([plant] * table.num_rows, pa.string())
+    return pa.table(out)
+
+
+def _rollup_table(points, multiple: int, unit: str):
+    """mean/min/max/sum/count/energy_kwh per (plant,) series and bucket of `points`."""
+    keys = ["plant", "series"] if "plant" in points.column_names else ["series"]
+    bucket = pc.floor_temporal(points["period_start"], multiple=multiple, unit=unit)
+    grouped = (
+        points.set_column(0, "period_start", bucket)
+        .group_by(keys + ["period_start"])
+        .aggregate([("value", "mean"), ("value", "min"), ("value", "max"),
+                    ("value", "sum"), ("value", "count")])
+    )
+    grouped = grouped.rename_columns(
+        [{"value_mean": "mean", "value_min": "min", "value_max": "max",
+          "value_sum": "sum", "value_count": "count"}.get(c, c) for c in grouped.column_names]
+    )
+    energy = pc.multiply(pc.cast(grouped["sum"], pa.float64()), POINT_HOURS / 1000.0)
+    grouped = grouped.append_column("energy_kwh", energy)
+    return grouped.sort_by([(k, "ascending") for k in keys + ["period_start"]])
+
+
+def _remove_rollup_file(path: Path, top: Path) -> None:
+    path.unlink(missing_ok=True)
+    for parent in path.parents:
+        if parent == top:
+            break
+        try:
+            parent.rmdir()  # only once empty
+        except OSError:
+            break
 
-def parse_args() -> argparse.Namespace:
+
+def build_rollups(points_path: Path, source_version: str, *, force: bool = False) -> List[str]:
+    """Persist mean/min/max/sum/count/energy per series at every ROLLUPS granularity.
+
+    Rollups are stored per slice, `<rollups>/<granularity>/plant=<id>/month=YYYY-MM.parquet`
+    for a dataset (`all.parquet` for a single file). Every granularity nests
+    inside a month, so only slices whose points changed since the last build
+    are recomputed and the others are left untouched. Returns the rebuilt slices.
+    """
+    rollup_dir = rollup_dir_for(points_path)
+    recorded = read_rollup_version(rollup_dir)
+    current = _points_slices(points_path, source_version)
+    previous = {} if force or recorded.get("granularities") != list(ROLLUPS) else recorded.get("slices", {})
+    stale = [key for key in current if previous.get(key) != current[key]
+             or not all((rollup_dir / name / f"{key}.parquet").exists() for name in ROLLUPS)]
+
+    rollup_dir.mkdir(parents=True, exist_ok=True)
+    for name in ROLLUPS:
+        (rollup_dir / f"{name}.parquet").unlink(missing_ok=True)  # single-table layout before slices
+        for path in list((rollup_dir / name).glob("**/*.parquet")):
+            if path.relative_to(rollup_dir / name).with_suffix("").as_posix() not in current:
+                _remove_rollup_file(path, rollup_dir / name)
+
+    for key in stale:
+        t0 = time.perf_counter()
+        with METRICS.timer("rollups.read"):
+            points = _local_points(points_path, key)
+        for name, (multiple, unit) in ROLLUPS.items():
+            target = rollup_dir / name / f"{key}.parquet"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(target.name + ".tmp")
+            pq.write_table(_rollup_table(points, multiple, unit), tmp)
+            os.replace(tmp, target)
+        METRICS.observe("rollups.slice", time.perf_counter() - t0)
+
+    version = {
+        "source_version": source_version,
+        "points_fingerprint": points_fingerprint(points_path),
+        "granularities": list(ROLLUPS),
+        "point_hours": POINT_HOURS,
+        "slices": current,
+    }
+    if version != recorded:
+        (rollup_dir / ROLLUP_VERSION).write_text(json.dumps(version, indent=1, sort_keys=True), encoding="utf-8")
+    return stale
+
+
+def read_rollup(points_path: Path, name: str, columns: Sequence[str], filters: Sequence[tuple] = ()):
+    """Rows of one rollup granularity across all slices as a pyarrow Table; None if never built.
+
+    Columns and filters the rollup lacks (`plant` for a single file) are skipped.
+    """
+    import pyarrow.dataset as pads
+
+    files = sorted((rollup_dir_for(points_path) / name).glob("**/*.parquet"))
+    if not files:
+        return None
+    # `plant` is stored in the files; the plant=/month= folders only group them.
+    dataset = pads.dataset([str(f) for f in files], format="parquet")
+    names = set(dataset.schema.names)
+    filters = [f for f in filters if f[0] in names]
+    return dataset.to_table(columns=[c for c in columns if c in names],
+                            filter=pq.filters_to_expression(filters) if filters else None)
+
+
+def _files_version(files: Iterable[Path], src_dir: Path) -> str:
+    entries = {}
+    for path in files:
+        st = path.stat()
+        entries[path.relative_to(src_dir).as_posix()] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    return sources_version(entries)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
         "source",
         nargs="?",
         default="json_export_example",
-        help="Directory containing raw_v2_*.json files (default: %(default)s)",
+        help="Directory containing raw_v2_*.json files or raw_v2_YYYY-MM.jsonl.gz|zst bundles (default: %(default)s)",
     )
     parser.add_argument(
         "-o",
@@ -113,32 +757,114 @@ def parse_args() -> argparse.Namespace:
         default="raw_v2_*.json",
         help="Glob pattern for JSON files inside source directory (default: %(default)s)",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--dataset",
+        metavar="DIR",
+        help=(
+            "Write an incremental Hive-style dataset (plant=/month=/day=) to DIR instead of a "
+            "single file; only new or changed source files are converted."
+        ),
+    )
+    parser.add_argument(
+        "--tz-offset",
+        default=DEFAULT_TZ_OFFSET,
+        help=(
+            "UTC offset used to build period_start when a payload does not echo its request "
+            "date (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--no-rollups",
+        action="store_true",
+        help="Skip building the 15min/hourly/daily/monthly rollup tables.",
+    )
+    parser.add_argument(
+        "--plant",
+        default=DEFAULT_PLANT,
+        help="Plant partition value for files outside plant=<id>/ folders (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes used to parse JSON files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=DEFAULT_ROW_GROUP_SIZE,
+        help="Rows buffered per Parquet row group (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="Write per-stage timings and counters at the end (JSON for *.json, else OpenMetrics text)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILERS,
+        help="Run the merge under cProfile or pyinstrument and print the hottest calls",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    with profiled(args.profile):
+        merge(args)
+    finish_metrics(args.metrics)
 
 
-def main() -> None:
-    args = parse_args()
+def merge(args: argparse.Namespace) -> None:
     src_dir = Path(args.source).expanduser().resolve()
 
     if not src_dir.exists() or not src_dir.is_dir():
         raise SystemExit(f"Source directory not found: {src_dir}")
 
-    files = sorted(src_dir.glob(args.glob))
+    files = sorted(src_dir.glob(args.glob)) + find_bundles(src_dir)
+    if args.dataset:
+        for folder in sorted(src_dir.glob("plant=*")):
+            files += sorted(folder.glob(args.glob)) + find_bundles(folder)
     if not files:
-        raise SystemExit(f"No files matched pattern '{args.glob}' in {src_dir}")
+        raise SystemExit(f"No files matched pattern '{args.glob}' (or raw archive bundles) in {src_dir}")
+    files, dropped = drop_archived_days(files)
+    if dropped:
+        print(f"    • {dropped:,} day files also archived in bundles; reading the bundles")
 
-    print(f"[*] Loading {len(files)} files from {src_dir}")
+    print(f"[*] Loading {len(files)} files from {src_dir} ({args.jobs} jobs)")
 
-    rows = iter_payload_rows(files)
-    if not rows:
+    if args.dataset:
+        dataset_dir = src_dir / args.dataset if Path(args.dataset).name == args.dataset else Path(args.dataset)
+        converted, unchanged, rows = write_dataset(
+            files, src_dir, dataset_dir, jobs=args.jobs, plant=args.plant, tz_offset=args.tz_offset
+        )
+        print(f"[✓] {converted:,} files converted ({rows:,} rows), {unchanged:,} unchanged → {dataset_dir}")
+        if not args.no_rollups and (dataset_dir / POINTS_DIR).is_dir():
+            _report_rollups(dataset_dir, build_rollups(dataset_dir, points_fingerprint(dataset_dir)))
+        return
+
+    output_path = src_dir / args.output if Path(args.output).name == args.output else Path(args.output)
+    total, aggregates = write_parquet(
+        files, output_path, jobs=args.jobs, row_group_size=args.row_group_size, tz_offset=args.tz_offset
+    )
+    if not total:
         raise SystemExit("No data rows extracted; aborting Parquet export.")
 
-    frame = build_dataframe(rows)
+    print(f"[✓] Wrote {total:,} rows to {output_path}")
+    if aggregates:
+        print(f"    {aggregates:,} daily aggregate rows → {aggregates_path(output_path)}")
+    if not args.no_rollups:
+        _report_rollups(output_path, build_rollups(output_path, _files_version(files, src_dir)))
 
-    output_path = src_dir / args.output if Path(args.output).name == args.output else Path(args.output)
-    frame.to_parquet(output_path, index=False)
 
-    print(f"[✓] Wrote {len(frame):,} rows to {output_path}")
+def _report_rollups(points_path: Path, built: List[str]) -> None:
+    target = rollup_dir_for(points_path)
+    if built:
+        print(f"    rollups rebuilt for {len(built)} slice(s) ({', '.join(ROLLUPS)}) → {target}")
+    else:
+        print(f"    rollups up to date → {target}")
 
 
 if __name__ == "__main__":
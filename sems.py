@@ -0,0 +1,71 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Single entry point for the SEMS tools.
+
+    python sems.py fetch [--start 2025-09-01]           export days from the portal
+    python sems.py merge json_export --dataset json_export/dataset
+    python sems.py plot json_export/dataset --series PCurve_Power_PV
+    python sems.py <command> --help                     options of one command
+
+Only the module behind the chosen command is imported, so `sems fetch` from
+cron does not load pandas, pyarrow or plotly. Each command takes the same
+options as its script (`fetch` = sems_plant_power_v2.py, and so on).
+"""
+
+from __future__ import annotations
+
+import importlib
+import sys
+from typing import Optional, Sequence
+
+# command -> (module, summary); modules are imported on dispatch only
+COMMANDS = {
+    "fetch": ("sems_plant_power_v2", "Export daily power curves from the SEMS portal (.env / SEMS_*)"),
+    "merge": ("merge_sems_json_to_parquet", "Merge raw JSON into Parquet or a --dataset directory"),
+    "plot": ("visualize_plant_power", "Interactive Plotly charts from the CSV or Parquet output"),
+    "dashboard": ("sems_dashboard", "Static multi-plant HTML report (small multiples, fleet bands) from rollups"),
+    "live": ("sems_live", "Poll today's curve and append only new points"),
+    "validate": ("sems_validate", "Find gappy or corrupt stored days and queue them for re-fetch"),
+    "query": ("sems_query", "DuckDB queries over the Parquet output or raw archive"),
+    "archive": ("sems_archive", "Pack, show or compact compressed raw bundles"),
+    "battery": ("simulate_home_battery", "Simulate home-battery savings over merged data"),
+    "cache": ("sems_cache", "Show or clear the memory-mapped frame cache used by plot"),
+}
+
+
+def usage() -> str:
+    width = max(len(name) for name in COMMANDS)
+    lines = ["usage: sems <command> [options]", "", "commands:"]
+    lines += [f"  {name:<{width}}  {summary}" for name, (_, summary) in COMMANDS.items()]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        raise SystemExit(f"sems: unknown command {command!r}\n\n{usage()}")
+    module = importlib.import_module(COMMANDS[command][0])
+    sys.argv[0] = f"sems {command}"  # argparse usage lines show the subcommand
+    module.main(rest)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit("Interrupted")
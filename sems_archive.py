@@ -0,0 +1,370 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compressed monthly bundles of raw SEMS day payloads.
+
+Instead of one indented `raw_v2_YYYY-MM-DD.json` per day, each month lives in
+`raw_v2_YYYY-MM.jsonl.gz` (or `.jsonl.zst`): one compressed member per stored
+day, each holding a single compact JSON line `{"day": …, "payload": …}`.
+Members are independent gzip/zstd frames, so a day is appended without
+rewriting the month and read back by seeking to its offset.
+
+A small sidecar index (`<bundle>.idx`, JSON) maps each day to the offset and
+length of its newest member. Re-fetched days are appended and the index is
+repointed; once superseded members outweigh live ones the bundle is compacted
+by copying the live members (no recompression). A missing or stale index is
+rebuilt by scanning the members, so the bundle alone is always sufficient.
+
+Usage
+-----
+    # Pack an existing per-day export into monthly bundles
+    python sems_archive.py pack json_export --codec gz [--delete]
+
+    # Print one stored day
+    python sems_archive.py show json_export 2025-09-01
+
+    # Drop superseded copies of refetched days now instead of waiting for the threshold
+    python sems_archive.py compact json_export
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import gzip
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard as zstd
+except ModuleNotFoundError:  # pragma: no cover - optional codec
+    zstd = None
+
+from sems_payload import dumps, loads
+
+BUNDLE_PREFIX = "raw_v2_"
+INDEX_SUFFIX = ".idx"  # not ".json", so `raw_v2_*.json` globs never pick it up
+INDEX_VERSION = 1
+CODECS = ("gz", "zst")
+BUNDLE_GLOBS = tuple(f"{BUNDLE_PREFIX}*.jsonl.{codec}" for codec in CODECS)
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 9
+# Compact once superseded members exceed live ones (and are worth a rewrite).
+COMPACT_MIN_STALE_BYTES = 256 * 1024
+
+
+def available_codecs() -> List[str]:
+    return [c for c in CODECS if c != "zst" or zstd is not None]
+
+
+def _check_codec(codec: str) -> None:
+    if codec not in CODECS:
+        raise ValueError(f"unknown archive codec {codec!r} (expected one of {', '.join(CODECS)})")
+    if codec == "zst" and zstd is None:
+        raise RuntimeError("zstandard not installed; pip install zstandard or use codec 'gz'")
+
+
+def codec_of(path: Path) -> str:
+    return Path(path).suffix.lstrip(".")
+
+
+def is_bundle(path: Path) -> bool:
+    name = Path(path).name
+    return name.startswith(BUNDLE_PREFIX) and any(name.endswith(f".jsonl.{c}") for c in CODECS)
+
+
+def bundle_path(outdir: Path, day: dt.date, codec: str) -> Path:
+    return Path(outdir) / f"{BUNDLE_PREFIX}{day:%Y-%m}.jsonl.{codec}"
+
+
+def index_path(bundle: Path) -> Path:
+    return bundle.with_name(bundle.name + INDEX_SUFFIX)
+
+
+def find_bundles(directory: Path) -> List[Path]:
+    return sorted(p for pattern in BUNDLE_GLOBS for p in Path(directory).glob(pattern))
+
+
+# ========= Codec =========
+def _compress(codec: str, raw: bytes) -> bytes:
+    if codec == "gz":
+        # mtime=0 keeps identical payloads byte-identical
+        return gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    return zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "gz":
+        return gzip.decompress(blob)
+    return zstd.ZstdDecompressor().decompress(blob)
+
+
+def _member_decompressor(codec: str):
+    if codec == "gz":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    return zstd.ZstdDecompressor().decompressobj()
+
+
+def _encode(day: dt.date, payload: dict) -> bytes:
+    return dumps({"day": day.isoformat(), "payload": payload}) + b"\n"
+
+
+def _decode(raw: bytes) -> Tuple[dt.date, dict]:
+    record = loads(raw)
+    return dt.date.fromisoformat(record["day"]), record["payload"]
+
+
+# ========= Index =========
+def scan_members(bundle: Path) -> Dict[str, List[int]]:
+    """Rebuild {day: [offset, length]} by walking every member; later members win."""
+    codec = codec_of(bundle)
+    _check_codec(codec)
+    data = bundle.read_bytes()
+    days: Dict[str, List[int]] = {}
+    offset = 0
+    while offset < len(data):
+        dec = _member_decompressor(codec)
+        try:
+            raw = dec.decompress(data[offset:])
+        except Exception as exc:  # zlib.error, or zstd's own ZstdError
+            print(f"    ! {bundle.name}: unreadable member at byte {offset} ({exc}); ignoring the rest")
+            break
+        rest = len(dec.unused_data)
+        if not dec.eof:  # truncated trailing member from an interrupted append
+            break
+        length = len(data) - offset - rest
+        try:
+            day, _ = _decode(raw)
+        except (ValueError, KeyError, TypeError) as exc:
+            print(f"    ! {bundle.name}: bad record at byte {offset} ({exc})")
+        else:
+            days[day.isoformat()] = [offset, length]
+        offset += length
+    return days
+
+
+def load_index(bundle: Path) -> dict:
+    """The bundle's index, rebuilt from the members when missing or out of date."""
+    idx_path = index_path(bundle)
+    size = bundle.stat().st_size if bundle.exists() else 0
+    if idx_path.exists():
+        try:
+            index = json.loads(idx_path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            index = None
+        # `end` past the file means a compaction was interrupted between renames
+        if index and index.get("version") == INDEX_VERSION and index.get("end", 0) <= size:
+            return index
+    days = scan_members(bundle) if size else {}
+    end = max((off + length for off, length in days.values()), default=0)
+    live = sum(length for _, length in days.values())
+    return {"version": INDEX_VERSION, "codec": codec_of(bundle), "end": end,
+            "stale_bytes": end - live, "days": days}
+
+
+def _save_index(bundle: Path, index: dict) -> None:
+    path = index_path(bundle)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(index, sort_keys=True, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# ========= Read =========
+def iter_bundle_raw(bundle: Path) -> Iterator[bytes]:
+    """Yield the decompressed `{"day", "payload"}` JSON line of each live member, in day order.
+
+    Members are read one at a time, so memory stays at one day's payload.
+    """
+    index = load_index(bundle)
+    codec = index.get("codec") or codec_of(bundle)
+    _check_codec(codec)
+    with bundle.open("rb") as fh:
+        for day in sorted(index["days"]):
+            offset, length = index["days"][day]
+            fh.seek(offset)
+            yield _decompress(codec, fh.read(length))
+
+
+def iter_bundle(bundle: Path) -> Iterator[Tuple[dt.date, dict]]:
+    """Yield (day, payload) for the live members of one bundle in day order."""
+    for raw in iter_bundle_raw(bundle):
+        yield _decode(raw)
+
+
+def read_day(directory: Path, day: dt.date) -> Optional[dict]:
+    """Payload stored for `day` in any bundle under `directory`, else None."""
+    for codec in CODECS:
+        bundle = bundle_path(directory, day, codec)
+        if not bundle.exists():
+            continue
+        entry = load_index(bundle)["days"].get(day.isoformat())
+        if entry:
+            with bundle.open("rb") as fh:
+                fh.seek(entry[0])
+                return _decode(_decompress(codec, fh.read(entry[1])))[1]
+    return None
+
+
+# ========= Write =========
+class RawArchive:
+    """Append-only writer for the monthly bundles of one output folder.
+
+    Not thread-safe; the exporter writes from its main thread only.
+    """
+
+    def __init__(self, directory: Path, codec: str = "gz"):
+        _check_codec(codec)
+        self.directory = Path(directory)
+        self.codec = codec
+        self._indexes: Dict[Path, dict] = {}
+
+    def _index(self, bundle: Path) -> dict:
+        index = self._indexes.get(bundle)
+        if index is None:
+            index = load_index(bundle)
+            if bundle.exists() and bundle.stat().st_size > index["end"]:
+                # drop a trailing member whose index update never landed
+                with bundle.open("r+b") as fh:
+                    fh.truncate(index["end"])
+            self._indexes[bundle] = index
+        return index
+
+    def has(self, day: dt.date) -> bool:
+        """Whether a payload for `day` is stored in its bundle."""
+        bundle = bundle_path(self.directory, day, self.codec)
+        return day.isoformat() in self._index(bundle)["days"]
+
+    def put(self, day: dt.date, payload: dict) -> int:
+        """Append `day`'s payload and repoint the index; returns compressed bytes written."""
+        bundle = bundle_path(self.directory, day, self.codec)
+        index = self._index(bundle)
+        blob = _compress(self.codec, _encode(day, payload))
+        with bundle.open("ab") as fh:
+            fh.write(blob)
+            fh.flush()
+            os.fsync(fh.fileno())
+        previous = index["days"].get(day.isoformat())
+        if previous:
+            index["stale_bytes"] += previous[1]
+        index["days"][day.isoformat()] = [index["end"], len(blob)]
+        index["end"] += len(blob)
+        _save_index(bundle, index)
+        if (index["stale_bytes"] >= COMPACT_MIN_STALE_BYTES
+                and index["stale_bytes"] > index["end"] - index["stale_bytes"]):
+            self.compact(bundle)
+        return len(blob)
+
+    def compact(self, bundle: Path) -> int:
+        """Rewrite `bundle` with only its live members; returns bytes reclaimed."""
+        index = self._index(bundle)
+        tmp = bundle.with_name(bundle.name + ".tmp")
+        days: Dict[str, List[int]] = {}
+        end = 0
+        with bundle.open("rb") as src, tmp.open("wb") as dst:
+            for day in sorted(index["days"]):
+                offset, length = index["days"][day]
+                src.seek(offset)
+                dst.write(src.read(length))
+                days[day] = [end, length]
+                end += length
+            dst.flush()
+            os.fsync(dst.fileno())
+        reclaimed = index["end"] - end
+        os.replace(tmp, bundle)
+        # An index left pointing past the new end is detected and rebuilt by load_index.
+        new_index = {**index, "end": end, "stale_bytes": 0, "days": days}
+        _save_index(bundle, new_index)
+        self._indexes[bundle] = new_index
+        return reclaimed
+
+
+# ========= CLI =========
+def _day_files(directory: Path) -> Iterable[Tuple[dt.date, Path]]:
+    for path in sorted(directory.glob(f"{BUNDLE_PREFIX}*.json")):
+        try:
+            yield dt.date.fromisoformat(path.stem[len(BUNDLE_PREFIX):]), path
+        except ValueError:
+            continue
+
+
+def pack(directory: Path, codec: str, delete: bool = False) -> Tuple[int, int, int]:
+    """Move per-day JSON files into bundles; returns (files, bytes before, bytes after)."""
+    archive = RawArchive(directory, codec)
+    files = before = 0
+    touched = set()
+    for day, path in _day_files(directory):
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError as exc:
+            print(f"    ! skip {path.name}: {exc}")
+            continue
+        archive.put(day, payload)
+        touched.add(bundle_path(directory, day, codec))
+        before += path.stat().st_size
+        files += 1
+        if delete:
+            path.unlink()
+    after = sum(b.stat().st_size + index_path(b).stat().st_size for b in touched)
+    return files, before, after
+
+
+def compact_all(directory: Path) -> Tuple[int, int]:
+    """Compact every bundle holding superseded members, in `directory` and its
+    `plant=<id>/` folders; returns (bundles compacted, bytes reclaimed)."""
+    compacted = reclaimed = 0
+    for folder in [directory, *sorted(directory.glob("plant=*"))]:
+        for bundle in find_bundles(folder):
+            if load_index(bundle)["stale_bytes"] <= 0:
+                continue
+            reclaimed += RawArchive(folder, codec_of(bundle)).compact(bundle)
+            compacted += 1
+    return compacted, reclaimed
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Manage compressed SEMS raw archives.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("pack", help="Pack raw_v2_YYYY-MM-DD.json files into monthly bundles")
+    p.add_argument("directory", type=Path)
+    p.add_argument("--codec", choices=CODECS, default="gz")
+    p.add_argument("--delete", action="store_true", help="Remove each day file once it is archived")
+    s = sub.add_parser("show", help="Print the stored payload of one day")
+    s.add_argument("directory", type=Path)
+    s.add_argument("day", type=dt.date.fromisoformat)
+    c = sub.add_parser("compact", help="Drop superseded copies of refetched days from every bundle now")
+    c.add_argument("directory", type=Path)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.command == "pack":
+        files, before, after = pack(args.directory, args.codec, args.delete)
+        if not files:
+            raise SystemExit(f"No raw_v2_YYYY-MM-DD.json files in {args.directory}")
+        ratio = before / after if after else 0
+        print(f"[✓] Packed {files:,} day files: {before / 1e6:.1f} MB → {after / 1e6:.1f} MB ({ratio:.1f}×)")
+        return
+    if args.command == "compact":
+        bundles, reclaimed = compact_all(args.directory)
+        print(f"[✓] Compacted {bundles:,} bundle(s), reclaimed {reclaimed / 1e6:.1f} MB")
+        return
+    payload = read_day(args.directory, args.day)
+    if payload is None:
+        raise SystemExit(f"{args.day} is not archived in {args.directory}")
+    print(json.dumps(payload, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
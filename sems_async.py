@@ -0,0 +1,120 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Flow-control helpers for the exporter's asyncio engine.
+
+`AimdLimiter` bounds the number of requests in flight and moves that bound
+the way TCP moves its congestion window: +1 per window of successful
+requests, halved when the portal pushes back (a CONGESTION_STATUSES status
+such as 429 or 503, a transport error, or a RATE_LIMIT_CODES body `code`).
+Other failures, including ordinary "hasError" bodies, are retried without
+touching the limit. At most one cut per round-trip time, so a burst of
+failures from the same window counts once. `backoff_delay` is the per-request
+retry delay (exponential with full jitter).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import random
+import time
+from typing import List, Mapping, Optional, Tuple
+
+# Statuses that mean "slow down" rather than "this request is wrong".
+CONGESTION_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# Body `code`s that say the portal is rate limiting, whatever the HTTP status.
+RATE_LIMIT_CODES = frozenset({"429"})
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: Optional[random.Random] = None) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**(attempt-1)))."""
+    if attempt <= 0 or base <= 0:
+        return 0.0
+    ceiling = min(cap, base * 2 ** (attempt - 1))
+    return (rng or random).uniform(0, ceiling)
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds requested by a Retry-After header (delta or HTTP date), if any."""
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class AimdLimiter:
+    """Adaptive in-flight limit for one event loop (not thread-safe).
+
+    Use as `async with limiter:` around each request, then report the outcome
+    with `success(latency)` or `congestion()`. `history` keeps (elapsed s,
+    limit) at every change for reporting.
+    """
+
+    def __init__(self, initial: float, minimum: float = 1, maximum: float = 64,
+                 decrease: float = 0.5):
+        self.minimum = max(1.0, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.limit = min(self.maximum, max(self.minimum, float(initial)))
+        self.decrease = decrease
+        self.inflight = 0
+        self.peak = 0
+        self.cuts = 0
+        self._rtt = 0.0
+        self._last_cut = float("-inf")
+        self._started = time.monotonic()
+        self._cond: Optional[asyncio.Condition] = None
+        self.history: List[Tuple[float, float]] = [(0.0, self.limit)]
+
+    async def __aenter__(self) -> "AimdLimiter":
+        if self._cond is None:
+            self._cond = asyncio.Condition()  # bound to the running loop on first use
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        async with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+
+    def _record(self) -> None:
+        self.history.append((round(time.monotonic() - self._started, 3), round(self.limit, 2)))
+
+    def success(self, latency: float) -> None:
+        """Additive increase: one more slot per `limit` successful requests."""
+        self._rtt = latency if not self._rtt else 0.8 * self._rtt + 0.2 * latency
+        if self.limit < self.maximum:
+            before = int(self.limit)
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            if int(self.limit) != before:
+                self._record()
+
+    def congestion(self) -> bool:
+        """Multiplicative decrease, at most once per smoothed RTT; True when the limit was cut."""
+        now = time.monotonic()
+        if now - self._last_cut < max(self._rtt, 0.05):
+            return False
+        self._last_cut = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self.cuts += 1
+        self._record()
+        return True
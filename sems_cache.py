@@ -0,0 +1,234 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Memory-mapped Arrow IPC cache for the visualizer's normalized frames.
+
+`load_dataset` in visualize_plant_power.py re-parses the CSV (or re-reads and
+re-normalizes Parquet) on every call. With the cache, the first load writes
+the normalized frame (`period_start` already computed, `series` as a
+dictionary) to an uncompressed Arrow IPC file; later loads memory-map it, and
+numeric and timestamp columns become pandas views onto the mapped pages, not
+copies. Several notebook kernels reading the same entry share those pages
+through the OS page cache.
+
+Entries are keyed by the source's fingerprint: file mtime/size, or for a
+--dataset directory the files of only the `plant=/month=` partitions the
+query reads. A changed source is never served stale, and a lookup costs a
+few stats however large the fleet and its history are. The directory is
+kept under a size budget by evicting the least recently used entries.
+
+    SEMS_CACHE_DIR      cache location (default: ~/.cache/sems)
+    SEMS_CACHE_MAX_MB   size budget (default: 1024)
+
+    python sems_cache.py info      # entries and total size
+    python sems_cache.py clear
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import hashlib
+import importlib.util
+import os
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+DEFAULT_MAX_MB = 1024
+SUFFIX = ".arrow"
+FORMAT_VERSION = "1"  # bump when the cached frame layout changes
+
+
+def default_dir() -> Path:
+    env = os.getenv("SEMS_CACHE_DIR")
+    if env:
+        return Path(env).expanduser()
+    base = os.getenv("XDG_CACHE_HOME") or "~/.cache"
+    return Path(base).expanduser() / "sems"
+
+
+def _partitions(points: Path, plants: Optional[Sequence[str]], start: Optional[dt.date],
+                end: Optional[dt.date]) -> List[Path]:
+    """`plant=<id>/month=YYYY-MM` folders of a dataset's points that a query can read."""
+    wanted = {str(p) for p in plants} if plants else None
+    first = f"{start:%Y-%m}" if start is not None else ""
+    last = f"{end:%Y-%m}" if end is not None else "9999-99"
+    out = []
+    for plant_dir in sorted(points.glob("plant=*")):
+        if wanted is not None and plant_dir.name.split("=", 1)[1] not in wanted:
+            continue
+        out += [m for m in sorted(plant_dir.glob("month=*")) if first <= m.name.split("=", 1)[1] <= last]
+    return out
+
+
+def source_fingerprint(source: Path, *, plants: Optional[Sequence[str]] = None,
+                       start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> str:
+    """Identity of the data a load of `source` reads; changes whenever it could return different rows.
+
+    For a --dataset directory only the partitions matching `plants` and the
+    `start`/`end` months are looked at (rollups never are). Day files and
+    live fragments are replaced or added by rename, so their mtime and size
+    catch every change.
+    """
+    from merge_sems_json_to_parquet import POINTS_DIR, dataset_root
+
+    source = Path(source).resolve()
+    if not source.is_dir():
+        st = source.stat()
+        return f"{source}|{st.st_mtime_ns}:{st.st_size}"
+    points = dataset_root(source) / POINTS_DIR
+    folders = _partitions(points, plants, start, end) if points.is_dir() else [source]
+    stats = sorted((p.relative_to(source).as_posix(), p.stat().st_mtime_ns, p.stat().st_size)
+                   for folder in folders for p in folder.glob("**/*.parquet"))
+    return f"{source}|{hashlib.sha256(repr(stats).encode()).hexdigest()}"
+
+
+def available() -> bool:
+    """Whether pyarrow is installed; without it callers load uncached."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class FrameCache:
+    """Directory of `<key>.arrow` files with LRU eviction (a hit refreshes the entry's mtime)."""
+
+    def __init__(self, directory: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.directory = Path(directory) if directory is not None else default_dir()
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("SEMS_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(source: Path, *parts: object, plants: Optional[Sequence[str]] = None,
+            start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> str:
+        """Entry key for `source` and the load's `parts`; `plants`/`start`/`end` narrow the fingerprint too."""
+        fingerprint = source_fingerprint(source, plants=plants, start=start, end=end)
+        raw = "\0".join([FORMAT_VERSION, fingerprint, *map(repr, (*parts, sorted(plants or ()), start, end))])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{SUFFIX}"
+
+    def get(self, key: str):
+        """The cached frame as a memory-mapped pyarrow Table, or None."""
+        import pyarrow as pa
+
+        path = self.path(key)
+        try:
+            source = pa.memory_map(str(path), "r")
+            table = pa.ipc.open_file(source).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        try:
+            os.utime(path)  # LRU clock
+        except OSError:
+            pass
+        return table
+
+    def put(self, key: str, df) -> Optional[Path]:
+        """Write `df` atomically, then evict down to the size budget."""
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if table.nbytes > self.max_bytes:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return path
+
+    def load(self, key: str, build: Callable[[], "object"]):
+        """Cached frame for `key`, or `build()` it and store it. Returns a pandas DataFrame."""
+        table = self.get(key)
+        if table is not None:
+            self.hits += 1
+            # split_blocks keeps each column its own block, so null-free numeric
+            # and timestamp columns stay zero-copy views of the mapped file.
+            return table.to_pandas(split_blocks=True)
+        self.misses += 1
+        df = build()
+        try:
+            self.put(key, df)
+        except OSError as exc:
+            print(f"    ! cache write failed ({exc}); continuing without it")
+        return df
+
+    # ----- housekeeping -----
+    def entries(self) -> List[Tuple[Path, int, float]]:
+        """(path, bytes, last use) per entry, most recently used first."""
+        out = []
+        for path in self.directory.glob(f"*{SUFFIX}"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            out.append((path, st.st_size, st.st_mtime))
+        return sorted(out, key=lambda e: e[2], reverse=True)
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """Drop least recently used entries until the total fits `max_bytes`; returns the number removed."""
+        total, removed = 0, 0
+        for path, size, _ in self.entries():
+            total += size
+            if total > self.max_bytes and path != keep:
+                try:
+                    path.unlink()  # open memory maps stay valid until closed
+                    removed += 1
+                    total -= size
+                except OSError:
+                    pass
+        for tmp in self.directory.glob(f"*{SUFFIX}.*.tmp"):
+            try:
+                if time.time() - tmp.stat().st_mtime > 3600:  # left by a crashed writer
+                    tmp.unlink()
+            except OSError:
+                pass
+        return removed
+
+    def clear(self) -> int:
+        removed = 0
+        for path, _, _ in self.entries():
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+
+# ========= CLI =========
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect or clear the SEMS frame cache.")
+    parser.add_argument("command", choices=("info", "clear"))
+    parser.add_argument("--dir", type=Path, help="Cache directory (default: SEMS_CACHE_DIR or ~/.cache/sems)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    cache = FrameCache(args.dir)
+    if args.command == "clear":
+        print(f"[✓] removed {cache.clear()} entr(y/ies) from {cache.directory}")
+        return
+    entries = cache.entries()
+    total = sum(size for _, size, _ in entries)
+    print(f"[*] {cache.directory}: {len(entries)} entr(y/ies), {total / 1e6:,.1f} MB "
+          f"of {cache.max_bytes / 1e6:,.0f} MB")
+    for path, size, used in entries:
+        print(f"    {path.name}  {size / 1e6:9,.1f} MB  last used {time.strftime('%Y-%m-%d %H:%M', time.localtime(used))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Static fleet dashboard for many plants, built from the merger's rollups.
+
+visualize_plant_power.py draws every series of one plant on a single axis.
+For a fleet this script reads one rollup table (`daily` by default) of a
+merger `--dataset` directory and writes a single HTML report with:
+
+    fleet view      sum over plants, median and a p10–p90 band per period
+    small multiples one panel per plant (ranked by total), with the fleet
+    median in grey for reference, on shared axes
+
+All traces are `Scattergl`, and the small multiples are one figure, so the
+browser uses a single WebGL context however many plants there are.
+plotly.js is included once for the whole report: inline (self-contained),
+from the CDN, or as one `plotly.min.js` next to the report that several
+reports can share.
+
+Usage
+-----
+    python sems_dashboard.py json_export/dataset -o fleet.html
+    python sems_dashboard.py json_export/dataset --granularity monthly --start 2025-01-01
+    python sems_dashboard.py json_export/dataset --granularity hourly --metric mean --plotly-js directory
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import html
+import math
+import time
+import warnings
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:  # plotly itself is imported when the report is built
+    import plotly.graph_objects as go
+
+from merge_sems_json_to_parquet import ROLLUPS, points_fingerprint, read_rollup, read_rollup_version, rollup_dir_for
+from sems_metrics import METRICS, finish as finish_metrics
+
+DEFAULT_SERIES = "PCurve_Power_PV"
+METRIC_LABELS = {"energy_kwh": "Energy [kWh]", "mean": "Mean power [W]", "max": "Peak power [W]"}
+PLOTLYJS_MODES = ("inline", "cdn", "directory")
+BAND = (0.1, 0.9)
+PANEL_HEIGHT = 170  # px per row of small multiples
+
+
+def _x_axis(index: pd.Index) -> dict:
+    """Trace x arguments: `x0`/`dx` for evenly spaced periods (no per-point x data at all),
+    else epoch milliseconds, which plotly ships base64-encoded instead of as ISO strings."""
+    ms = pd.DatetimeIndex(index).as_unit("ms").asi8
+    step = np.diff(ms)
+    if len(ms) > 2 and (step == step[0]).all():
+        return {"x0": pd.Timestamp(ms[0], unit="ms").isoformat(), "dx": int(step[0])}
+    return {"x": ms.astype("float64")}
+
+
+def _y(values) -> np.ndarray:
+    return np.asarray(values, dtype="float32")  # half the bytes; plenty for a chart
+
+
+# ========= Data =========
+def load_fleet(
+    path: Path,
+    *,
+    granularity: str = "daily",
+    series: str = DEFAULT_SERIES,
+    metric: str = "energy_kwh",
+    plants: Optional[Sequence[str]] = None,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+) -> pd.DataFrame:
+    """Wide frame of `metric`: one row per period, one column per plant.
+
+    Only the rollup's `plant`, `period_start` and `metric` columns are read,
+    with the series and date filters pushed down.
+    """
+    path = Path(path)
+    rollup_dir = rollup_dir_for(path)
+    filters = [("series", "=", series)]
+    if plants:
+        filters.append(("plant", "in", list(plants)))
+    if start is not None:
+        filters.append(("period_start", ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append(("period_start", "<", pd.Timestamp(end) + pd.Timedelta(days=1)))
+    table = read_rollup(path, granularity, ["plant", "period_start", metric], filters)
+    if table is None:
+        raise FileNotFoundError(f"No {granularity} rollup in {rollup_dir}; run the merger without --no-rollups")
+    if read_rollup_version(rollup_dir).get("points_fingerprint") != points_fingerprint(path):
+        print("    ! rollups are older than the points (re-run the merger to refresh them)")
+    df = table.to_pandas()
+    if df.empty:
+        raise ValueError(f"No {series!r} rows in {rollup_dir / granularity} for the requested filters.")
+    if "plant" not in df.columns:
+        df["plant"] = "default"
+    return df.pivot_table(index="period_start", columns="plant", values=metric, aggfunc="sum", observed=True)
+
+
+def fleet_stats(wide: pd.DataFrame) -> pd.DataFrame:
+    """Per period: fleet sum, median, the BAND percentiles and how many plants reported."""
+    values = wide.to_numpy(dtype="float64")
+    reporting = np.isfinite(values).sum(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # periods no plant reported
+        low, median, high = np.nanquantile(values, [BAND[0], 0.5, BAND[1]], axis=1)
+    return pd.DataFrame({
+        "sum": np.where(reporting > 0, np.nansum(values, axis=1), np.nan),
+        "median": median, "low": low, "high": high, "plants": reporting,
+    }, index=wide.index)
+
+
+# ========= Figures =========
+def fleet_figure(stats: pd.DataFrame, *, metric: str, series: str) -> "go.Figure":
+    """Fleet sum (right axis) over the median and p10–p90 band of the plants (left axis)."""
+    import plotly.graph_objects as go
+
+    x = _x_axis(stats.index)
+    label = METRIC_LABELS.get(metric, metric)
+    lo, hi = (round(q * 100) for q in BAND)
+    fig = go.Figure([
+        go.Scattergl(**x, y=_y(stats["high"]), mode="lines", line=dict(width=0), hoverinfo="skip",
+                     showlegend=False),
+        go.Scattergl(**x, y=_y(stats["low"]), mode="lines", line=dict(width=0), fill="tonexty",
+                     fillcolor="rgba(31,119,180,0.2)", name=f"p{lo}–p{hi} of plants",
+                     customdata=_y(stats["high"]),
+                     hovertemplate=f"p{lo} %{{y:,.2f}} – p{hi} %{{customdata:,.2f}}<extra></extra>"),
+        go.Scattergl(**x, y=_y(stats["median"]), mode="lines", line=dict(color="#1f77b4"),
+                     name="median plant", hovertemplate="%{y:,.2f}<extra>median</extra>"),
+        go.Scattergl(**x, y=_y(stats["sum"]), mode="lines", line=dict(color="#d62728"), yaxis="y2",
+                     name="fleet total", customdata=stats["plants"].to_numpy(),
+                     hovertemplate="%{y:,.1f} (%{customdata} plants)<extra>total</extra>"),
+    ])
+    fig.update_layout(
+        title=f"Fleet {series}: {label}",
+        hovermode="x unified",
+        height=420,
+        margin=dict(l=60, r=60, t=60, b=40),
+        xaxis=dict(type="date"),
+        yaxis=dict(title=f"per plant: {label}"),
+        yaxis2=dict(title=f"fleet total: {label}", overlaying="y", side="right", showgrid=False),
+        legend=dict(orientation="h", y=1.08, x=0),
+    )
+    return fig
+
+
+def small_multiples(wide: pd.DataFrame, stats: Optional[pd.DataFrame], *, metric: str, cols: int = 4,
+                    shared_y: bool = True) -> "go.Figure":
+    """One panel per plant (columns in `wide` order) on one WebGL figure."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    plants = list(wide.columns)
+    cols = max(1, min(cols, len(plants)))
+    rows = math.ceil(len(plants) / cols)
+    fig = make_subplots(
+        rows=rows, cols=cols, subplot_titles=[str(p) for p in plants],
+        shared_xaxes="all", shared_yaxes="all" if shared_y else False,
+        vertical_spacing=min(0.08, 0.6 / rows), horizontal_spacing=0.03,
+    )
+    x = _x_axis(wide.index)
+    label = METRIC_LABELS.get(metric, metric)
+    for i, plant in enumerate(plants):
+        row, col = divmod(i, cols)
+        if stats is not None:
+            fig.add_trace(go.Scattergl(**x, y=_y(stats["median"]), mode="lines", hoverinfo="skip",
+                                       line=dict(color="#bbbbbb", width=1), showlegend=False),
+                          row=row + 1, col=col + 1)
+        fig.add_trace(go.Scattergl(**x, y=_y(wide[plant]), mode="lines", line=dict(color="#1f77b4", width=1.2),
+                                   name=str(plant), showlegend=False,
+                                   hovertemplate=f"{html.escape(str(plant))}<br>%{{x|%Y-%m-%d %H:%M}}<br>%{{y:,.2f}}<extra></extra>"),
+                      row=row + 1, col=col + 1)
+    fig.update_xaxes(type="date")
+    fig.update_annotations(font_size=11)
+    fig.update_layout(
+        title=f"Per plant: {label}" + (" (grey: fleet median)" if stats is not None else ""),
+        height=max(300, PANEL_HEIGHT * rows + 80),
+        margin=dict(l=50, r=20, t=80, b=30),
+        hovermode="closest",
+    )
+    return fig
+
+
+# ========= Report =========
+def plotlyjs_tag(mode: str, output: Path) -> str:
+    """The one `<script>` that loads plotly.js for the whole report."""
+    from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+    if mode == "cdn":
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" charset="utf-8"></script>'
+    if mode == "directory":
+        bundle = output.parent / "plotly.min.js"
+        if not bundle.exists():
+            bundle.write_text(get_plotlyjs(), encoding="utf-8")
+        return '<script src="plotly.min.js" charset="utf-8"></script>'
+    return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+
+
+def write_report(output: Path, figures: List["go.Figure"], *, title: str, summary: str,
+                 plotly_js: str = "inline") -> None:
+    import plotly.io as pio
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    divs = [pio.to_html(fig, include_plotlyjs=False, full_html=False, validate=False,
+                        config={"displaylogo": False, "responsive": True}) for fig in figures]
+    page = "\n".join([
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8">',
+        f"<title>{html.escape(title)}</title>",
+        "<style>body{font-family:sans-serif;margin:1em 2em} .summary{color:#555}</style>",
+        plotlyjs_tag(plotly_js, output),
+        "</head><body>",
+        f"<h1>{html.escape(title)}</h1>",
+        f'<p class="summary">{html.escape(summary)}</p>',
+        *divs,
+        "</body></html>",
+    ])
+    output.write_text(page, encoding="utf-8")
+
+
+def build_dashboard(
+    path: Path,
+    output: Path,
+    *,
+    granularity: str = "daily",
+    series: str = DEFAULT_SERIES,
+    metric: str = "energy_kwh",
+    plants: Optional[Sequence[str]] = None,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+    cols: int = 4,
+    sort: str = "total",
+    shared_y: bool = True,
+    median: bool = True,
+    plotly_js: str = "inline",
+) -> pd.DataFrame:
+    """Load the rollup, build both views and write the report; returns the wide per-plant frame."""
+    with METRICS.timer("load_rollup"):
+        wide = load_fleet(path, granularity=granularity, series=series, metric=metric,
+                          plants=plants, start=start, end=end)
+    if sort == "total":
+        wide = wide[wide.sum().sort_values(ascending=False).index]
+    else:
+        wide = wide[sorted(wide.columns, key=str)]
+    with METRICS.timer("fleet_stats"):
+        stats = fleet_stats(wide)
+    with METRICS.timer("figure.build"):
+        figures = [fleet_figure(stats, metric=metric, series=series),
+                   small_multiples(wide, stats if median else None, metric=metric, cols=cols, shared_y=shared_y)]
+    first, last = wide.index.min(), wide.index.max()
+    summary = (f"{wide.shape[1]} plant(s), {granularity} {METRIC_LABELS.get(metric, metric)} of {series}, "
+               f"{first:%Y-%m-%d} → {last:%Y-%m-%d}")
+    if metric == "energy_kwh":
+        summary += f"; fleet total {np.nansum(wide.to_numpy()):,.0f} kWh"
+    with METRICS.timer("figure.write"):
+        write_report(output, figures, title=f"SEMS fleet: {series}", summary=summary, plotly_js=plotly_js)
+    METRICS.count("plants", wide.shape[1])
+    METRICS.count("points_plotted", int(wide.notna().to_numpy().sum()))
+    return wide
+
+
+# ========= CLI =========
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fleet dashboard (small multiples + aggregates) from merger rollups.")
+    parser.add_argument("source", type=Path, help="Merger --dataset directory (or a merged Parquet file)")
+    parser.add_argument("-o", "--output", type=Path, default=Path("fleet_dashboard.html"),
+                        help="HTML report to write (default: %(default)s)")
+    parser.add_argument("--granularity", choices=list(ROLLUPS), default="daily",
+                        help="Rollup table to plot (default: %(default)s)")
+    parser.add_argument("--series", default=DEFAULT_SERIES, help="Series to plot (default: %(default)s)")
+    parser.add_argument("--metric", choices=list(METRIC_LABELS), default="energy_kwh",
+                        help="Rollup column per period (default: %(default)s)")
+    parser.add_argument("--plant", action="append", help="Plant(s) to include (repeat or comma-separate)")
+    parser.add_argument("--start", type=dt.date.fromisoformat, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=dt.date.fromisoformat, help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--cols", type=int, default=4, help="Small-multiple columns (default: %(default)s)")
+    parser.add_argument("--sort", choices=("total", "name"), default="total",
+                        help="Panel order: highest total first, or by plant ID (default: %(default)s)")
+    parser.add_argument("--independent-y", action="store_true", help="Give each panel its own y range")
+    parser.add_argument("--no-median", action="store_true", help="Leave the fleet median out of the panels")
+    parser.add_argument("--plotly-js", choices=PLOTLYJS_MODES, default="inline",
+                        help="Embed plotly.js, link the CDN, or share one plotly.min.js beside the report "
+                             "(default: %(default)s)")
+    parser.add_argument("--metrics", type=Path,
+                        help="Write per-stage timings at the end; JSON for *.json, else OpenMetrics.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    plants = [p.strip() for value in args.plant or [] for p in value.split(",") if p.strip()] or None
+    t0 = time.perf_counter()
+    wide = build_dashboard(
+        args.source, args.output, granularity=args.granularity, series=args.series, metric=args.metric,
+        plants=plants, start=args.start, end=args.end, cols=args.cols, sort=args.sort,
+        shared_y=not args.independent_y, median=not args.no_median, plotly_js=args.plotly_js,
+    )
+    print(f"[✓] {wide.shape[1]} plant(s) × {len(wide):,} {args.granularity} periods → {args.output} "
+          f"({time.perf_counter() - t0:.1f}s)")
+    finish_metrics(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Poll today's SEMS curve every 5 minutes and append only the new points.
+
+Uses the exporter's configuration (.env / SEMS_* variables), session and
+cached login, so each tick costs one GetPlantPowerChart request per plant.
+Polls are aligned to the portal's 5-minute `xy` cadence (plus `--lag` for
+the portal to publish the slot). Points newer than the last one already
+stored are appended to `plant_power_v2.csv` and, with `--dataset`, written as
+small `live-<ms>.parquet` fragments in today's partition. The merger drops
+these fragments when it converts the full day.
+
+Progress survives restarts in `live_state.json` (last stored slot per series).
+The latest values are served on `--port`:
+
+    GET /metrics   Prometheus text format
+    GET /latest    JSON
+
+Usage
+-----
+    python sems_live.py --port 9109 --dataset json_export/dataset
+    python sems_live.py --once            # one poll, e.g. from cron
+
+Do not run it at the same time as a batch export of the same output folder;
+the batch run re-fetches today and rewrites its CSV rows anyway.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import math
+import os
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import sems_plant_power_v2 as exporter
+from sems_payload import DayColumns, columns_from_payload
+from sems_sink import CSV_NAME, CsvSink, DayBatch
+
+STATE_NAME = "live_state.json"
+LIVE_SOURCE = "live"
+DEFAULT_INTERVAL = 300  # the chart's `xy` cadence
+DEFAULT_LAG = 60        # seconds the portal needs to publish a slot
+
+
+def portal_tz() -> dt.timezone:
+    offset = exporter.TZ_OFFSET.strip()
+    if offset in ("", "Z", "z"):
+        return dt.timezone.utc
+    sign = -1 if offset[0] == "-" else 1
+    digits = offset.lstrip("+-").replace(":", "")
+    return dt.timezone(sign * dt.timedelta(hours=int(digits[:2]), minutes=int(digits[2:4] or 0)))
+
+
+def next_tick(now: float, interval: float, lag: float) -> float:
+    """First epoch second after `now` that is `lag` past a multiple of `interval`."""
+    return math.floor((now - lag) / interval + 1) * interval + lag
+
+
+def new_points(cols: DayColumns, last: Dict[str, int]) -> DayColumns:
+    """Only the points after each series' last stored minute (daily totals dropped)."""
+    keep = [i for i, (s, m) in enumerate(zip(cols.series, cols.minutes))
+            if m > last.get(cols.line_keys[s], -1)]
+    return cols._replace(
+        series=[cols.series[i] for i in keep],
+        minutes=[cols.minutes[i] for i in keep],
+        values=[cols.values[i] for i in keep],
+        agg_keys=[], agg_values=[], agg_units=[],
+    )
+
+
+# ========= State =========
+class LiveState:
+    """`live_state.json`: per plant, the day being followed and the last stored minute per series."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        try:
+            self.plants: Dict[str, dict] = json.loads(path.read_text(encoding="utf-8")).get("plants", {})
+        except (OSError, ValueError):
+            self.plants = {}
+
+    def day(self, plant_id: str) -> Optional[dt.date]:
+        day = self.plants.get(plant_id, {}).get("day")
+        return dt.date.fromisoformat(day) if day else None
+
+    def last(self, plant_id: str) -> Dict[str, int]:
+        return self.plants.get(plant_id, {}).get("last_minute", {})
+
+    def advance(self, plant_id: str, day: dt.date, cols: DayColumns) -> None:
+        entry = self.plants.setdefault(plant_id, {})
+        if entry.get("day") != day.isoformat():
+            entry["day"], entry["last_minute"] = day.isoformat(), {}
+        last = entry["last_minute"]
+        for s, m in zip(cols.series, cols.minutes):
+            key = cols.line_keys[s]
+            last[key] = max(last.get(key, -1), m)
+
+    def save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"plants": self.plants}, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+# ========= Stores =========
+def append_csv(sink: CsvSink, day: dt.date, cols: DayColumns, *, restart: bool = False) -> int:
+    """Append the points of `cols` as one committed CSV block.
+
+    With `restart` (first poll of a day without state) `cols` is the whole
+    day: it replaces the rows a batch run already wrote for `day`, daily
+    totals included, so none are lost or duplicated.
+    """
+    sink.write_day(DayBatch.from_columns(day, cols, aggregates=restart), replace=restart)
+    sink.flush()
+    return len(cols.values)
+
+
+def _dataset_baseline(day_file: Path) -> Dict[str, int]:
+    """Last local minute per series already in the merger's file for this day."""
+    import pyarrow.parquet as pq
+
+    if not day_file.exists():
+        return {}
+    table = pq.read_table(day_file, columns=["period_start", "utc_offset", "series"])
+    last: Dict[str, int] = {}
+    for stamp, offset, series in zip(table["period_start"].cast("int64").to_pylist(),
+                                     table["utc_offset"].to_pylist(), table["series"].to_pylist()):
+        minute = (stamp // 60_000 + offset) % 1440
+        last[series] = max(last.get(series, -1), minute)
+    return last
+
+
+def append_parquet(dataset_dir: Path, plant: str, day: dt.date, cols: DayColumns, *,
+                   restart: bool = False) -> Optional[Path]:
+    """Write the new points as one fragment file in the day's points partition.
+
+    `restart` (first poll of a day without state) drops fragments of an
+    earlier session and skips points the merger's day file already has.
+    """
+    import merge_sems_json_to_parquet as merger
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    day_file = merger.partition_path(dataset_dir, merger.POINTS_DIR, plant, Path(f"raw_v2_{day}.json"))
+    if restart:
+        for fragment in day_file.parent.glob(f"{merger.LIVE_FRAGMENT_PREFIX}*.parquet"):
+            fragment.unlink()
+        cols = new_points(cols, _dataset_baseline(day_file))
+    offset = merger.para_utc_offset(cols.para, merger.parse_utc_offset(exporter.TZ_OFFSET))
+    points, _ = merger.columns_tables(cols, day, LIVE_SOURCE, offset)
+    if points is None:
+        return None
+    target = day_file.with_name(f"{merger.LIVE_FRAGMENT_PREFIX}{time.time_ns() // 1_000_000}.parquet")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    pq.write_table(pa.Table.from_batches([points]), tmp)
+    os.replace(tmp, target)
+    return target
+
+
+# ========= Poller =========
+class LivePoller:
+    def __init__(self, plants: List[str], auth: "exporter.TokenManager", state: LiveState, *,
+                 dataset_dir: Optional[Path] = None, dataset_plant: str = "default", csv: bool = True):
+        self.plants = plants
+        self.auth = auth
+        self.state = state
+        self.dataset_dir = dataset_dir
+        self.dataset_plant = dataset_plant
+        self.csv = csv
+        self.tz = portal_tz()
+        self.lock = threading.Lock()
+        self.latest: Dict[str, dict] = {}
+        self.polls = 0
+        self.errors = 0
+        self.appended = 0
+        self.last_success: Optional[float] = None
+        self._sinks: Dict[str, CsvSink] = {}  # opened once, so a tick never re-reads the CSV
+
+    def _csv_sink(self, plant_id: str) -> CsvSink:
+        if plant_id not in self._sinks:
+            self._sinks[plant_id] = CsvSink(exporter.plant_dir(plant_id), CSV_NAME)
+        return self._sinks[plant_id]
+
+    def _dataset_plant(self, plant_id: str) -> str:
+        return plant_id if exporter.PARTITION_BY_PLANT else self.dataset_plant
+
+    def poll_day(self, plant_id: str, day: dt.date) -> int:
+        _, _, payload, _, _ = exporter.fetch_day(self.auth, plant_id, day, None, exporter.get_client())
+        cols = columns_from_payload(payload)
+        with self.lock:
+            self.polls += 1
+            if not isinstance(payload.get("data"), dict):  # error body even after retries
+                self.errors += 1
+                return 0
+        restart = self.state.day(plant_id) != day
+        fresh = new_points(cols, {} if restart else self.state.last(plant_id))
+        if fresh.values:
+            if self.csv:
+                append_csv(self._csv_sink(plant_id), day, cols if restart else fresh, restart=restart)
+            if self.dataset_dir is not None:
+                append_parquet(self.dataset_dir, self._dataset_plant(plant_id), day, fresh, restart=restart)
+        self.state.advance(plant_id, day, fresh)
+        self._remember(plant_id, day, cols)
+        with self.lock:
+            self.appended += len(fresh.values)
+            self.last_success = time.time()
+        return len(fresh.values)
+
+    def _remember(self, plant_id: str, day: dt.date, cols: DayColumns) -> None:
+        series: Dict[str, dict] = {}
+        for s, m, v in zip(cols.series, cols.minutes, cols.values):
+            key = cols.line_keys[s]
+            if m >= series.get(key, {}).get("minute", -1):
+                series[key] = {"minute": m, "value": v, "unit": cols.line_units[s]}
+        for item in series.values():
+            local = dt.datetime.combine(day, dt.time(), self.tz) + dt.timedelta(minutes=item["minute"])
+            item["time"] = local.isoformat()
+            item["timestamp"] = local.timestamp()
+        with self.lock:
+            self.latest[plant_id] = {
+                "day": day.isoformat(),
+                "series": series,
+                "totals": dict(zip(cols.agg_keys, cols.agg_values)),
+            }
+
+    def tick(self) -> int:
+        """Poll today for every plant (finishing yesterday first after midnight)."""
+        today = dt.datetime.now(self.tz).date()
+        added = 0
+        for plant_id in self.plants:
+            try:
+                followed = self.state.day(plant_id)
+                if followed is not None and followed < today:
+                    added += self.poll_day(plant_id, followed)  # pick up the last slots of the old day
+                added += self.poll_day(plant_id, today)
+            except Exception as e:  # keep the daemon alive; the next tick retries
+                with self.lock:
+                    self.errors += 1
+                print(f"    ! {plant_id}: {e}")
+        self.state.save()
+        return added
+
+    # ----- exposition -----
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"plants": json.loads(json.dumps(self.latest)), "polls": self.polls,
+                    "errors": self.errors, "appended_points": self.appended,
+                    "last_success": self.last_success}
+
+    def metrics(self) -> str:
+        snap = self.snapshot()
+        lines = [
+            "# HELP sems_live_value Latest 5-minute value per series (unit in label).",
+            "# TYPE sems_live_value gauge",
+        ]
+        stamps = ["# HELP sems_live_value_timestamp_seconds Slot time of sems_live_value.",
+                  "# TYPE sems_live_value_timestamp_seconds gauge"]
+        totals = ["# HELP sems_live_daily_total Today's generateData totals.",
+                  "# TYPE sems_live_daily_total gauge"]
+        for plant_id, entry in sorted(snap["plants"].items()):
+            for key, item in sorted(entry["series"].items()):
+                labels = f'plant="{_esc(plant_id)}",series="{_esc(key)}",unit="{_esc(item["unit"])}"'
+                lines.append(f"sems_live_value{{{labels}}} {item['value']}")
+                stamps.append(f"sems_live_value_timestamp_seconds{{{labels}}} {item['timestamp']:.0f}")
+            for key, value in sorted(entry["totals"].items()):
+                totals.append(f'sems_live_daily_total{{plant="{_esc(plant_id)}",key="{_esc(key)}"}} {value}')
+        lines += stamps + totals + [
+            "# TYPE sems_live_polls_total counter", f"sems_live_polls_total {snap['polls']}",
+            "# TYPE sems_live_poll_errors_total counter", f"sems_live_poll_errors_total {snap['errors']}",
+            "# TYPE sems_live_appended_points_total counter",
+            f"sems_live_appended_points_total {snap['appended_points']}",
+        ]
+        if snap["last_success"] is not None:
+            lines += ["# TYPE sems_live_last_success_timestamp_seconds gauge",
+                      f"sems_live_last_success_timestamp_seconds {snap['last_success']:.0f}"]
+        return "\n".join(lines) + "\n"
+
+
+def _esc(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def serve(poller: LivePoller, host: str, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+            pass
+
+        def do_GET(self) -> None:  # noqa: N802
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path == "/metrics":
+                body, ctype = poller.metrics().encode(), "text/plain; version=0.0.4; charset=utf-8"
+            elif path in ("", "/latest"):
+                body, ctype = json.dumps(poller.snapshot(), indent=1).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="sems-live-http", daemon=True).start()
+    return server
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Poll today's SEMS curve and append new points.")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help="Seconds between polls (default: %(default)s, the chart cadence)")
+    parser.add_argument("--lag", type=float, default=DEFAULT_LAG,
+                        help="Seconds after each slot boundary to poll (default: %(default)s)")
+    parser.add_argument("--dataset", type=Path, metavar="DIR",
+                        help="Also write new points as fragments into this merger --dataset directory")
+    parser.add_argument("--plant", default="default",
+                        help="Dataset plant partition for a single flat station (default: %(default)s)")
+    parser.add_argument("--no-csv", action="store_true", help="Do not append to plant_power_v2.csv")
+    parser.add_argument("--host", default="127.0.0.1", help="Metrics bind address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=9109, help="Metrics port, 0 to disable (default: %(default)s)")
+    parser.add_argument("--once", action="store_true", help="Poll once and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    exporter.configure()
+    exporter.require_credentials()
+    client = exporter.get_client()
+    auth = exporter.TokenManager(client, exporter.OUTDIR / exporter.TOKEN_CACHE_NAME)
+    plants = exporter.PLANT_IDS
+    if exporter.DISCOVER_PLANTS:
+        plants = exporter.discover_plant_ids(auth, client)
+        if not plants:
+            raise SystemExit("No stations found for this account")
+
+    poller = LivePoller(plants, auth, LiveState(exporter.OUTDIR / STATE_NAME),
+                        dataset_dir=args.dataset, dataset_plant=args.plant, csv=not args.no_csv)
+    if args.once:
+        added = poller.tick()
+        print(f"[✓] {added} new point(s) → {exporter.OUTDIR}" + (f", {poller.errors} failed poll(s)" if poller.errors else ""))
+        return
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    server = serve(poller, args.host, args.port) if args.port else None
+    if server:
+        host, port = server.server_address[:2]
+        print(f"[*] Metrics on http://{host}:{port}/metrics")
+    print(f"[*] Following {len(plants)} station(s) every {args.interval:g}s")
+
+    try:
+        while not stop.is_set():
+            added = poller.tick()
+            stamp = dt.datetime.now(poller.tz).strftime("%H:%M:%S")
+            print(f"  {stamp} +{added} point(s)" + (f", {poller.errors} error(s) so far" if poller.errors else ""))
+            stop.wait(max(0.0, next_tick(time.time(), args.interval, args.lag) - time.time()))
+    finally:
+        if server:
+            server.shutdown()
+        print(f"[✓] Stopped after {poller.polls} poll(s), {poller.appended} point(s) appended")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""On-disk sync manifest recording which SEMS days have been exported.
+
+One SQLite row per (plant, day) with the fetch status, CSV row count and a
+content hash of the raw payload. The exporter consults it to fetch only days
+that are missing, failed, gappy (see sems_validate.py), or still incomplete
+(today and yesterday). A second table does the same per (plant, month) for
+the coarse daily-energy history fetched from month charts.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+MANIFEST_NAME = "sync_manifest.sqlite"
+
+STATUS_OK = "ok"            # complete day, never refetched
+STATUS_PARTIAL = "partial"  # fetched while the day could still change
+STATUS_FAILED = "failed"    # no rows even after retries
+STATUS_GAPS = "gaps"        # rows, but slots missing; re-fetched once more to confirm
+
+# Days this close to today are re-fetched until they age out of the window.
+INCOMPLETE_DAYS = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    plant_id     TEXT NOT NULL,
+    day          TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    rows         INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    fetched_at   TEXT NOT NULL,
+    detail       TEXT,
+    PRIMARY KEY (plant_id, day)
+)
+"""
+
+_MONTHS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS months (
+    plant_id     TEXT NOT NULL,
+    month        TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    rows         INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    fetched_at   TEXT NOT NULL,
+    PRIMARY KEY (plant_id, month)
+)
+"""
+
+
+class DayRecord(NamedTuple):
+    day: str
+    status: str
+    rows: int
+    content_hash: Optional[str]
+    fetched_at: str
+    detail: Optional[str] = None
+
+
+def payload_hash(payload: dict) -> str:
+    """Stable SHA-256 over the payload's `data` block (ignores per-request metadata)."""
+    data = payload.get("data") if isinstance(payload, dict) else None
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_incomplete(day: dt.date, today: Optional[dt.date] = None) -> bool:
+    today = today or dt.date.today()
+    return day >= today - dt.timedelta(days=INCOMPLETE_DAYS)
+
+
+def month_end(month: dt.date) -> dt.date:
+    following = (month.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+    return following - dt.timedelta(days=1)
+
+
+class SyncManifest:
+    """Thin wrapper around the SQLite manifest file in the output folder."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute(_SCHEMA)
+        self._db.execute(_MONTHS_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(days)")}
+        if "detail" not in columns:  # manifests written before gap tracking
+            self._db.execute("ALTER TABLE days ADD COLUMN detail TEXT")
+        self._db.commit()
+
+    def plants(self) -> List[str]:
+        """Every plant with a recorded day or month."""
+        return [row[0] for row in self._db.execute(
+            "SELECT plant_id FROM days UNION SELECT plant_id FROM months ORDER BY plant_id")]
+
+    def records(self, plant_id: str) -> Dict[str, DayRecord]:
+        cur = self._db.execute(
+            "SELECT day, status, rows, content_hash, fetched_at, detail FROM days WHERE plant_id = ?",
+            (plant_id,),
+        )
+        return {row[0]: DayRecord(*row) for row in cur}
+
+    def get(self, plant_id: str, day: dt.date) -> Optional[DayRecord]:
+        cur = self._db.execute(
+            "SELECT day, status, rows, content_hash, fetched_at, detail FROM days WHERE plant_id = ? AND day = ?",
+            (plant_id, day.isoformat()),
+        )
+        row = cur.fetchone()
+        return DayRecord(*row) if row else None
+
+    def pending_days(self, plant_id: str, days: Iterable[dt.date],
+                     today: Optional[dt.date] = None) -> List[dt.date]:
+        """Days that are missing, failed or incomplete; everything else is skipped."""
+        known = self.records(plant_id)
+        pending: List[dt.date] = []
+        for day in days:
+            rec = known.get(day.isoformat())
+            if rec is None or rec.status != STATUS_OK or is_incomplete(day, today):
+                pending.append(day)
+        return pending
+
+    def record(self, plant_id: str, day: dt.date, rows: int, content_hash: Optional[str],
+               today: Optional[dt.date] = None, gaps: Optional[str] = None) -> str:
+        """Upsert the outcome for one day and return the stored status.
+
+        `gaps` describes missing slots of a past day. Such a day is stored as
+        `gaps` and fetched again next run. If the re-fetch returns the same
+        payload, the portal has nothing more and the day is accepted as ok.
+        """
+        detail = gaps
+        if rows <= 0:
+            status = STATUS_FAILED
+        elif is_incomplete(day, today):
+            status = STATUS_PARTIAL
+        elif gaps:
+            previous = self.get(plant_id, day)
+            confirmed = (previous is not None and previous.status == STATUS_GAPS
+                         and previous.content_hash == content_hash)
+            status = STATUS_OK if confirmed else STATUS_GAPS
+            detail = f"{gaps} (confirmed by re-fetch)" if confirmed else gaps
+        else:
+            status = STATUS_OK
+        self._db.execute(
+            "INSERT OR REPLACE INTO days (plant_id, day, status, rows, content_hash, fetched_at, detail) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (plant_id, day.isoformat(), status, rows, content_hash,
+             dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"), detail),
+        )
+        self._db.commit()
+        return status
+
+    def requeue(self, plant_id: str, days: Dict[dt.date, str]) -> int:
+        """Mark days (day -> reason) for re-fetch on the next run; returns the number queued.
+
+        Content hashes are cleared, so an unchanged re-fetch is not taken as
+        confirmation of a gap that was found outside the exporter.
+        """
+        now = dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds")
+        with self._db:
+            for day, reason in days.items():
+                self._db.execute(
+                    "INSERT INTO days (plant_id, day, status, rows, content_hash, fetched_at, detail) "
+                    "VALUES (?, ?, ?, 0, NULL, ?, ?) "
+                    "ON CONFLICT (plant_id, day) DO UPDATE SET status = excluded.status, "
+                    "content_hash = NULL, detail = excluded.detail",
+                    (plant_id, day.isoformat(), STATUS_GAPS, now, reason),
+                )
+        return len(days)
+
+    # ----- coarse history: one row per (plant, first day of month) -----
+    def pending_months(self, plant_id: str, months: Iterable[dt.date],
+                       today: Optional[dt.date] = None) -> List[dt.date]:
+        """Months not yet fetched complete; a month stays pending until its last day is no longer incomplete."""
+        known = {row[0]: row[1] for row in self._db.execute(
+            "SELECT month, status FROM months WHERE plant_id = ?", (plant_id,))}
+        return [m for m in months
+                if known.get(m.isoformat()) != STATUS_OK or is_incomplete(month_end(m), today)]
+
+    def record_month(self, plant_id: str, month: dt.date, rows: int, content_hash: Optional[str],
+                     today: Optional[dt.date] = None) -> str:
+        if rows <= 0:
+            status = STATUS_FAILED
+        elif is_incomplete(month_end(month), today):
+            status = STATUS_PARTIAL
+        else:
+            status = STATUS_OK
+        self._db.execute(
+            "INSERT OR REPLACE INTO months (plant_id, month, status, rows, content_hash, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (plant_id, month.isoformat(), status, rows, content_hash,
+             dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds")),
+        )
+        self._db.commit()
+        return status
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,274 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-stage timers and counters shared by the exporter, merger and visualizer.
+
+Stages are dotted names (`http.request`, `retry.sleep`, `json.parse`,
+`parquet.write`, …). Each timer keeps count/total/min/max and a bounded
+sample for p50/p95/p99, so a slow run can be attributed to the network,
+rate-limit or retry sleeps, decoding or pandas. The scripts write the summary
+at the end of a run as JSON (`*.json`) or OpenMetrics text (any other name):
+
+    exporter      SEMS_METRICS=run_metrics.json  SEMS_PROFILE=cprofile
+    merger/plots  --metrics run_metrics.prom     --profile pyinstrument
+
+Stage times from worker threads add up, so `http.request` can exceed the run's
+wall time. Merger worker processes send their timings back with their results.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import pyinstrument  # optional sampling profiler
+except ModuleNotFoundError:  # pragma: no cover - optional
+    pyinstrument = None
+
+PROFILERS = ("cprofile", "pyinstrument")
+SAMPLE_SIZE = 2048  # per timer, for the quantiles
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Timer:
+    __slots__ = ("count", "total", "min", "max", "samples")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.samples: List[float] = []
+
+    def add(self, seconds: float, rng: random.Random) -> None:
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(seconds)
+        else:  # reservoir sampling keeps a uniform sample of every observation
+            k = rng.randrange(self.count)
+            if k < SAMPLE_SIZE:
+                self.samples[k] = seconds
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+        out = {"count": self.count, "total_s": self.total,
+               "min_s": self.min if self.count else 0.0, "max_s": self.max}
+        for q in QUANTILES:
+            out[f"p{round(q * 100)}_s"] = ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+        return out
+
+
+class Metrics:
+    """Thread-safe registry of stage timers and (optionally labelled) counters."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._t0 = time.perf_counter()
+            self.timers: Dict[str, _Timer] = {}
+            self.counters: Dict[LabelKey, float] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record one `seconds` sample for stage `name`."""
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = _Timer()
+            timer.add(seconds, self._rng)
+
+    @contextlib.contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name: str):
+        """Decorator form of `timer`."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.timer(name):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def count(self, name: str, n: float = 1, **labels: object) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    # ----- combining worker processes -----
+    def drain(self) -> dict:
+        """Raw state for `merge()` in another process; resets this registry."""
+        with self._lock:
+            state = {
+                "timers": {name: (t.count, t.total, t.min, t.max, t.samples) for name, t in self.timers.items()},
+                "counters": list(self.counters.items()),
+            }
+        self.reset()
+        return state
+
+    def merge(self, state: dict) -> None:
+        with self._lock:
+            for name, (count, total, lo, hi, samples) in state["timers"].items():
+                timer = self.timers.get(name)
+                if timer is None:
+                    timer = self.timers[name] = _Timer()
+                timer.count += count
+                timer.total += total
+                timer.min = min(timer.min, lo)
+                timer.max = max(timer.max, hi)
+                room = SAMPLE_SIZE - len(timer.samples)
+                timer.samples.extend(samples[:room])
+            for (name, labels), n in state["counters"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                self.counters[key] = self.counters.get(key, 0) + n
+
+    # ----- output -----
+    def summary(self) -> dict:
+        with self._lock:
+            timers = {name: t.summary() for name, t in sorted(self.timers.items())}
+            counters = [{"name": name, "labels": dict(labels), "value": n}
+                        for (name, labels), n in sorted(self.counters.items())]
+            wall = time.perf_counter() - self._t0
+        return {"started": self.started, "wall_s": wall, "timers": timers, "counters": counters}
+
+    def openmetrics(self, prefix: str = "sems") -> str:
+        """The summary in OpenMetrics text format (timers as summaries in seconds)."""
+        snap = self.summary()
+        lines = [f"# TYPE {prefix}_run_seconds gauge", f"{prefix}_run_seconds {snap['wall_s']:.6f}",
+                 f"# TYPE {prefix}_stage_seconds summary",
+                 f"# UNIT {prefix}_stage_seconds seconds"]
+        for name, t in snap["timers"].items():
+            stage = f'stage="{_escape(name)}"'
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_seconds{{{stage},quantile="{q}"}} {t[f"p{round(q * 100)}_s"]:.6f}')
+            lines.append(f"{prefix}_stage_seconds_sum{{{stage}}} {t['total_s']:.6f}")
+            lines.append(f"{prefix}_stage_seconds_count{{{stage}}} {t['count']}")
+        seen = set()
+        for c in snap["counters"]:
+            metric = f"{prefix}_{c['name'].replace('.', '_')}"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in c["labels"].items())
+            lines.append(f"{metric}_total{{{labels}}} {c['value']:g}" if labels else f"{metric}_total {c['value']:g}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        """JSON for `*.json`, OpenMetrics text otherwise."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix.lower() == ".json":
+            path.write_text(json.dumps(self.summary(), indent=1), encoding="utf-8")
+        else:
+            path.write_text(self.openmetrics(), encoding="utf-8")
+
+    def report(self, limit: int = 12) -> str:
+        """Short human-readable table of the slowest stages."""
+        snap = self.summary()
+        rows = sorted(snap["timers"].items(), key=lambda kv: kv[1]["total_s"], reverse=True)[:limit]
+        if not rows:
+            return ""
+        width = max(len(name) for name, _ in rows)
+        out = [f"    time by stage (wall {snap['wall_s']:.2f}s; thread time adds up):"]
+        for name, t in rows:
+            out.append(f"      {name:<{width}}  {t['total_s']:9.3f}s  ×{t['count']:<7,} "
+                       f"p50 {t['p50_s'] * 1000:8.1f} ms  p99 {t['p99_s'] * 1000:8.1f} ms")
+        return "\n".join(out)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide registry used by the scripts.
+METRICS = Metrics()
+observe = METRICS.observe
+timer = METRICS.timer
+timed = METRICS.timed
+count = METRICS.count
+
+
+@contextlib.contextmanager
+def profiled(mode: Optional[str], output: Optional[Path] = None) -> Iterator[None]:
+    """Run the block under cProfile or pyinstrument (`mode` None = no profiling).
+
+    cProfile stats go to `output` (`*.prof`, for snakeviz/pstats) and the top
+    functions are printed; pyinstrument writes an HTML report to `output`
+    when given, else prints its call tree.
+    """
+    if not mode:
+        yield
+        return
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output is not None:
+                profiler.dump_stats(str(output))
+                print(f"    cProfile stats → {output}")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+        return
+    if mode == "pyinstrument":
+        if pyinstrument is None:
+            raise RuntimeError("--profile pyinstrument needs pyinstrument (pip install pyinstrument)")
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output is not None:
+                Path(output).write_text(profiler.output_html(), encoding="utf-8")
+                print(f"    pyinstrument report → {output}")
+            else:
+                print(profiler.output_text(unicode=True, color=False))
+        return
+    raise ValueError(f"unknown profiler {mode!r} (choose from {', '.join(PROFILERS)})")
+
+
+def finish(metrics_path: Optional[Path], *, verbose: bool = True) -> None:
+    """End-of-run hook: print the stage table and write the summary file if asked."""
+    if metrics_path is None:
+        return
+    if verbose:
+        table = METRICS.report()
+        if table:
+            print(table)
+    METRICS.write(metrics_path)
+    print(f"    metrics → {metrics_path}")
@@ -0,0 +1,410 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Local stand-in for the SEMS portal endpoints the exporter uses.
+
+Implements v1/v2 `Common/CrossLogin`, `v2/Charts/GetPlantPowerChart`,
+`v2/Charts/GetChartByPlant` (month view: daily kWh) and
+`v2/HistoryData/QueryPowerStationByHistory`. Chart days are synthesized in
+the shape of `json_export_example/raw_v2_2025-09-20.json` (deterministic per
+plant and day; today is cut off at the current time). Latency, error rate,
+401 injection, a concurrency capacity (HTTP 429 beyond it) and which chart
+body shape is accepted are configurable so exporter changes can be measured
+offline.
+
+Usage
+-----
+    python sems_mock_server.py --port 8765 --latency-ms 80 --error-rate 0.02
+
+    SEMS_BASE=http://127.0.0.1:8765/api/ \
+    SEMS_LOGIN_V2_URL=http://127.0.0.1:8765/api/v2/Common/CrossLogin \
+    SEMS_LOGIN_V1_URL=http://127.0.0.1:8765/api/v1/Common/CrossLogin \
+    python sems_plant_power_v2.py
+
+`GET /__stats` returns request/injection counters as JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import math
+import random
+import secrets
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 0.0       # mean added service time
+    jitter_ms: float = 0.0        # uniform +/- jitter around the mean
+    error_rate: float = 0.0       # share of chart calls answered with HTTP 500 / hasError
+    auth_error_rate: float = 0.0  # share of chart calls answered with HTTP 401
+    token_ttl: float = 0.0        # seconds a token stays valid (0 = forever)
+    capacity: int = 0             # concurrent chart calls served; more get HTTP 429 (0 = unlimited)
+    stations: int = 1
+    peak_w: float = 4000.0
+    body_shape: str = "any"       # GetPlantPowerChart body accepted: "any", "flat" ({"id": …}) or "model"
+    seed: int = 0
+
+
+@dataclass
+class MockState:
+    config: MockConfig
+    tokens: Dict[str, float] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    rng: random.Random = field(default_factory=random.Random)
+    inflight: int = 0
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def issue_token(self) -> str:
+        token = secrets.token_urlsafe(24)
+        with self.lock:
+            self.tokens[token] = time.time()
+        return token
+
+    def token_valid(self, token: Optional[str]) -> bool:
+        with self.lock:
+            issued = self.tokens.get(token or "")
+        if issued is None:
+            return False
+        ttl = self.config.token_ttl
+        return not ttl or time.time() - issued < ttl
+
+    def enter(self) -> bool:
+        """Admit one chart call unless `capacity` calls are already in flight."""
+        with self.lock:
+            if self.config.capacity and self.inflight >= self.config.capacity:
+                return False
+            self.inflight += 1
+            self.counters["peak_inflight"] = max(self.counters.get("peak_inflight", 0), self.inflight)
+            return True
+
+    def leave(self) -> None:
+        with self.lock:
+            self.inflight -= 1
+
+    def roll(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.rng.random() < rate
+
+
+def station_ids(count: int) -> List[str]:
+    return [f"00000000-0000-4000-8000-{i:012d}" for i in range(1, count + 1)]
+
+
+def synthetic_payload(plant_id: str, day: dt.date, offset: str = "+08:00", *,
+                      peak_w: float = 4000.0, now: Optional[dt.datetime] = None) -> dict:
+    """A GetPlantPowerChart-shaped response with a deterministic PV bell curve.
+
+    Cloudiness varies per plant/day; for today (per `now`) only the slots
+    that have already started are returned, like the real portal.
+    """
+    rng = random.Random(zlib.crc32(f"{plant_id}|{day}".encode()))
+    season = 0.55 + 0.45 * math.cos((day.timetuple().tm_yday - 172) / 365.25 * 2 * math.pi)
+    clouds = rng.uniform(0.35, 1.0)
+    slots = 288
+    if now is not None and day == now.date():
+        slots = (now.hour * 60 + now.minute) // 5 + 1
+
+    xy = []
+    energy_wh = 0.0
+    for i in range(slots):
+        minute = i * 5
+        hour = minute / 60
+        sun = max(0.0, math.sin((hour - 6) / 14 * math.pi)) if 6 <= hour <= 20 else 0.0
+        y = round(peak_w * season * sun * clouds * rng.uniform(0.8, 1.0), 1) if sun else 0.0
+        energy_wh += y * 5 / 60
+        xy.append({"x": f"{minute // 60:02d}:{minute % 60:02d}", "y": y, "z": None})
+
+    generation = round(energy_wh / 1000, 2)
+    date = f"{day.isoformat()}T00:00:00{offset}"
+    return {
+        "language": "en",
+        "function": None,
+        "hasError": False,
+        "msg": "操作成功",
+        "code": "0",
+        "data": {
+            "generateData": [
+                {"key": "Generation", "value": generation, "unit_Key": "kWh"},
+                {"key": "Income", "value": round(generation * 0.25, 2), "unit_Key": "EUR"},
+            ],
+            "lines": [
+                {
+                    "key": "PCurve_Power_PV",
+                    "unit": "W",
+                    "frontColor": "#03bbd6",
+                    "isActive": True,
+                    "axis": 0,
+                    "sort": 1,
+                    "type": "2",
+                    "xy": xy,
+                }
+            ],
+        },
+        "components": {
+            "para": json.dumps({"model": {"id": plant_id, "date": date, "full_script": False}},
+                               separators=(",", ":")),
+            "langVer": 286,
+            "timeSpan": 0,
+            "api": "mock/v2/Charts/GetPlantPowerChart",
+            "msgSocketAdr": None,
+        },
+    }
+
+
+def synthetic_month(plant_id: str, month: dt.date, offset: str = "+08:00", *, peak_w: float = 4000.0,
+                    now: Optional[dt.datetime] = None) -> dict:
+    """A GetChartByPlant month view (range 2): one daily kWh bar per day up to today."""
+    xy = []
+    day = month.replace(day=1)
+    while day.month == month.month and (now is None or day <= now.date()):
+        generation = synthetic_payload(plant_id, day, offset, peak_w=peak_w, now=now)["data"]["generateData"][0]
+        xy.append({"x": day.isoformat(), "y": generation["value"], "z": None})
+        day += dt.timedelta(days=1)
+    return {
+        "language": "en",
+        "function": None,
+        "hasError": False,
+        "msg": "操作成功",
+        "code": "0",
+        "data": {
+            "lines": [
+                {"key": "PVGeneration", "unit": "kWh", "frontColor": "#03bbd6", "isActive": True,
+                 "axis": 0, "sort": 1, "type": "1", "xy": xy},
+            ],
+        },
+        "components": {"para": None, "langVer": 286, "timeSpan": 0,
+                       "api": "mock/v2/Charts/GetChartByPlant", "msgSocketAdr": None},
+    }
+
+
+def _error(code: str, msg: str) -> dict:
+    return {"language": "en", "function": None, "hasError": True, "msg": msg, "code": code,
+            "data": None, "components": None}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "SEMSMock/1.0"
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real portal
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state  # type: ignore[attr-defined]
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        pass
+
+    def _send(self, status: int, obj: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _sleep(self) -> None:
+        cfg = self.state.config
+        delay = cfg.latency_ms + (self.state.rng.uniform(-cfg.jitter_ms, cfg.jitter_ms) if cfg.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _base(self) -> str:
+        host = self.headers.get("Host") or f"{self.server.server_address[0]}:{self.server.server_address[1]}"
+        return f"http://{host}/api/"
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.rstrip("/") == "/__stats":
+            with self.state.lock:
+                self._send(200, dict(self.state.counters))
+            return
+        self._send(404, _error("404", "not found"))
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            body = {}
+        path = self.path.split("?", 1)[0].rstrip("/").lower()
+        self.state.count("requests")
+        if not path.endswith(("/v2/charts/getplantpowerchart", "/v2/charts/getchartbyplant")):
+            self._sleep()
+            self._handle(path, body)
+            return
+        if not self.state.enter():
+            self.state.count("throttled")
+            self._send(429, _error("429", "too many requests"), {"Retry-After": "1"})
+            return
+        try:
+            self._sleep()
+            self._handle(path, body)
+        finally:
+            self.state.leave()
+
+    def _handle(self, path: str, body: dict) -> None:
+        if path.endswith("/common/crosslogin"):
+            self.state.count("logins")
+            token = self.state.issue_token()
+            data = {"uid": "mock-uid", "timestamp": int(time.time() * 1000), "token": token}
+            self._send(200, {"language": "en", "hasError": False, "code": "0", "msg": "",
+                             "api": self._base(), "data": data})
+            return
+
+        token = self.headers.get("token") or self.headers.get("Token")
+        if path.endswith("/v2/historydata/querypowerstationbyhistory"):
+            if not self.state.token_valid(token):
+                self.state.count("auth_rejected")
+                self._send(200, _error("100002", "authorization has expired"))
+                return
+            items = [{"id": sid, "stationname": f"Mock {i}"}
+                     for i, sid in enumerate(station_ids(self.state.config.stations), 1)]
+            self._send(200, {"language": "en", "hasError": False, "code": "0", "msg": "",
+                             "data": {"list": items}})
+            return
+
+        if path.endswith(("/v2/charts/getplantpowerchart", "/v2/charts/getchartbyplant")):
+            month_view = path.endswith("/v2/charts/getchartbyplant")
+            self.state.count("month_requests" if month_view else "chart_requests")
+            if not self.state.token_valid(token):
+                self.state.count("auth_rejected")
+                self._send(401, _error("100002", "authorization has expired"))
+                return
+            if self.state.roll(self.state.config.auth_error_rate):
+                self.state.count("injected_401")
+                self._send(401, _error("100001", "no access, please log in"))
+                return
+            if self.state.roll(self.state.config.error_rate):
+                self.state.count("injected_errors")
+                if self.state.roll(0.5):
+                    self._send(500, _error("500", "internal error"))
+                else:
+                    self._send(200, _error("-1", "system busy"))
+                return
+            shape = "model" if isinstance(body.get("model"), dict) else "flat"
+            if not month_view and self.state.config.body_shape not in ("any", shape):
+                self.state.count("wrong_shape")
+                self._send(200, _error("-1", "bad request body"))
+                return
+            model = body.get("model") if shape == "model" else body
+            try:
+                stamp = dt.datetime.fromisoformat(model["date"])
+                plant_id = model["id"]
+            except (KeyError, TypeError, ValueError):
+                self._send(200, _error("-1", "bad request body"))
+                return
+            offset = stamp.strftime("%z")
+            offset = f"{offset[:3]}:{offset[3:]}" if offset else "+00:00"
+            if month_view:
+                if str(model.get("range")) != "2":
+                    self._send(200, _error("-1", "only the month view (range 2) is mocked"))
+                    return
+                self._send(200, synthetic_month(plant_id, stamp.date(), offset, peak_w=self.state.config.peak_w,
+                                                now=dt.datetime.now(stamp.tzinfo)))
+                return
+            payload = synthetic_payload(plant_id, stamp.date(), offset, peak_w=self.state.config.peak_w,
+                                        now=dt.datetime.now(stamp.tzinfo))
+            self._send(200, payload)
+            return
+
+        self._send(404, _error("404", "unknown endpoint"))
+
+
+class MockSemsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: Optional[MockConfig] = None):
+        super().__init__((host, port), MockHandler)
+        cfg = config or MockConfig()
+        self.state = MockState(cfg, rng=random.Random(cfg.seed))
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    def exporter_env(self) -> Dict[str, str]:
+        """Environment that points sems_plant_power_v2.py at this server."""
+        return {
+            "SEMS_BASE": self.base_url,
+            "SEMS_LOGIN_V2_URL": self.base_url + "v2/Common/CrossLogin",
+            "SEMS_LOGIN_V1_URL": self.base_url + "v1/Common/CrossLogin",
+        }
+
+    def start_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="sems-mock", daemon=True)
+        thread.start()
+        return thread
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a local mock of the SEMS portal API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of chart calls that fail (500/hasError)")
+    parser.add_argument("--auth-error-rate", type=float, default=0.0, help="Share of chart calls answered with 401")
+    parser.add_argument("--token-ttl", type=float, default=0.0, help="Token lifetime in seconds (0 = forever)")
+    parser.add_argument("--stations", type=int, default=1, help="Stations listed for SEMS_STATION_ID=auto")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="Concurrent chart calls served before answering 429 (0 = unlimited)")
+    parser.add_argument("--body-shape", choices=("any", "flat", "model"), default="any",
+                        help="GetPlantPowerChart request body the mock accepts (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        auth_error_rate=args.auth_error_rate,
+        token_ttl=args.token_ttl,
+        stations=args.stations,
+        capacity=args.capacity,
+        body_shape=args.body_shape,
+        seed=args.seed,
+    )
+    server = MockSemsServer(args.host, args.port, config)
+    print(f"[*] Mock SEMS portal on {server.base_url}")
+    for key, value in server.exporter_env().items():
+        print(f"    {key}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
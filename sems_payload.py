@@ -0,0 +1,277 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shared decoding of GetPlantPowerChart payloads.
+
+The exporter, the merger and the archive all walk the same structure:
+`data.generateData[]` (daily totals) and `data.lines[].xy[]` (5-minute
+points). `decode_columns` turns a raw response straight into `DayColumns`
+(parallel lists of series codes, minute-of-day offsets and values), so the
+CSV rows and the Arrow batches come from one walker.
+
+Decoding picks the fastest library installed: msgspec (typed structs, no
+intermediate dicts), then orjson, then the stdlib `json` module.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+try:
+    import msgspec
+except ModuleNotFoundError:  # pragma: no cover - optional speed-up
+    msgspec = None
+
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+BACKEND = "msgspec" if msgspec is not None else "orjson" if orjson is not None else "json"
+
+
+def loads(raw: Union[bytes, str]) -> Any:
+    """Parse JSON text into plain Python objects with the fastest available library."""
+    if msgspec is not None:
+        return msgspec.json.decode(raw)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON (non-ASCII kept as-is)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class DayColumns(NamedTuple):
+    """One day's chart payload in columnar form.
+
+    `series[i]` indexes `line_keys`/`line_units` for point i; `minutes[i]` is
+    the point's offset from local midnight (the `xy.x` "HH:MM" label).
+    """
+    line_keys: List[str]
+    line_units: List[str]
+    series: List[int]
+    minutes: List[int]
+    values: List[float]
+    agg_keys: List[str]
+    agg_values: List[float]
+    agg_units: List[str]
+    para: Optional[str]  # `components.para`, the request body the portal echoes back
+
+    @property
+    def empty(self) -> bool:
+        return not self.values and not self.agg_values
+
+
+def _minute(x: Any) -> Optional[int]:
+    try:
+        return int(x[:2]) * 60 + int(x[3:5])
+    except (TypeError, ValueError):
+        return None
+
+
+# The portal labels points "HH:MM"; a lookup beats parsing every label.
+_MINUTE_OF = {f"{m // 60:02d}:{m % 60:02d}": m for m in range(24 * 60)}
+_NUMERIC = {int, float}
+
+
+def _extend_points(idx: int, xs: List[Any], ys: List[Any], series: List[int],
+                   minutes: List[int], values: List[float]) -> None:
+    """Append one line's points, dropping those without a usable label or value."""
+    mins = list(map(_MINUTE_OF.get, xs))
+    if None not in mins and set(map(type, ys)) <= _NUMERIC:
+        series.extend([idx] * len(ys))
+        minutes.extend(mins)
+        values.extend(ys)
+        return
+    for x, minute, y in zip(xs, mins, ys):  # odd labels or string/null values
+        if minute is None:
+            minute = _minute(x)
+        y = _number(y)
+        if minute is None or y is None:
+            continue
+        series.append(idx)
+        minutes.append(minute)
+        values.append(y)
+
+
+def _number(v: Any) -> Optional[float]:
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return v
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def columns_from_payload(payload: Any) -> DayColumns:
+    """Walk an already-decoded payload dict (the portable path)."""
+    payload = payload if isinstance(payload, dict) else {}
+    data = payload.get("data")
+    data = data if isinstance(data, dict) else {}
+
+    agg_keys: List[str] = []
+    agg_values: List[float] = []
+    agg_units: List[str] = []
+    aggregates = data.get("generateData")
+    if isinstance(aggregates, list):
+        for item in aggregates:
+            if not isinstance(item, dict) or item.get("key") is None:
+                continue
+            value = _number(item.get("value"))
+            if value is None:
+                continue
+            agg_keys.append(item["key"])
+            agg_values.append(value)
+            agg_units.append(item.get("unit_Key") or "")
+
+    line_keys: List[str] = []
+    line_units: List[str] = []
+    series: List[int] = []
+    minutes: List[int] = []
+    values: List[float] = []
+    lines = data.get("lines")
+    if isinstance(lines, list):
+        for line in lines:
+            if not isinstance(line, dict):
+                continue
+            points = line.get("xy") or []
+            if not isinstance(points, list):
+                continue
+            idx = len(line_keys)
+            line_keys.append(line.get("key") or "line")
+            line_units.append(line.get("unit") or "")
+            points = [p for p in points if isinstance(p, dict)]
+            _extend_points(idx, [p.get("x") for p in points], [p.get("y") for p in points],
+                           series, minutes, values)
+
+    components = payload.get("components")
+    para = components.get("para") if isinstance(components, dict) else None
+    return DayColumns(line_keys, line_units, series, minutes, values,
+                      agg_keys, agg_values, agg_units, para if isinstance(para, str) else None)
+
+
+if msgspec is not None:
+    # Only the fields the walkers read; everything else in the response is skipped by the decoder.
+    class _Point(msgspec.Struct):
+        x: Optional[str] = None
+        y: Union[int, float, None] = None
+
+    class _Line(msgspec.Struct):
+        key: Optional[str] = None
+        unit: Optional[str] = None
+        xy: Optional[List[_Point]] = None
+
+    class _Generate(msgspec.Struct):
+        key: Optional[str] = None
+        value: Union[int, float, None] = None
+        unit_Key: Optional[str] = None
+
+    class _Data(msgspec.Struct):
+        generateData: Optional[List[_Generate]] = None
+        lines: Optional[List[_Line]] = None
+
+    class _Components(msgspec.Struct):
+        para: Optional[str] = None
+
+    class _Payload(msgspec.Struct):
+        data: Optional[_Data] = None
+        components: Optional[_Components] = None
+
+    class _Record(msgspec.Struct):
+        day: str
+        payload: _Payload
+
+    _PAYLOAD_DECODER = msgspec.json.Decoder(_Payload)
+    _RECORD_DECODER = msgspec.json.Decoder(_Record)
+
+    def _columns_from_struct(payload: "_Payload") -> DayColumns:
+        data = payload.data or _Data()
+        agg_keys: List[str] = []
+        agg_values: List[float] = []
+        agg_units: List[str] = []
+        for item in data.generateData or ():
+            if item.key is not None and item.value is not None:
+                agg_keys.append(item.key)
+                agg_values.append(item.value)
+                agg_units.append(item.unit_Key or "")
+
+        line_keys: List[str] = []
+        line_units: List[str] = []
+        series: List[int] = []
+        minutes: List[int] = []
+        values: List[float] = []
+        for line in data.lines or ():
+            idx = len(line_keys)
+            line_keys.append(line.key or "line")
+            line_units.append(line.unit or "")
+            points = line.xy or ()
+            _extend_points(idx, [p.x for p in points], [p.y for p in points], series, minutes, values)
+        para = payload.components.para if payload.components is not None else None
+        return DayColumns(line_keys, line_units, series, minutes, values,
+                          agg_keys, agg_values, agg_units, para)
+
+
+def decode_columns(raw: Union[bytes, str]) -> DayColumns:
+    """Decode a raw GetPlantPowerChart response straight into columns.
+
+    With msgspec the JSON is validated into typed structs in one pass; a
+    payload that does not fit them (an error body, a string-typed value)
+    falls back to the generic dict walker. Invalid JSON raises a ValueError
+    subclass with every backend.
+    """
+    if msgspec is not None:
+        try:
+            return _columns_from_struct(_PAYLOAD_DECODER.decode(raw))
+        except msgspec.ValidationError:
+            pass  # valid JSON of another shape; use the generic walker
+    return columns_from_payload(loads(raw))
+
+
+def decode_record(raw: Union[bytes, str]) -> tuple:
+    """Decode an archive line `{"day": …, "payload": …}` into (day, DayColumns)."""
+    if msgspec is not None:
+        try:
+            record = _RECORD_DECODER.decode(raw)
+            return dt.date.fromisoformat(record.day), _columns_from_struct(record.payload)
+        except msgspec.ValidationError:
+            pass  # valid JSON of another shape; use the generic walker
+    record = loads(raw)
+    return dt.date.fromisoformat(record["day"]), columns_from_payload(record["payload"])
+
+
+def _label(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def flatten_rows(cols: DayColumns) -> List[Dict[str, Any]]:
+    """Long-format rows (`series`, `timestamp`, `value`) as written to the exporter CSV.
+
+    Daily totals come first as `aggregate:<key>` rows stamped "daily".
+    """
+    rows: List[Dict[str, Any]] = [
+        {"series": f"aggregate:{key}", "timestamp": "daily", "value": value}
+        for key, value in zip(cols.agg_keys, cols.agg_values)
+    ]
+    keys = cols.line_keys
+    rows.extend(
+        {"series": keys[s], "timestamp": _label(m), "value": v}
+        for s, m, v in zip(cols.series, cols.minutes, cols.values)
+    )
+    return rows
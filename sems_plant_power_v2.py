@@ -13,42 +13,35 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import base64
 import csv
 import datetime as dt
+import functools
+import importlib.util
 import json
 import os
+import queue
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-import requests
+from sems_archive import CODECS as ARCHIVE_CODECS, RawArchive
+from sems_async import CONGESTION_STATUSES, RATE_LIMIT_CODES, AimdLimiter, backoff_delay, retry_after
+from sems_manifest import MANIFEST_NAME, STATUS_GAPS, SyncManifest, is_incomplete, payload_hash
+from sems_metrics import METRICS, PROFILERS, finish as finish_metrics, profiled
+from sems_payload import columns_from_payload, loads as json_loads
+from sems_sink import DayBatch, open_sinks, parse_sinks, purge_csv_days
+from sems_validate import check_day
 
-from pathlib import Path
-from dotenv import load_dotenv  # pip install python-dotenv
-
-ENV_FILE = os.getenv("example.env")  # optional override
-if ENV_FILE:
-    load_dotenv(ENV_FILE, override=False)
-else:
-    load_dotenv(Path(".env"), override=False)
+if TYPE_CHECKING:  # requests is imported when the first client is built
+    import requests
 
 # ========= Configuration (env) =========
-ACCOUNT   = os.getenv("SEMS_ACCOUNT")
-PASSWORD  = os.getenv("SEMS_PASSWORD")
-PLANT_ID  = os.getenv("SEMS_STATION_ID")      # UUID from DevTools
-START     = os.getenv("SEMS_START", "2025-09-01")
-END       = os.getenv("SEMS_END",   dt.date.today().isoformat())
-TZ_OFFSET = os.getenv("SEMS_TZ_OFFSET", "+08:00")  # keep what your portal used
-OUTDIR    = Path(os.getenv("SEMS_OUT", "json_export"))
-BASE_V2   = os.getenv("SEMS_BASE", "https://eu.semsportal.com/api/").rstrip("/") + "/"
-
-SLEEP_SECONDS   = float(os.getenv("SEMS_SLEEP_SECONDS", "1.0"))
-MAX_RETRIES     = int(os.getenv("SEMS_MAX_RETRIES", "2"))
-RETRY_BASE      = 8
-RETRY_MAX_DELAY = 120
-
 UA = (
     "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) "
     "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Mobile Safari/537.36"
@@ -62,17 +55,158 @@ COMMON_HEADERS = {
     "Content-Type": "application/json",
 }
 
-if not (ACCOUNT and PASSWORD and PLANT_ID):
-    sys.exit("Set SEMS_ACCOUNT, SEMS_PASSWORD, SEMS_STATION_ID (and optionally SEMS_START/SEMS_END).")
+RETRY_MAX_DELAY  = 120
+TOKEN_CACHE_NAME = "v2_token_cache.json"
+# SEMS "authorization has expired / please log in" codes
+AUTH_ERROR_CODES = {"100001", "100002"}
+
+
+def configure(env_file: Optional[Path] = None, **overrides: str) -> None:
+    """Load `.env` and apply the SEMS_* settings to this module.
+
+    Called by `main()`, not at import, so the module can be imported as a
+    library without credentials or side effects; until then the defaults
+    apply. `overrides` (SEMS_* names) win over the environment. Credentials
+    are checked and SEMS_OUT created by `require_credentials()`.
+    """
+    from dotenv import load_dotenv  # pip install python-dotenv
+
+    env_file = env_file or os.getenv("example.env")  # optional override
+    load_dotenv(Path(env_file) if env_file else Path(".env"), override=False)
+    _apply_settings({**os.environ, **{k: v for k, v in overrides.items() if v is not None}})
+    plant_dir.cache_clear()
+    raw_archive.cache_clear()
+
+
+def _apply_settings(env) -> None:
+    """Set the module settings from a SEMS_* mapping; missing keys get their defaults."""
+    global ACCOUNT, PASSWORD, PLANT_ID, START, END, TZ_OFFSET, OUTDIR, BASE_V2, LOGIN_V2_URL, LOGIN_V1_URL, \
+           SLEEP_SECONDS, MAX_RETRIES, RETRY_BASE, WORKERS, RATE_PER_SEC, RATE_BURST, ENGINE, MAX_INFLIGHT, \
+           THROTTLE_RETRIES, RATE_EXPLICIT, POOL_SIZE, TRANSPORT_RETRIES, TOKEN_TTL_SECONDS, RESYNC, ARCHIVE, \
+           DEBUG_RAW, METRICS_PATH, PROFILE, PLANT_IDS, DISCOVER_PLANTS, PARTITION_BY_PLANT, FINE_FROM, SINKS
+    ACCOUNT   = env.get("SEMS_ACCOUNT")
+    PASSWORD  = env.get("SEMS_PASSWORD")
+    PLANT_ID  = env.get("SEMS_STATION_ID")      # UUID from DevTools, comma-separated list, or "auto"
+    START     = env.get("SEMS_START", "2025-09-01")
+    END       = env.get("SEMS_END",   dt.date.today().isoformat())
+    TZ_OFFSET = env.get("SEMS_TZ_OFFSET", "+08:00")  # keep what your portal used
+    OUTDIR    = Path(env.get("SEMS_OUT", "json_export"))
+    BASE_V2   = env.get("SEMS_BASE", "https://eu.semsportal.com/api/").rstrip("/") + "/"
+    LOGIN_V2_URL = env.get("SEMS_LOGIN_V2_URL", "https://eu.semsportal.com/api/v2/Common/CrossLogin")
+    LOGIN_V1_URL = env.get("SEMS_LOGIN_V1_URL", "https://www.semsportal.com/api/v1/Common/CrossLogin")
+
+    SLEEP_SECONDS   = float(env.get("SEMS_SLEEP_SECONDS", "1.0"))
+    MAX_RETRIES     = int(env.get("SEMS_MAX_RETRIES", "2"))
+    RETRY_BASE      = float(env.get("SEMS_RETRY_BASE", "8"))  # backoff: uniform(0, base * 2**(n-1))
+
+    WORKERS         = max(1, int(env.get("SEMS_WORKERS", "1")))
+    # Global request budget shared by all workers; defaults to the old one-request-per-sleep pace.
+    RATE_PER_SEC    = float(env.get("SEMS_RATE_PER_SEC", str(1.0 / SLEEP_SECONDS if SLEEP_SECONDS > 0 else 0)))
+    RATE_BURST      = max(1, int(env.get("SEMS_RATE_BURST", str(WORKERS))))
+
+    # "threads" = fixed SEMS_WORKERS pool; "async" = asyncio + httpx with an AIMD in-flight limit
+    ENGINE            = env.get("SEMS_ENGINE", "threads").strip().lower()
+    MAX_INFLIGHT      = max(1, int(env.get("SEMS_MAX_INFLIGHT", "32")))
+    # Extra attempts for throttled (429/5xx/transport) requests in the async engine, on top of MAX_RETRIES
+    THROTTLE_RETRIES  = int(env.get("SEMS_THROTTLE_RETRIES", "8"))
+    # The async engine only adds a fixed rate cap when one is asked for explicitly.
+    RATE_EXPLICIT     = "SEMS_RATE_PER_SEC" in env
+
+    POOL_SIZE          = max(1, int(env.get("SEMS_POOL_SIZE", str(max(WORKERS, 4)))))
+    TRANSPORT_RETRIES  = int(env.get("SEMS_TRANSPORT_RETRIES", "3"))
+
+    TOKEN_TTL_SECONDS  = float(env.get("SEMS_TOKEN_TTL", str(4 * 3600)))
+
+    RESYNC = env.get("SEMS_RESYNC", "").strip().lower() in ("1", "true", "yes")  # ignore the manifest
+
+    # Days before SEMS_FINE_FROM only get daily energy, from one month-chart request per month
+    # (unset = every day at 5 minutes, "none" = no 5-minute days)
+    fine_from = env.get("SEMS_FINE_FROM", "").strip().lower()
+    try:
+        FINE_FROM = None if not fine_from else dt.date.max if fine_from == "none" else ensure_date(fine_from)
+    except ValueError:
+        raise SystemExit("SEMS_FINE_FROM must be a date (YYYY-MM-DD) or 'none'")
+
+    # Raw payload storage: "json" = one indented file per day, "gz"/"zst" = compressed monthly bundles
+    ARCHIVE   = env.get("SEMS_ARCHIVE", "json").strip().lower()
+    DEBUG_RAW = env.get("SEMS_DEBUG_RAW", "").strip().lower() in ("1", "true", "yes")  # raw_v2_<day>_try<n>.txt
+
+    # Where the long-format rows go, each day committed atomically: csv, parquet and/or sqlite
+    try:
+        SINKS = parse_sinks(env.get("SEMS_SINK", "csv"))
+    except ValueError as e:
+        raise SystemExit(f"SEMS_SINK: {e} (choose from csv, parquet, sqlite)")
+
+    # Per-stage timing summary (JSON for *.json, else OpenMetrics) and optional profiler (cprofile|pyinstrument)
+    METRICS_PATH = Path(env["SEMS_METRICS"]) if env.get("SEMS_METRICS") else None
+    PROFILE      = env.get("SEMS_PROFILE", "").strip().lower() or None
+
+    if ARCHIVE not in ("json",) + ARCHIVE_CODECS:
+        raise SystemExit(f"SEMS_ARCHIVE must be one of: json, {', '.join(ARCHIVE_CODECS)}")
+    if ENGINE not in ("threads", "async"):
+        raise SystemExit("SEMS_ENGINE must be 'threads' or 'async'")
+    if PROFILE is not None and PROFILE not in PROFILERS:
+        raise SystemExit(f"SEMS_PROFILE must be one of: {', '.join(PROFILERS)}")
+
+    PLANT_IDS       = [p.strip() for p in (PLANT_ID or "").split(",") if p.strip()]
+    DISCOVER_PLANTS = [p.lower() for p in PLANT_IDS] == ["auto"]
+    # One plant keeps the flat legacy layout; a fleet gets one OUTDIR/plant=<id>/ folder per station.
+    PARTITION_BY_PLANT = DISCOVER_PLANTS or len(PLANT_IDS) > 1
+
 
-OUTDIR.mkdir(exist_ok=True)
+_apply_settings({})  # defaults, so the module is usable as a library before configure()
+
+
+def require_credentials() -> None:
+    """Exit unless SEMS_ACCOUNT/PASSWORD/STATION_ID are set, then create SEMS_OUT."""
+    if not (ACCOUNT and PASSWORD and PLANT_ID):
+        raise SystemExit("Set SEMS_ACCOUNT, SEMS_PASSWORD, SEMS_STATION_ID (and optionally SEMS_START/SEMS_END).")
+    OUTDIR.mkdir(parents=True, exist_ok=True)
 
 # ========= Small utils =========
-def save_json(name: str, obj) -> None:
-    (OUTDIR / name).write_text(json.dumps(obj, indent=2, ensure_ascii=False), encoding="utf-8")
+@functools.lru_cache(maxsize=None)
+def plant_dir(plant_id: str) -> Path:
+    if not PARTITION_BY_PLANT:
+        return OUTDIR
+    d = OUTDIR / f"plant={plant_id}"
+    d.mkdir(exist_ok=True)
+    return d
+
+def save_json(name: str, obj, outdir: Optional[Path] = None) -> None:
+    ((outdir or OUTDIR) / name).write_text(json.dumps(obj, indent=2, ensure_ascii=False), encoding="utf-8")
+
+def save_text(name: str, txt: str, outdir: Optional[Path] = None, *, private: bool = False) -> None:
+    path = (outdir or OUTDIR) / name
+    if private:
+        write_private(path, txt)
+    else:
+        path.write_text(txt, encoding="utf-8")
 
-def save_text(name: str, txt: str) -> None:
-    (OUTDIR / name).write_text(txt, encoding="utf-8")
+def write_private(path: Path, txt: str) -> None:
+    """Write `txt` owner-only (0600) through a temp file, so it is never readable by others, not even briefly."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.unlink(missing_ok=True)  # a leftover keeps its old mode through O_CREAT
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(txt)
+    os.replace(tmp, path)
+
+@functools.lru_cache(maxsize=None)
+def raw_archive(plant_id: str) -> RawArchive:
+    return RawArchive(plant_dir(plant_id), ARCHIVE)
+
+def save_raw(plant_id: str, day: dt.date, payload: dict) -> None:
+    """Store one day's raw payload as a JSON file or in its monthly bundle (main thread only)."""
+    if ARCHIVE == "json":
+        save_json(f"raw_v2_{day}.json", payload, plant_dir(plant_id))
+    else:
+        raw_archive(plant_id).put(day, payload)
+
+def has_raw(plant_id: str, day: dt.date) -> bool:
+    """Whether a raw payload for `day` is already stored (main thread only)."""
+    if ARCHIVE == "json":
+        return (plant_dir(plant_id) / f"raw_v2_{day}.json").exists()
+    return raw_archive(plant_id).has(day)
 
 def resolve_end(end_str: str) -> str:
     if end_str.strip().lower() in ("latest", "today", "now"):
@@ -88,12 +222,122 @@ def daterange(start_d: dt.date, end_d: dt.date):
 def ensure_date(s: str) -> dt.date:
     return dt.date.fromisoformat(s)
 
+class TokenBucket:
+    """Thread-safe token bucket: at most `rate` requests/s with bursts up to `burst`.
+
+    A rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        waited = 0.0
+        while True:
+            wait = self._take()
+            if not wait:
+                break
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            METRICS.observe("ratelimit.wait", waited)
+
+    async def acquire_async(self) -> None:
+        import asyncio
+
+        if self.rate <= 0:
+            return
+        waited = 0.0
+        while True:
+            wait = self._take()
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            METRICS.observe("ratelimit.wait", waited)
+
+# ========= HTTP client =========
+class SemsClient:
+    """Owns one pooled keep-alive session used by every SEMS API call.
+
+    Connections are reused across requests (and worker threads), and the
+    transport retries connection resets/read errors before a response is
+    seen; HTTP-level errors are left to the callers.
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, retries: Optional[int] = None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        pool_size = pool_size or POOL_SIZE
+        retries = TRANSPORT_RETRIES if retries is None else retries
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=0,
+            backoff_factor=0.5,
+            allowed_methods=None,  # the SEMS endpoints are POST-only reads/logins
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(COMMON_HEADERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, url: str, *, headers: Optional[Dict[str, str]] = None, json=None,
+             timeout: float = 25) -> requests.Response:
+        with METRICS.timer("http.request"):
+            r = self.session.post(url, headers=headers, json=json, timeout=timeout)
+        METRICS.count("http.responses", status=r.status_code)
+        return r
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "SemsClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+_CLIENT: Optional[SemsClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+def get_client() -> SemsClient:
+    """Process-wide default client, created on first use."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = SemsClient()
+        return _CLIENT
+
 # ========= Auth: v2 =========
-def crosslogin_v2(account: str, password: str) -> Tuple[str, str]:
-    url = "https://eu.semsportal.com/api/v2/Common/CrossLogin"
-    h = dict(COMMON_HEADERS)
-    r = requests.post(url, headers=h, json={"account": account, "pwd": password}, timeout=20)
-    save_text("auth_v2_status.txt", f"{r.status_code}\n{r.text[:2000]}")
+def crosslogin_v2(account: str, password: str, client: Optional[SemsClient] = None) -> Tuple[str, str]:
+    url = LOGIN_V2_URL
+    client = client or get_client()
+    r = client.post(url, json={"account": account, "pwd": password}, timeout=20)
+    save_text("auth_v2_status.txt", f"{r.status_code}\n{r.text[:2000]}", private=True)  # holds the token
     r.raise_for_status()
     d = r.json()
     if d.get("hasError") or str(d.get("code")) != "0":
@@ -105,12 +349,13 @@ def crosslogin_v2(account: str, password: str) -> Tuple[str, str]:
     return api_base, tok
 
 # ========= Auth: v1 → synthesize v2 token (fallback) =========
-def crosslogin_v1_make_v2token(account: str, password: str) -> Tuple[str, str]:
-    url = "https://www.semsportal.com/api/v1/Common/CrossLogin"
+def crosslogin_v1_make_v2token(account: str, password: str,
+                               client: Optional[SemsClient] = None) -> Tuple[str, str]:
+    url = LOGIN_V1_URL
     hdr = json.dumps({"version": "", "client": "web", "language": "en"})
-    h = dict(COMMON_HEADERS); h["Token"] = hdr
-    r = requests.post(url, headers=h, json={"account": account, "pwd": password}, timeout=20)
-    save_text("auth_v1_status.txt", f"{r.status_code}\n{r.text[:2000]}")
+    client = client or get_client()
+    r = client.post(url, headers={"Token": hdr}, json={"account": account, "pwd": password}, timeout=20)
+    save_text("auth_v1_status.txt", f"{r.status_code}\n{r.text[:2000]}", private=True)  # holds the token
     r.raise_for_status()
     d = r.json()
     if d.get("hasError") or str(d.get("code")) != "0":
@@ -129,112 +374,661 @@ def crosslogin_v1_make_v2token(account: str, password: str) -> Tuple[str, str]:
     v2_token = base64.urlsafe_b64encode(raw).decode("ascii")
     return api_base, v2_token
 
-def auth_any() -> Tuple[str, str]:
+def auth_any(client: Optional[SemsClient] = None) -> Tuple[str, str]:
     try:
-        return crosslogin_v2(ACCOUNT, PASSWORD)
+        return crosslogin_v2(ACCOUNT, PASSWORD, client)
     except Exception:
-        return crosslogin_v1_make_v2token(ACCOUNT, PASSWORD)
+        return crosslogin_v1_make_v2token(ACCOUNT, PASSWORD, client)
 
-# ========= API call =========
-def get_plant_power_day(api_base: str, v2_token: str, plant_id: str, day: dt.date) -> dict:
-    url = api_base.rstrip("/") + "/v2/Charts/GetPlantPowerChart"
-    headers = dict(COMMON_HEADERS); headers["token"] = v2_token
+class AuthError(RuntimeError):
+    """The portal rejected the token (401/403 or an auth-error `code`)."""
+
+def is_auth_error(status_code: int, payload: Optional[dict] = None) -> bool:
+    if status_code in (401, 403):
+        return True
+    return isinstance(payload, dict) and str(payload.get("code")) in AUTH_ERROR_CODES
+
+class TokenManager:
+    """Hands out the current (api_base, token) pair and re-logs in on demand.
+
+    A still-valid token is reused across processes via a small JSON cache in
+    the output folder (keyed by account, expiring after SEMS_TOKEN_TTL).
+    `refresh()` is safe to call from several workers at once: only the first
+    caller holding the stale token performs the login. The cache also keeps
+    which chart body shape the account's portal accepted (`chart_shape`), so
+    later runs send that one first.
+    """
+
+    def __init__(self, client: Optional[SemsClient] = None, cache_path: Optional[Path] = None,
+                 ttl: Optional[float] = None):
+        self.client = client
+        self.cache_path = cache_path
+        self.ttl = TOKEN_TTL_SECONDS if ttl is None else ttl
+        self.logins = 0
+        self._lock = threading.Lock()
+        self._api_base: Optional[str] = None
+        self._token: Optional[str] = None
+        self._obtained_at = 0.0
+        self.chart_shape: Optional[int] = None  # index into chart_bodies() last accepted
+        self._load_cache()
+
+    def _load_cache(self) -> None:
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            c = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if c.get("account") != ACCOUNT:
+            return
+        if isinstance(c.get("chart_shape"), int):
+            self.chart_shape = c["chart_shape"]
+        if time.time() >= float(c.get("expires_at", 0)):
+            return
+        self._api_base, self._token = c.get("api_base"), c.get("token")
+        self._obtained_at = float(c.get("obtained_at", 0))
 
+    def _save_cache(self) -> None:
+        if self.cache_path is None:
+            return
+        c = {"account": ACCOUNT, "api_base": self._api_base, "token": self._token,
+             "obtained_at": self._obtained_at, "expires_at": self._obtained_at + self.ttl,
+             "chart_shape": self.chart_shape}
+        write_private(self.cache_path, json.dumps(c))
+
+    @property
+    def cached(self) -> bool:
+        return self._token is not None and self.logins == 0
+
+    def current(self) -> Tuple[str, str]:
+        with self._lock:
+            if not self._token:
+                self._login()
+            return self._api_base, self._token
+
+    def refresh(self, stale_token: Optional[str] = None) -> Tuple[str, str]:
+        with self._lock:
+            if stale_token is None or stale_token == self._token:
+                self._login()
+            return self._api_base, self._token
+
+    def _login(self) -> None:
+        with METRICS.timer("auth.login"):
+            self._api_base, self._token = auth_any(self.client)
+        self._obtained_at = time.time()
+        self.logins += 1
+        self._save_cache()
+
+    def remember_shape(self, shape: int) -> None:
+        """Send chart body `shape` first from now on, in this run and later ones."""
+        if shape == self.chart_shape:
+            return
+        with self._lock:
+            self.chart_shape = shape
+            self._save_cache()
+
+# ========= API call =========
+def chart_bodies(plant_id: str, day: dt.date) -> List[dict]:
+    """The two request shapes the portal has accepted for GetPlantPowerChart, in try order."""
     dt_iso = f"{day.isoformat()}T00:00:00{TZ_OFFSET}"
-    bodies = [
+    return [
         {"id": plant_id, "date": dt_iso, "full_script": False},
         {"model": {"id": plant_id, "date": dt_iso, "full_script": False}},
     ]
 
+def shape_order(count: int, preferred: Optional[int]) -> List[int]:
+    """Body shape indexes in try order: the one the portal last accepted first."""
+    order = list(range(count))
+    if preferred in order:
+        order.remove(preferred)
+        order.insert(0, preferred)
+    return order
+
+def get_plant_power_day(api_base: str, v2_token: str, plant_id: str, day: dt.date,
+                        limiter: Optional[TokenBucket] = None,
+                        client: Optional[SemsClient] = None,
+                        auth: Optional[TokenManager] = None) -> dict:
+    """One day's chart. With `auth`, the learned body shape goes first and a success is remembered."""
+    url = api_base.rstrip("/") + "/v2/Charts/GetPlantPowerChart"
+    headers = {"token": v2_token}
+    client = client or get_client()
+
     last_err = None
-    for i, body in enumerate(bodies, 1):
+    bodies = chart_bodies(plant_id, day)
+    for i, shape in enumerate(shape_order(len(bodies), auth.chart_shape if auth else None), 1):
+        body = bodies[shape]
         try:
-            r = requests.post(url, headers=headers, json=body, timeout=25)
-            save_text(f"raw_v2_{day}_try{i}.txt", f"{r.status_code}\n{r.text[:2000]}")
+            if limiter is not None:
+                limiter.acquire()
+            r = client.post(url, headers=headers, json=body, timeout=25)
+            if DEBUG_RAW:
+                save_text(f"raw_v2_{day}_try{i}.txt", f"{r.status_code}\n{r.text[:2000]}", plant_dir(plant_id))
+            if is_auth_error(r.status_code):
+                raise AuthError(f"HTTP {r.status_code}")
             r.raise_for_status()
-            j = r.json()
+            with METRICS.timer("json.parse"):
+                j = json_loads(r.content)
             if not j.get("hasError") and str(j.get("code")) == "0":
+                if auth is not None:
+                    auth.remember_shape(shape)
                 return j
+            if is_auth_error(r.status_code, j):
+                raise AuthError(f"code {j.get('code')}: {j.get('msg')}")
             last_err = j
+        except AuthError:
+            raise
         except Exception as e:
             last_err = {"error": str(e)}
     return last_err or {}
 
 # ========= Flatten
-def flatten_lines_xy(payload: dict) -> List[dict]:
-    rows: List[dict] = []
-    data = payload.get("data") or {}
-
-    # daily aggregates
-    gen = data.get("generateData")
-    if isinstance(gen, list):
-        for g in gen:
-            k, v = g.get("key"), g.get("value")
-            if k is not None and v is not None:
-                rows.append({"series": f"aggregate:{k}", "timestamp": "daily", "value": v})
-
-    # time series
-    lines = data.get("lines")
-    if isinstance(lines, list):
-        for line in lines:
-            lkey = line.get("key") or "line"
-            xy = line.get("xy") or []
-            if isinstance(xy, list):
-                for pt in xy:
-                    x = pt.get("x"); y = pt.get("y")
-                    if x is not None and y is not None:
-                        rows.append({"series": lkey, "timestamp": x, "value": y})
+def day_batch(payload: dict, day: dt.date) -> DayBatch:
+    """Columnar rows for one payload; the walker is shared with the merger (sems_payload)."""
+    with METRICS.timer("flatten"):
+        return DayBatch.from_columns(day, columns_from_payload(payload))
+
+# ========= Plant discovery =========
+def discover_plant_ids(auth: TokenManager, client: Optional[SemsClient] = None) -> List[str]:
+    """List the station IDs visible to the logged-in account."""
+    client = client or get_client()
+    for reauthed in (False, True):
+        api_base, v2_token = auth.current()
+        url = api_base.rstrip("/") + "/v2/HistoryData/QueryPowerStationByHistory"
+        r = client.post(url, headers={"token": v2_token}, json={}, timeout=20)
+        save_text("plants_status.txt", f"{r.status_code}\n{r.text[:2000]}")
+        j = r.json() if r.ok else {}
+        if is_auth_error(r.status_code, j) and not reauthed:
+            auth.refresh(v2_token)
+            continue
+        r.raise_for_status()
+        if j.get("hasError") or str(j.get("code")) != "0":
+            raise RuntimeError(f"plant discovery failed: {j}")
+        data = j.get("data")
+        items = data.get("list") if isinstance(data, dict) else data
+        ids = []
+        for item in items or []:
+            if isinstance(item, dict):
+                pid = item.get("id") or item.get("powerstation_id") or item.get("powerStationId")
+                if pid and pid not in ids:
+                    ids.append(pid)
+        return ids
+    return []
+
+# ========= Fetch (one day, with retries) =========
+def fetch_day(auth: TokenManager, plant_id: str, day: dt.date,
+              limiter: Optional[TokenBucket] = None,
+              client: Optional[SemsClient] = None) -> Tuple[str, dt.date, dict, DayBatch, int]:
+    """Fetch one plant-day; the caller stores the raw payload.
+
+    Returns (plant_id, day, payload, batch, retries used). An auth rejection
+    triggers one re-login and an immediate replay instead of a backoff sleep;
+    a second rejection is treated like any other failure.
+    """
+    attempt = 0
+    reauthed = False
+    while True:
+        api_base, v2_token = auth.current()
+        try:
+            j = get_plant_power_day(api_base, v2_token, plant_id, day, limiter, client, auth)
+        except AuthError as e:
+            if not reauthed:
+                reauthed = True
+                auth.refresh(v2_token)
+                continue
+            j = {"error": f"auth rejected after re-login: {e}"}
+
+        batch = day_batch(j, day)
+        if batch or attempt >= MAX_RETRIES:
+            return plant_id, day, j, batch, attempt
+
+        attempt += 1
+        delay = backoff_delay(attempt, RETRY_BASE, RETRY_MAX_DELAY)
+        METRICS.observe("retry.sleep", delay)
+        METRICS.count("retries", reason="empty")
+        time.sleep(delay)
+
+def fetch_jobs_ordered(auth: TokenManager, jobs,
+                       workers: Optional[int] = None, limiter: Optional[TokenBucket] = None,
+                       client: Optional[SemsClient] = None):
+    """Fetch (plant_id, day) jobs on one worker pool, yielding results in input order.
+
+    At most `workers * 4` jobs are in flight so a multi-year fleet backfill
+    never queues every future up front.
+    """
+    workers = workers or WORKERS
+    window = max(1, workers) * 4
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sems") as pool:
+        pending = deque()
+        for plant_id, day in jobs:
+            pending.append(pool.submit(fetch_day, auth, plant_id, day, limiter, client))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# ========= Async engine =========
+async def get_plant_power_day_async(http, api_base: str, v2_token: str, plant_id: str, day: dt.date,
+                                    limiter: AimdLimiter,
+                                    bucket: Optional[TokenBucket] = None,
+                                    auth: Optional[TokenManager] = None) -> Tuple[dict, Optional[float]]:
+    """Async twin of `get_plant_power_day` that feeds the AIMD limiter.
+
+    Returns (payload, throttle): `throttle` is the seconds the portal asked to
+    wait (0 when it gave no Retry-After) when it signalled congestion (a
+    CONGESTION_STATUSES status, a transport error or a RATE_LIMIT_CODES body),
+    else None. Only congestion cuts the limiter.
+    """
+    import httpx
+
+    url = api_base.rstrip("/") + "/v2/Charts/GetPlantPowerChart"
+    headers = {"token": v2_token}
+
+    last_err = None
+    bodies = chart_bodies(plant_id, day)
+    for i, shape in enumerate(shape_order(len(bodies), auth.chart_shape if auth else None), 1):
+        body = bodies[shape]
+        if bucket is not None:
+            await bucket.acquire_async()
+        async with limiter:
+            t0 = time.monotonic()
+            try:
+                r = await http.post(url, headers=headers, json=body)
+            except httpx.HTTPError as e:
+                limiter.congestion()
+                METRICS.count("http.errors", kind=type(e).__name__)
+                return {"error": f"{type(e).__name__}: {e}"}, 0.0
+            latency = time.monotonic() - t0
+        METRICS.observe("http.request", latency)
+        METRICS.count("http.responses", status=r.status_code)
+        if DEBUG_RAW:
+            save_text(f"raw_v2_{day}_try{i}.txt", f"{r.status_code}\n{r.text[:2000]}", plant_dir(plant_id))
+        if is_auth_error(r.status_code):
+            raise AuthError(f"HTTP {r.status_code}")
+        if r.status_code in CONGESTION_STATUSES:
+            limiter.congestion()
+            return {"error": f"HTTP {r.status_code}"}, retry_after(r.headers) or 0.0
+        try:
+            r.raise_for_status()
+            with METRICS.timer("json.parse"):
+                j = json_loads(r.content)
+        except Exception as e:
+            last_err = {"error": str(e)}
+            continue
+        if not j.get("hasError") and str(j.get("code")) == "0":
+            limiter.success(latency)
+            if auth is not None:
+                auth.remember_shape(shape)
+            return j, None
+        if is_auth_error(r.status_code, j):
+            raise AuthError(f"code {j.get('code')}: {j.get('msg')}")
+        if str(j.get("code")) in RATE_LIMIT_CODES:
+            limiter.congestion()
+            return j, retry_after(r.headers) or 0.0
+        last_err = j
+    # No shape accepted (4xx, undecodable or hasError): a failed answer, not congestion.
+    return last_err or {}, None
+
+async def fetch_day_async(auth: TokenManager, http, plant_id: str, day: dt.date,
+                          limiter: AimdLimiter,
+                          bucket: Optional[TokenBucket] = None) -> Tuple[str, dt.date, dict, DayBatch, int]:
+    """Async twin of `fetch_day` with jittered exponential backoff per request.
+
+    Throttled attempts draw from SEMS_THROTTLE_RETRIES before MAX_RETRIES, so
+    the limiter probing the portal's limit does not fail whole days.
+    """
+    import asyncio
+
+    attempt = throttled = 0
+    reauthed = False
+    while True:
+        api_base, v2_token = auth.current()
+        try:
+            j, throttle = await get_plant_power_day_async(http, api_base, v2_token, plant_id, day,
+                                                          limiter, bucket, auth)
+        except AuthError as e:
+            if not reauthed:
+                reauthed = True
+                await asyncio.to_thread(auth.refresh, v2_token)
+                continue
+            j, throttle = {"error": f"auth rejected after re-login: {e}"}, None
+
+        batch = day_batch(j, day)
+        if batch:
+            return plant_id, day, j, batch, attempt + throttled
+        if throttle is not None and throttled < THROTTLE_RETRIES:
+            throttled += 1
+            delay = max(throttle, backoff_delay(throttled, RETRY_BASE, RETRY_MAX_DELAY))
+            METRICS.observe("retry.sleep", delay)
+            METRICS.count("retries", reason="throttled")
+            await asyncio.sleep(delay)
+            continue
+        if attempt >= MAX_RETRIES:
+            return plant_id, day, j, batch, attempt + throttled
+        attempt += 1
+        delay = backoff_delay(attempt, RETRY_BASE, RETRY_MAX_DELAY)
+        METRICS.observe("retry.sleep", delay)
+        METRICS.count("retries", reason="empty")
+        await asyncio.sleep(delay)
+
+async def _drive_async(auth: TokenManager, jobs, limiter: AimdLimiter,
+                       bucket: Optional[TokenBucket], put) -> None:
+    import asyncio
+    import httpx
+
+    cap = int(limiter.maximum)
+    limits = httpx.Limits(max_connections=cap, max_keepalive_connections=cap)
+    transport = httpx.AsyncHTTPTransport(retries=TRANSPORT_RETRIES, limits=limits)
+    async with httpx.AsyncClient(headers=COMMON_HEADERS, timeout=25, transport=transport) as http:
+        window = deque()
+        for plant_id, day in jobs:
+            window.append(asyncio.create_task(fetch_day_async(auth, http, plant_id, day, limiter, bucket)))
+            if len(window) >= cap * 4:
+                await put(await window.popleft())
+        while window:
+            await put(await window.popleft())
+
+_ASYNC_DONE = object()
+
+def fetch_jobs_async(auth: TokenManager, jobs, limiter: AimdLimiter,
+                     bucket: Optional[TokenBucket] = None):
+    """Drop-in for `fetch_jobs_ordered` backed by the asyncio engine.
+
+    The event loop runs on a helper thread and hands results back in input
+    order, so the sinks and manifest in `export()` stay synchronous.
+    """
+    import asyncio
+
+    if importlib.util.find_spec("httpx") is None:  # only the async engine needs it
+        raise RuntimeError("SEMS_ENGINE=async needs httpx (pip install httpx)")
+    results: "queue.Queue" = queue.Queue(maxsize=int(limiter.maximum) * 4)
+
+    def run() -> None:
+        try:
+            asyncio.run(_drive_async(auth, jobs, limiter, bucket,
+                                     lambda item: asyncio.to_thread(results.put, item)))
+        except BaseException as e:  # re-raised in the consuming thread
+            results.put(e)
+        else:
+            results.put(_ASYNC_DONE)
+
+    thread = threading.Thread(target=run, name="sems-async", daemon=True)
+    thread.start()
+    while True:
+        item = results.get()
+        if item is _ASYNC_DONE:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    thread.join()
+
+# ========= Coarse history (month charts) =========
+MONTH_CHART_PATH = "/v2/Charts/GetChartByPlant"
+MONTH_RANGE      = 2  # GetChartByPlant range: 1 = day, 2 = month (one bar per day), 3 = year
+DAILY_CSV        = "daily_energy.csv"
+DAILY_FIELDS     = ["day", "series", "value", "unit"]
+
+def month_body(plant_id: str, month: dt.date) -> dict:
+    return {"id": plant_id, "date": month.isoformat(), "range": MONTH_RANGE}
+
+def _bar_day(x, month: dt.date) -> Optional[dt.date]:
+    """Day of one month-chart bar: an ISO date or a day-of-month number."""
+    text = str(x).strip()
+    try:
+        day = dt.date.fromisoformat(text[:10]) if len(text) >= 10 else month.replace(day=int(text))
+    except ValueError:
+        return None
+    return day if (day.year, day.month) == (month.year, month.month) else None
+
+def month_rows(payload: dict, month: dt.date) -> List[dict]:
+    """Daily rows (day, series, value, unit) from a month-view chart payload."""
+    data = payload.get("data") if isinstance(payload, dict) else None
+    rows = []
+    for line in (data.get("lines") if isinstance(data, dict) else None) or []:
+        if not isinstance(line, dict) or not line.get("key"):
+            continue
+        for pt in line.get("xy") or []:
+            day = _bar_day(pt.get("x"), month) if isinstance(pt, dict) else None
+            y = pt.get("y") if day is not None else None
+            if isinstance(y, (int, float)) and not isinstance(y, bool):
+                rows.append({"day": day.isoformat(), "series": line["key"], "value": float(y),
+                             "unit": line.get("unit") or ""})
     return rows
 
+def fetch_month(auth: TokenManager, plant_id: str, month: dt.date,
+                limiter: Optional[TokenBucket] = None,
+                client: Optional[SemsClient] = None) -> Tuple[dict, List[dict], int]:
+    """One month of daily energy in a single request; returns (payload, rows, retries used)."""
+    client = client or get_client()
+    attempt = 0
+    reauthed = False
+    while True:
+        api_base, v2_token = auth.current()
+        try:
+            if limiter is not None:
+                limiter.acquire()
+            r = client.post(api_base.rstrip("/") + MONTH_CHART_PATH, headers={"token": v2_token},
+                            json=month_body(plant_id, month), timeout=25)
+            j = json_loads(r.content) if r.ok else {}
+            if is_auth_error(r.status_code, j):
+                raise AuthError(f"HTTP {r.status_code} code {j.get('code')}")
+            if not r.ok:
+                j = {"error": f"HTTP {r.status_code}"}
+        except AuthError as e:
+            if not reauthed:
+                reauthed = True
+                auth.refresh(v2_token)
+                continue
+            j = {"error": f"auth rejected after re-login: {e}"}
+        except Exception as e:
+            j = {"error": str(e)}
+
+        rows = month_rows(j, month) if not j.get("hasError") else []
+        if rows or attempt >= MAX_RETRIES:
+            return j, rows, attempt
+        attempt += 1
+        delay = backoff_delay(attempt, RETRY_BASE, RETRY_MAX_DELAY)
+        METRICS.observe("retry.sleep", delay)
+        METRICS.count("retries", reason="empty")
+        time.sleep(delay)
+
+def export_coarse(auth: TokenManager, jobs, manifest: SyncManifest) -> None:
+    """Fetch (plant_id, month) jobs and upsert their days into each plant's daily_energy.csv.
+
+    Every past day the month chart returns is written, not just the requested
+    range, so a month recorded as fetched covers the whole month.
+    """
+    limiter = TokenBucket(RATE_PER_SEC, RATE_BURST)
+    for plant_id, month in jobs:
+        label = f"{plant_id} {month:%Y-%m}" if PARTITION_BY_PLANT else f"{month:%Y-%m}"
+        payload, rows, retries = fetch_month(auth, plant_id, month, limiter)
+        print(f"  {label} (daily energy) …" + (f" ({retries} retries)" if retries else ""))
+        save_json(f"raw_month_v2_{month:%Y-%m}.json", payload, plant_dir(plant_id))
+        today = dt.date.today().isoformat()
+        rows = [r for r in rows if r["day"] <= today]
+        if rows:
+            csv_path = plant_dir(plant_id) / DAILY_CSV
+            purge_csv_days(csv_path, sorted({dt.date.fromisoformat(r["day"]) for r in rows}))
+            need_header = not csv_path.exists()
+            with METRICS.timer("csv.write"), csv_path.open("a", newline="") as f:
+                w = csv.DictWriter(f, fieldnames=DAILY_FIELDS)
+                if need_header:
+                    w.writeheader()
+                w.writerows(rows)
+            print(f"    ✓ {len(rows):,} daily values")
+        else:
+            print("    ! no daily values (even after retries) — check the raw_month_v2 payload")
+        METRICS.count("plant_months", status="ok" if rows else "empty")
+        manifest.record_month(plant_id, month, len(rows), payload_hash(payload) if rows else None)
+
 # ========= Main batch =========
-def main():
-    
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export SEMS plant power curves (configured through .env / SEMS_*).")
+    parser.add_argument("--env-file", type=Path, help="Settings file to load instead of ./.env")
+    parser.add_argument("--start", help="First day, overrides SEMS_START (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last day, overrides SEMS_END (YYYY-MM-DD or 'today')")
+    parser.add_argument("--resync", action="store_true", help="Ignore the sync manifest (SEMS_RESYNC=1)")
+    parser.add_argument("--fine-from", help="5-minute curves from this day on; daily energy only before it "
+                                             "(overrides SEMS_FINE_FROM; 'none' = daily energy only)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the export, under SEMS_PROFILE when set, and write SEMS_METRICS at the end."""
+    args = parse_args(argv)
+    configure(args.env_file, SEMS_START=args.start, SEMS_END=args.end, SEMS_FINE_FROM=args.fine_from,
+              SEMS_RESYNC="1" if args.resync else None)
+    profile_out = OUTDIR / ("profile.prof" if PROFILE == "cprofile" else "profile.html")
+    with profiled(PROFILE, profile_out):
+        export()
+    finish_metrics(METRICS_PATH)
+
+def export():
+    require_credentials()
     start = ensure_date(START)
     end   = ensure_date(resolve_end(END))
 
     if start > end:
         raise SystemExit("SEMS_START must be <= SEMS_END")
 
-    print("[*] Auth (v2 preferred)…")
-    api_base, v2_token = auth_any()
+    # No client yet: an up-to-date run never loads the HTTP stack.
+    auth = TokenManager(None, OUTDIR / TOKEN_CACHE_NAME)
+
+    manifest = SyncManifest(OUTDIR / MANIFEST_NAME)
+    all_days = list(daterange(start, end))
+    coarse_days = [d for d in all_days if FINE_FROM is not None and d < FINE_FROM]
+    fine_days = all_days[len(coarse_days):]
+    months = sorted({d.replace(day=1) for d in coarse_days})
+
+    def plan(plants):
+        pending = {
+            plant_id: fine_days if RESYNC else manifest.pending_days(plant_id, fine_days)
+            for plant_id in plants
+        }
+        month_jobs = [(plant_id, month) for plant_id in plants
+                      for month in (months if RESYNC else manifest.pending_months(plant_id, months))]
+        return pending, [(plant_id, day) for plant_id in plants for day in pending[plant_id]], month_jobs
+
+    plants = PLANT_IDS
+    if DISCOVER_PLANTS:
+        # Stations of earlier runs stand in until there is work to do, so an
+        # up-to-date run needs no login; a run with work re-lists them to pick up new ones.
+        plants = manifest.plants()
+        if RESYNC or not plants or any(plan(plants)[1:]):
+            print("[*] Discovering stations…")
+            plants = discover_plant_ids(auth, get_client())
+            if not plants:
+                manifest.close()
+                raise SystemExit("No stations found for this account")
+            print(f"    {len(plants)} station(s)")
+        else:
+            print(f"[*] {len(plants)} station(s) known from the sync manifest")
+
+    pending, jobs, month_jobs = plan(plants)
+    if coarse_days:
+        print(f"[*] {len(month_jobs)} of {len(months) * len(plants)} plant-month(s) of daily energy need fetching "
+              f"({coarse_days[0]} → {coarse_days[-1]}, one request each)")
+    if fine_days:
+        print(f"[*] {len(jobs)} of {len(fine_days) * len(plants)} plant-day(s) need fetching")
+    if not jobs and not month_jobs:
+        manifest.close()
+        print(f"[✓] Up to date → {OUTDIR}")
+        return
+
+    print("[*] Auth (cached token)…" if auth.cached else "[*] Auth (v2 preferred)…")
+    api_base, _ = auth.current()
     print(f"    API base: {api_base}")
-    save_text("v2_token_header.txt", v2_token)
-
-    csv_path = OUTDIR / "plant_power_v2.csv"
-    need_header = not csv_path.exists()
-
-    with csv_path.open("a", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=["day", "series", "timestamp", "value"])
-        if need_header:
-            w.writeheader()
-
-        for day in daterange(start, end):
-            print(f"  {day} …")
-            attempt = 0
-            while True:
-                j = get_plant_power_day(api_base, v2_token, PLANT_ID, day)
-                save_json(f"raw_v2_{day}.json", j)
-
-                rows = flatten_lines_xy(j)
-                if rows:
-                    for r in rows:
-                        r["day"] = day.isoformat()
-                        w.writerow(r)
-                    print(f"    ✓ {len(rows):,} rows")
-                    break
-
-                attempt += 1
-                if attempt > MAX_RETRIES:
-                    print("    ! no rows (even after retries) — check raw_v2 JSON")
-                    break
-
-                delay = min(RETRY_BASE * attempt, RETRY_MAX_DELAY)
-                print(f"    retry in {delay}s…")
-                time.sleep(delay)
-
-            time.sleep(SLEEP_SECONDS)
-
-    print(f"[✓] Done → {csv_path}")
+
+    if month_jobs:
+        export_coarse(auth, month_jobs, manifest)
+    if not jobs:
+        manifest.close()
+        print(f"[✓] Done → {OUTDIR}")
+        return
+
+    sinks: Dict[str, list] = {}
+    for plant_id in plants:
+        if not pending[plant_id]:
+            continue
+        sinks[plant_id] = open_sinks(plant_dir(plant_id), SINKS)
+        for sink in sinks[plant_id]:
+            dropped = getattr(sink, "recovered", 0)
+            if dropped:
+                print(f"    dropped {dropped:,} uncommitted bytes left by an interrupted run ({sink.path.name})")
+
+    aimd = None
+    gappy = 0
+    # Manifest records of days a sink has only staged (a CSV replacement waits
+    # for one rewrite per run); recorded once the plant's sinks have flushed.
+    unflushed: Dict[str, list] = {}
+
+    def commit(plant_id) -> None:
+        nonlocal gappy
+        for day, rows, content_hash, gaps in unflushed.pop(plant_id, []):
+            if manifest.record(plant_id, day, rows, content_hash, gaps=gaps) == STATUS_GAPS:
+                gappy += 1
+
+    def record(plant_id, *entry) -> None:
+        unflushed.setdefault(plant_id, []).append(entry)
+        if not any(sink.staged for sink in sinks[plant_id]):
+            commit(plant_id)
+
+    try:
+        if ENGINE == "async":
+            aimd = AimdLimiter(WORKERS, 1, MAX_INFLIGHT)
+            bucket = TokenBucket(RATE_PER_SEC, RATE_BURST) if RATE_EXPLICIT else None
+            print(f"[*] Fetching with the async engine (AIMD, {WORKERS}→≤{MAX_INFLIGHT} in flight"
+                  + (f", ≤{RATE_PER_SEC:g} req/s)" if bucket else ")"))
+            results = fetch_jobs_async(auth, jobs, aimd, bucket)
+        else:
+            limiter = TokenBucket(RATE_PER_SEC, RATE_BURST)
+            print(f"[*] Fetching with {WORKERS} worker(s), ≤{RATE_PER_SEC:g} req/s")
+            results = fetch_jobs_ordered(auth, jobs, WORKERS, limiter, get_client())
+        for plant_id, day, payload, batch, retries in results:
+            label = f"{plant_id} {day}" if len(plants) > 1 else f"{day}"
+            print(f"  {label} …" + (f" ({retries} retries)" if retries else ""))
+            if batch:
+                with METRICS.timer("raw.write"):
+                    save_raw(plant_id, day, payload)
+                # Each sink swaps the day's stored rows for the new ones in one commit
+                # (the CSV stages them and swaps them all in one rewrite when flushed).
+                for sink in sinks[plant_id]:
+                    with METRICS.timer(f"{sink.name}.write"):
+                        sink.write_day(batch)
+                METRICS.count("plant_days", status="ok")
+                print(f"    ✓ {batch.size:,} rows")
+            else:
+                METRICS.count("plant_days", status="empty")
+                if has_raw(plant_id, day):
+                    # A failed re-fetch keeps the stored payload and rows of an earlier good fetch.
+                    print("    ! no rows (even after retries) — kept the previously stored payload")
+                else:
+                    with METRICS.timer("raw.write"):
+                        save_raw(plant_id, day, payload)
+                    print("    ! no rows (even after retries) — check the raw_v2 payload")
+            gaps = None
+            if batch and not is_incomplete(day):
+                check = check_day(columns_from_payload(payload), day)
+                if not check.ok:
+                    gaps = check.detail
+                    print(f"    ! {gaps}")
+            record(plant_id, day, batch.size, payload_hash(payload) if batch else None, gaps)
+    finally:
+        try:
+            for plant_id, plant_sinks in sinks.items():
+                for sink in plant_sinks:
+                    with METRICS.timer(f"{sink.name}.write"):
+                        sink.close()
+                commit(plant_id)
+        finally:
+            manifest.close()
+
+    if aimd is not None:
+        print(f"    in-flight limit ended at {int(aimd.limit)} (peak {aimd.peak}, {aimd.cuts} back-offs)")
+    if gappy:
+        print(f"    {gappy} day(s) with gaps queued for re-fetch on the next run")
+    if auth.logins > 1:
+        print(f"    re-authenticated {auth.logins - 1}× during the run")
+    print(f"[✓] Done → {OUTDIR}")
 
 if __name__ == "__main__":
     try:
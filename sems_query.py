@@ -0,0 +1,370 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Ad-hoc SQL over the exported data with DuckDB (out-of-core, multi-threaded).
+
+`connect()` registers these views on an in-memory DuckDB connection:
+
+    points         the merger's point table (UTC `period_start`, `utc_offset`, `series`, `value`, …)
+    aggregates     the daily `generateData` totals
+    raw_points     points read straight from raw_v2_*.json files and monthly bundles
+    local_points   plant, series, unit, ts_local, day, value: the table the ready-made queries use
+
+The source can be a merged Parquet file, a merger `--dataset` directory or an
+exporter output folder (raw files only). Nothing is loaded into pandas; DuckDB
+scans the Parquet row groups or JSON files it needs, in parallel.
+
+Usage
+-----
+    python sems_query.py json_export/dataset daily-energy --series PCurve_Power_PV --start 2025-01-01
+    python sems_query.py json_export/dataset top-days -n 10
+    python sems_query.py sems_plant.parquet self-consumption --grid-series PCurve_Power_Meter
+    python sems_query.py json_export/dataset sql "SELECT series, count(*) FROM points GROUP BY ALL"
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import duckdb
+except ModuleNotFoundError as exc:  # pragma: no cover - optional dependency
+    duckdb = None
+    _DUCKDB_IMPORT_ERROR = exc
+else:
+    _DUCKDB_IMPORT_ERROR = None
+
+from merge_sems_json_to_parquet import AGGREGATES_DIR, DEFAULT_PLANT, POINT_HOURS, POINTS_DIR, aggregates_path
+from sems_archive import BUNDLE_GLOBS, CODECS
+
+DEFAULT_PV_SERIES = "PCurve_Power_PV"
+DEFAULT_LOAD_SERIES = "PCurve_Power_Load"
+KWH_PER_W_POINT = POINT_HOURS / 1000.0
+
+# Only the payload fields the raw view reads; the rest of each response is skipped by the JSON reader.
+_LINE = 'STRUCT("key" VARCHAR, unit VARCHAR, xy STRUCT(x VARCHAR, y JSON)[])'
+_DATA = f"STRUCT(lines {_LINE}[])"
+_DAY_FROM_NAME = r"raw_v2_(\d{4}-\d{2}-\d{2})"
+_PLANT_FROM_PATH = r"plant=([^/\\]+)[/\\]"
+
+
+def _sql_str(value: object) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# ========= Views =========
+def _points_view(source: Path) -> Tuple[Optional[str], Optional[str]]:
+    """SELECTs for the `points` and `aggregates` views, or (None, None) for a raw folder."""
+    if source.is_file():
+        aggs = aggregates_path(source)
+        return (
+            f"SELECT *, {_sql_str(DEFAULT_PLANT)} AS plant FROM read_parquet({_sql_str(source)})",
+            f"SELECT *, {_sql_str(DEFAULT_PLANT)} AS plant FROM read_parquet({_sql_str(aggs)})"
+            if aggs.exists() else None,
+        )
+    if (source / POINTS_DIR).is_dir():
+        def hive(table: str) -> str:
+            pattern = (source / table).as_posix() + "/**/*.parquet"
+            return (f"SELECT * FROM read_parquet({_sql_str(pattern)}, hive_partitioning = true, "
+                    f"union_by_name = true)")
+        return hive(POINTS_DIR), hive(AGGREGATES_DIR) if any((source / AGGREGATES_DIR).glob("**/*.parquet")) else None
+    return None, None
+
+
+def _raw_sources(folder: Path) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Glob patterns for day files and (bundle glob, codec) pairs in `folder` and its plant=* folders."""
+    day_globs, bundle_globs = [], []
+    for directory in [folder] + sorted(p for p in folder.glob("plant=*") if p.is_dir()):
+        if any(directory.glob("raw_v2_????-??-??.json")):
+            day_globs.append((directory / "raw_v2_????-??-??.json").as_posix())
+        for pattern, codec in zip(BUNDLE_GLOBS, CODECS):
+            if any(directory.glob(pattern)):
+                bundle_globs.append(((directory / pattern).as_posix(), codec))
+    return day_globs, bundle_globs
+
+
+def _raw_view(folder: Path) -> Optional[str]:
+    """SELECT over raw payloads; a day kept in a bundle wins over its day file, the last bundle copy wins."""
+    day_globs, bundle_globs = _raw_sources(folder)
+    if not day_globs and not bundle_globs:
+        return None
+    parts = []
+    for pattern in day_globs:
+        parts.append(
+            f"SELECT coalesce(regexp_extract(filename, {_sql_str(_PLANT_FROM_PATH)}, 1), '') AS folder, "
+            f"CAST(regexp_extract(filename, {_sql_str(_DAY_FROM_NAME)}, 1) AS DATE) AS day, 0 AS archived, "
+            f"0 AS ordinal, data FROM read_json({_sql_str(pattern)}, filename = true, ignore_errors = true, "
+            f"columns = {{'data': {_sql_str(_DATA)}}})"
+        )
+    for pattern, codec in bundle_globs:
+        compression = "zstd" if codec == "zst" else "gzip"
+        parts.append(
+            f"SELECT coalesce(regexp_extract(filename, {_sql_str(_PLANT_FROM_PATH)}, 1), '') AS folder, "
+            f"day, 1 AS archived, row_number() OVER () AS ordinal, payload.data AS data "
+            f"FROM read_json({_sql_str(pattern)}, format = 'newline_delimited', "
+            f"compression = {_sql_str(compression)}, filename = true, ignore_errors = true, "
+            f"columns = {{'day': 'DATE', 'payload': {_sql_str('STRUCT(data ' + _DATA + ')')}}})"
+        )
+    days = " UNION ALL ".join(parts)
+    plant = f"CASE WHEN folder = '' THEN {_sql_str(DEFAULT_PLANT)} ELSE folder END"
+    return f"""
+        WITH days AS ({days}),
+        latest AS (
+            SELECT * FROM days
+            QUALIFY row_number() OVER (PARTITION BY folder, day ORDER BY archived DESC, ordinal DESC) = 1
+        ),
+        lines AS (SELECT {plant} AS plant, day, unnest(data.lines) AS line FROM latest),
+        pts AS (SELECT plant, day, line."key" AS series, line.unit AS unit, unnest(line.xy) AS pt FROM lines)
+        SELECT plant, series, coalesce(unit, '') AS unit,
+               day + to_minutes(CAST(substr(pt.x, 1, 2) AS INTEGER) * 60
+                                + CAST(substr(pt.x, 4, 2) AS INTEGER)) AS ts_local,
+               day, TRY_CAST(CAST(pt.y AS VARCHAR) AS DOUBLE) AS value
+        FROM pts
+        WHERE regexp_full_match(pt.x, '\\d\\d:\\d\\d') AND TRY_CAST(CAST(pt.y AS VARCHAR) AS DOUBLE) IS NOT NULL
+    """
+
+
+def connect(source: Path, *, raw: Optional[Path] = None, threads: Optional[int] = None,
+            memory_limit: Optional[str] = None) -> "duckdb.DuckDBPyConnection":
+    """In-memory DuckDB connection with the views above registered over `source`.
+
+    `raw` additionally exposes an exporter folder as `raw_points` when
+    `source` is Parquet. Views are lazy: nothing is read until a query runs.
+    """
+    if duckdb is None:
+        raise RuntimeError(f"duckdb not available ({_DUCKDB_IMPORT_ERROR}). Install duckdb first.")
+    source = Path(source).expanduser().resolve()
+    if not source.exists():
+        raise FileNotFoundError(f"Input not found: {source}")
+
+    con = duckdb.connect()
+    con.execute("SET TimeZone = 'UTC'")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    if memory_limit:
+        con.execute(f"SET memory_limit = {_sql_str(memory_limit)}")
+
+    points, aggregates = _points_view(source)
+    raw_folder = Path(raw).expanduser().resolve() if raw else (source if points is None else None)
+    raw_select = _raw_view(raw_folder) if raw_folder is not None else None
+    if points is None and raw_select is None:
+        raise ValueError(f"No Parquet output, --dataset directory or raw_v2 files found in {source}")
+
+    if points is not None:
+        con.execute(f"CREATE VIEW points AS {points}")
+        con.execute(
+            "CREATE VIEW local_points AS SELECT plant, CAST(series AS VARCHAR) AS series, "
+            "CAST(unit AS VARCHAR) AS unit, "
+            "CAST(period_start AS TIMESTAMP) + to_minutes(CAST(utc_offset AS INTEGER)) AS ts_local, "
+            "CAST(CAST(period_start AS TIMESTAMP) + to_minutes(CAST(utc_offset AS INTEGER)) AS DATE) AS day, "
+            "CAST(value AS DOUBLE) AS value, period_start FROM points"
+        )
+    if aggregates is not None:
+        con.execute(f"CREATE VIEW aggregates AS {aggregates}")
+    if raw_select is not None:
+        con.execute(f"CREATE VIEW raw_points AS {raw_select}")
+        if points is None:
+            con.execute("CREATE VIEW local_points AS SELECT *, NULL::TIMESTAMPTZ AS period_start FROM raw_points")
+    return con
+
+
+# ========= Ready-made queries =========
+# Values are inlined as quoted literals: binding parameters makes the duckdb
+# module import pandas (~0.5 s), longer than the queries themselves.
+def _in(values: Sequence[str]) -> str:
+    return ", ".join(_sql_str(v) for v in values)
+
+
+def _filters(series: Optional[Sequence[str]] = None, plant: Optional[Sequence[str]] = None,
+             start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> str:
+    """WHERE clause over `local_points`. Date bounds are also applied to the UTC
+    `period_start` with a day of margin, so Parquet row groups outside the range are skipped."""
+    clauses = ["TRUE"]
+    if series:
+        clauses.append(f"series IN ({_in(series)})")
+    if plant:
+        clauses.append(f"plant IN ({_in(plant)})")
+    if start:
+        margin = start - dt.timedelta(days=1)
+        clauses.append(f"day >= DATE '{start.isoformat()}' "
+                       f"AND (period_start IS NULL OR period_start >= TIMESTAMPTZ '{margin.isoformat()} 00:00:00+00')")
+    if end:
+        margin = end + dt.timedelta(days=2)
+        clauses.append(f"day <= DATE '{end.isoformat()}' "
+                       f"AND (period_start IS NULL OR period_start < TIMESTAMPTZ '{margin.isoformat()} 00:00:00+00')")
+    return " AND ".join(clauses)
+
+
+def daily_energy(con, **filters) -> "duckdb.DuckDBPyRelation":
+    """kWh per plant, series and local day (mean power × 5 minutes per point)."""
+    return con.sql(f"""
+        SELECT plant, series, day, round(sum(value) * {KWH_PER_W_POINT}, 3) AS energy_kwh, count(*) AS points
+        FROM local_points WHERE {_filters(**filters)}
+        GROUP BY ALL ORDER BY plant, series, day
+    """)
+
+
+def peak_power(con, **filters) -> "duckdb.DuckDBPyRelation":
+    """Highest value per plant, series and local day, and when it happened."""
+    return con.sql(f"""
+        SELECT plant, series, day, max(value) AS peak, arg_max(ts_local, value) AS peak_at,
+               any_value(unit) AS unit
+        FROM local_points WHERE {_filters(**filters)}
+        GROUP BY ALL ORDER BY plant, series, day
+    """)
+
+
+def top_days(con, n: int = 10, series: str = DEFAULT_PV_SERIES, **filters) -> "duckdb.DuckDBPyRelation":
+    """The `n` local days with the most energy in `series`, per plant."""
+    return con.sql(f"""
+        SELECT plant, day, round(sum(value) * {KWH_PER_W_POINT}, 3) AS energy_kwh, max(value) AS peak
+        FROM local_points WHERE {_filters(series=[series], **filters)}
+        GROUP BY plant, day
+        QUALIFY row_number() OVER (PARTITION BY plant ORDER BY energy_kwh DESC) <= {int(n)}
+        ORDER BY plant, energy_kwh DESC
+    """)
+
+
+def self_consumption(con, *, pv_series: str = DEFAULT_PV_SERIES, load_series: Optional[str] = None,
+                     grid_series: Optional[str] = None, **filters) -> "duckdb.DuckDBPyRelation":
+    """Daily share of PV used on site.
+
+    With a load series, self-consumed power is min(PV, load) per slot. With a
+    grid meter series (positive = export, as in simulate_home_battery.py) it
+    is PV minus export and the load is PV minus grid.
+    """
+    if not (load_series or grid_series):
+        load_series = DEFAULT_LOAD_SERIES
+    if load_series:
+        other, used, load = load_series, "least(pv, greatest(other, 0))", "other"
+    else:
+        other, used, load = grid_series, "greatest(pv - greatest(other, 0), 0)", "pv - other"
+    return con.sql(f"""
+        WITH slots AS (
+            SELECT plant, day, ts_local,
+                   max(value) FILTER (series = {_sql_str(pv_series)}) AS pv,
+                   max(value) FILTER (series = {_sql_str(other)}) AS other
+            FROM local_points WHERE {_filters(series=[pv_series, other], **filters)}
+            GROUP BY ALL
+        )
+        SELECT plant, day,
+               round(sum(pv) * {KWH_PER_W_POINT}, 3) AS pv_kwh,
+               round(sum({used}) * {KWH_PER_W_POINT}, 3) AS self_consumed_kwh,
+               round(sum(pv - {used}) * {KWH_PER_W_POINT}, 3) AS exported_kwh,
+               round(sum({load}) * {KWH_PER_W_POINT}, 3) AS load_kwh,
+               round(sum({used}) / nullif(sum(pv), 0), 4) AS self_consumption,
+               round(sum({used}) / nullif(sum({load}), 0), 4) AS self_sufficiency
+        FROM slots WHERE pv IS NOT NULL AND other IS NOT NULL
+        GROUP BY ALL ORDER BY plant, day
+    """)
+
+
+QUERIES = {
+    "daily-energy": daily_energy,
+    "peak": peak_power,
+    "top-days": top_days,
+    "self-consumption": self_consumption,
+}
+
+
+# ========= CLI =========
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Query the SEMS Parquet output or raw archive with DuckDB.")
+    parser.add_argument("source", type=Path,
+                        help="Merged Parquet file, --dataset directory, or exporter folder with raw_v2 files")
+    parser.add_argument("--raw", type=Path, metavar="DIR", help="Also expose this exporter folder as raw_points")
+    parser.add_argument("--threads", type=int, help="DuckDB worker threads (default: all cores)")
+    parser.add_argument("--memory-limit", help="DuckDB memory limit before spilling to disk, e.g. 2GB")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="Write the result to a .csv, .parquet or .json file instead of printing it")
+    parser.add_argument("--max-rows", type=int, default=40, help="Rows printed (default: %(default)s)")
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--series", action="append", help="Series to include (repeat or comma-separate)")
+    common.add_argument("--plant", action="append", help="Plant(s) to include")
+    common.add_argument("--start", type=dt.date.fromisoformat, help="First local day (YYYY-MM-DD)")
+    common.add_argument("--end", type=dt.date.fromisoformat, help="Last local day (YYYY-MM-DD)")
+
+    sub = parser.add_subparsers(dest="query", required=True)
+    sub.add_parser("daily-energy", parents=[common], help="kWh per plant, series and day")
+    sub.add_parser("peak", parents=[common], help="Peak value per plant, series and day")
+    top = sub.add_parser("top-days", parents=[common], help="Top-N production days")
+    top.add_argument("-n", type=int, default=10, help="Days per plant (default: %(default)s)")
+    sc = sub.add_parser("self-consumption", parents=[common], help="Daily self-consumption and self-sufficiency")
+    sc.add_argument("--pv-series", default=DEFAULT_PV_SERIES, help="PV power series (default: %(default)s)")
+    sc.add_argument("--load-series", help=f"Household load series (default: {DEFAULT_LOAD_SERIES})")
+    sc.add_argument("--grid-series", help="Grid meter series, positive = export (instead of a load series)")
+    sql = sub.add_parser("sql", help="Run any SQL against the registered views")
+    sql.add_argument("statement", help='e.g. "SELECT series, count(*) FROM points GROUP BY ALL"')
+    return parser.parse_args(argv)
+
+
+def _split(values: Optional[Sequence[str]]) -> Optional[List[str]]:
+    if not values:
+        return None
+    return [v.strip() for value in values for v in value.split(",") if v.strip()]
+
+
+def run(con, args: argparse.Namespace) -> "duckdb.DuckDBPyRelation":
+    if args.query == "sql":
+        return con.sql(args.statement)
+    filters = {"plant": _split(args.plant), "start": args.start, "end": args.end}
+    if args.query == "top-days":
+        series = _split(args.series)
+        return top_days(con, args.n, series[0] if series else DEFAULT_PV_SERIES, **filters)
+    if args.query == "self-consumption":
+        return self_consumption(con, pv_series=args.pv_series, load_series=args.load_series,
+                                grid_series=args.grid_series, **filters)
+    return QUERIES[args.query](con, series=_split(args.series), **filters)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    con = connect(args.source, raw=args.raw, threads=args.threads, memory_limit=args.memory_limit)
+    t0 = time.perf_counter()
+    rel = run(con, args)
+    if args.output is not None:
+        suffix = args.output.suffix.lower()
+        if suffix == ".parquet":
+            rel.write_parquet(str(args.output))
+        elif suffix == ".csv":
+            rel.write_csv(str(args.output))
+        elif suffix == ".json":
+            con.sql(f"COPY ({rel.sql_query()}) TO {_sql_str(args.output)} (FORMAT json, ARRAY true)")
+        else:
+            raise SystemExit("--output must end in .csv, .parquet or .json")
+        print(f"[✓] {args.query} → {args.output} ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        return
+    rows = rel.fetchall()
+    widths = [max([len(c)] + [len(_cell(r[i])) for r in rows[: args.max_rows]]) for i, c in enumerate(rel.columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(rel.columns, widths)))
+    for row in rows[: args.max_rows]:
+        print("  ".join(_cell(v).ljust(w) for v, w in zip(row, widths)))
+    more = f", {len(rows) - args.max_rows:,} not shown" if len(rows) > args.max_rows else ""
+    print(f"({len(rows):,} rows{more}; {(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+def _cell(value: object) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-day atomic output sinks for the exporter's long-format rows.
+
+The exporter hands each fetched day to its sinks as one `DayBatch` (parallel
+`series`/`timestamp`/`value` lists, no per-row dicts) and records the day in
+the sync manifest only after every sink has committed it. A run that is
+killed mid-day therefore leaves no partial day behind:
+
+    csv      plant_power_v2.csv: a new day is encoded as one block, appended,
+             fsynced, then acknowledged in a `.commit` sidecar holding the
+             committed length, inode and each day's byte ranges. Opening the
+             sink truncates anything past it. Days that are already stored are
+             staged and replaced together by `flush()`: one copy of the file
+             without their ranges, their new blocks appended, one rename.
+    parquet  plant_power_v2/day=YYYY-MM-DD/part-0.parquet (Hive layout): one
+             file per day, written to a hidden temp file and renamed.
+    sqlite   plant_power_v2.sqlite: DELETE and INSERT of the day in one transaction.
+
+Choose with SEMS_SINK (comma-separated, default `csv`). Stored rows of a day are
+only replaced by `write_day` with a new, non-empty batch, so a failed re-fetch
+leaves the earlier rows in place. A day counts as committed once no sink
+reports it `staged`; `close()` flushes.
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sems_payload import DayColumns
+
+SINKS = ("csv", "parquet", "sqlite")
+CSV_NAME = "plant_power_v2.csv"
+CSV_FIELDS = ["day", "series", "timestamp", "value"]
+COMMIT_SUFFIX = ".commit"
+PARQUET_DIR = "plant_power_v2"
+SQLITE_NAME = "plant_power_v2.sqlite"
+
+
+class DayBatch(NamedTuple):
+    """One day's rows in columnar form; daily totals come first as `aggregate:<key>` / "daily"."""
+    day: dt.date
+    series: List[str]
+    timestamps: List[str]
+    values: List[float]
+
+    @property
+    def size(self) -> int:
+        return len(self.values)
+
+    def __bool__(self) -> bool:
+        return bool(self.values)
+
+    @classmethod
+    def from_columns(cls, day: dt.date, cols: DayColumns, *, aggregates: bool = True) -> "DayBatch":
+        keys = cols.line_keys
+        series = [f"aggregate:{k}" for k in cols.agg_keys] if aggregates else []
+        timestamps = ["daily"] * len(series)
+        values = list(cols.agg_values) if aggregates else []
+        series.extend(keys[s] for s in cols.series)
+        timestamps.extend(f"{m // 60:02d}:{m % 60:02d}" for m in cols.minutes)
+        values.extend(cols.values)
+        return cls(day, series, timestamps, values)
+
+
+def _add_range(index: Dict[str, List[List[int]]], day: str, start: int, end: int) -> None:
+    """Record bytes [start, end) as rows of `day`, merging with a range that ends at `start`."""
+    spans = index.setdefault(day, [])
+    if spans and spans[-1][1] == start:
+        spans[-1][1] = end
+    else:
+        spans.append([start, end])
+
+
+def _copy_csv_without(src_path: Path, dst, drop: Set[str]) -> int:
+    """Copy `src_path` into the open text file `dst`, skipping rows whose `day` is in `drop`."""
+    removed = 0
+    with src_path.open(newline="", encoding="utf-8") as src:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        header = next(reader, None)
+        if header is None:
+            return 0
+        writer.writerow(header)
+        day_idx = header.index("day") if "day" in header else 0
+        for row in reader:
+            if row and row[day_idx] in drop:
+                removed += 1
+                continue
+            writer.writerow(row)
+    return removed
+
+
+def purge_csv_days(csv_path: Path, days) -> int:
+    """Drop every CSV row whose `day` is in `days`; returns the number removed.
+
+    Streams through a temp file and only replaces the CSV if something was
+    actually removed, so refetched days never end up duplicated.
+    """
+    drop = {d.isoformat() for d in days}
+    if not drop or not csv_path.exists():
+        return 0
+    tmp = csv_path.with_suffix(csv_path.suffix + ".tmp")
+    with tmp.open("w", newline="", encoding="utf-8") as dst:
+        removed = _copy_csv_without(csv_path, dst, drop)
+    if removed:
+        os.replace(tmp, csv_path)
+    else:
+        tmp.unlink()
+    return removed
+
+
+# ========= Sinks =========
+class CsvSink:
+    """CSV whose committed state (length, inode and day → byte ranges) lives in `<csv>.commit`.
+
+    Appends never read the file. Replacements of stored days are staged and
+    applied together by `flush()` in one copy of the file, so a resync of N
+    days costs one rewrite instead of N.
+    """
+
+    name = "csv"
+    max_staged_bytes = 32 << 20  # flush earlier rather than hold more replacements in memory
+
+    def __init__(self, directory: Path, filename: str = CSV_NAME):
+        self.path = Path(directory) / filename
+        self.commit_path = self.path.with_name(self.path.name + COMMIT_SUFFIX)
+        self._index: Dict[str, List[List[int]]] = {}
+        self._end = self._inode = 0
+        self._staged: Dict[str, bytes] = {}
+        self.recovered = self._recover()
+
+    @property
+    def staged(self) -> bool:
+        """True while replaced days wait for `flush()`."""
+        return bool(self._staged)
+
+    def _committed(self) -> Tuple[int, int, Optional[dict]]:
+        try:
+            commit = json.loads(self.commit_path.read_text(encoding="utf-8"))
+            days = commit.get("days")
+            return int(commit["end"]), int(commit.get("inode", -1)), days if isinstance(days, dict) else None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return -1, -1, None
+
+    def _acknowledge(self) -> None:
+        st = self.path.stat()
+        self._end, self._inode = st.st_size, st.st_ino
+        tmp = self.commit_path.with_name(self.commit_path.name + ".tmp")
+        tmp.write_text(json.dumps({"end": st.st_size, "inode": st.st_ino, "days": self._index},
+                                  separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.commit_path)
+
+    def _scan(self) -> Dict[str, List[List[int]]]:
+        """Rebuild the day index from the file (only when the marker cannot be trusted)."""
+        index: Dict[str, List[List[int]]] = {}
+        with self.path.open("rb") as fh:
+            pos = len(fh.readline())  # header
+            for line in fh:
+                day = line.split(b",", 1)[0].decode("utf-8", "replace")
+                if line.strip():
+                    _add_range(index, day, pos, pos + len(line))
+                pos += len(line)
+        return index
+
+    def _recover(self) -> int:
+        """Truncate an uncommitted tail; returns the bytes dropped."""
+        if not self.path.exists():
+            self.commit_path.unlink(missing_ok=True)
+            return 0
+        st = self.path.stat()
+        size = st.st_size
+        end, inode, days = self._committed()
+        if inode != st.st_ino or not 0 <= end <= size:
+            # No sidecar yet, or the file was replaced whole (a flush or
+            # purge_csv_days, both complete before the rename): trust whole lines only.
+            with self.path.open("rb") as fh:
+                fh.seek(max(0, size - 65536))
+                tail = fh.read()
+            end = size - (len(tail) - tail.rfind(b"\n") - 1) if b"\n" in tail else size
+            days = None
+        if end < size:
+            with self.path.open("r+b") as fh:
+                fh.truncate(end)
+        if days is None or any(e > end for ranges in days.values() for _, e in ranges):
+            days = self._scan()  # a marker from before the index, or a rebuilt tail
+        self._index = days
+        self._acknowledge()
+        return size - end
+
+    def stored_days(self) -> Set[str]:
+        """ISO days with committed rows in the CSV."""
+        return set(self._index)
+
+    def write_day(self, batch: DayBatch, *, replace: bool = True) -> None:
+        """Commit `batch`, or stage it until `flush()` when it replaces a stored day.
+
+        A day that is not stored yet (or `replace=False`) is appended and
+        fsynced right away; its rows are added to the day's stored rows.
+        """
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        day = batch.day.isoformat()
+        w.writerows(zip([day] * batch.size, batch.series, batch.timestamps, batch.values))
+        block = buf.getvalue().encode("utf-8")
+        try:
+            st = self.path.stat()
+            moved = (st.st_size, st.st_ino) != (self._end, self._inode)
+        except FileNotFoundError:
+            moved = self._end != 0
+        if moved:  # another writer committed since this sink last did (a long-lived sink)
+            self._index = {}
+            self._end = self._inode = 0
+            self.recovered += self._recover()
+        if day in self._staged:
+            self._staged[day] = block if replace else self._staged[day] + block
+        elif replace and day in self._index:
+            self._staged[day] = block
+        else:
+            header = (",".join(CSV_FIELDS) + "\r\n").encode("utf-8") if self._end == 0 else b""
+            with self.path.open("ab") as fh:
+                fh.write(header + block)
+                fh.flush()
+                os.fsync(fh.fileno())
+            start = self._end + len(header)
+            _add_range(self._index, day, start, start + len(block))
+            self._acknowledge()
+            return
+        if sum(map(len, self._staged.values())) > self.max_staged_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """Swap the stored rows of every staged day for its new block in one rewrite and rename."""
+        if not self._staged:
+            return
+        index: Dict[str, List[List[int]]] = {}
+        ranges = sorted((start, end, day) for day, spans in self._index.items()
+                        if day not in self._staged for start, end in spans)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with self.path.open("rb") as src, tmp.open("wb") as dst:
+            pos = dst.write(src.readline())
+            for start, end, day in ranges:
+                src.seek(start)
+                dst.write(src.read(end - start))
+                _add_range(index, day, pos, pos + end - start)
+                pos += end - start
+            for day, block in self._staged.items():
+                dst.write(block)
+                _add_range(index, day, pos, pos + len(block))
+                pos += len(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, self.path)
+        self._index = index
+        self._staged.clear()
+        self._acknowledge()
+
+    def close(self) -> None:
+        self.flush()
+
+
+class ParquetSink:
+    """One Parquet file per day in a Hive `day=` layout, replaced by rename."""
+
+    name = "parquet"
+    staged = False
+
+    def __init__(self, directory: Path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ModuleNotFoundError as exc:
+            raise SystemExit(f"SEMS_SINK=parquet needs pyarrow ({exc})") from None
+        self._pa, self._pq = pa, pq
+        self.root = Path(directory) / PARQUET_DIR
+        self.schema = pa.schema([("series", pa.dictionary(pa.int32(), pa.string())),
+                                 ("timestamp", pa.string()), ("value", pa.float64())])
+
+    def day_path(self, day: dt.date) -> Path:
+        return self.root / f"day={day.isoformat()}" / "part-0.parquet"
+
+    def write_day(self, batch: DayBatch, *, replace: bool = True) -> None:
+        """Write the day's file; without `replace` the batch is added to the rows already stored."""
+        pa = self._pa
+        table = pa.Table.from_arrays(
+            [pa.array(batch.series, pa.string()).dictionary_encode(),
+             pa.array(batch.timestamps, pa.string()),
+             pa.array(batch.values, pa.float64())],
+            schema=self.schema,
+        )
+        path = self.day_path(batch.day)
+        if not replace and path.exists():
+            table = pa.concat_tables([self._pq.read_table(str(path), schema=self.schema), table])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")  # dot prefix: dataset readers skip it
+        self._pq.write_table(table, str(tmp), compression="zstd")
+        os.replace(tmp, path)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS points (
+    day        TEXT NOT NULL,
+    series     TEXT NOT NULL,
+    timestamp  TEXT NOT NULL,
+    value      REAL,
+    PRIMARY KEY (day, series, timestamp)
+) WITHOUT ROWID
+"""
+
+
+class SqliteSink:
+    """`points(day, series, timestamp, value)`, one transaction per day."""
+
+    name = "sqlite"
+    staged = False
+
+    def __init__(self, directory: Path):
+        self.path = Path(directory) / SQLITE_NAME
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute(_SQLITE_SCHEMA)
+        self._db.commit()
+
+    def write_day(self, batch: DayBatch, *, replace: bool = True) -> None:
+        day = batch.day.isoformat()
+        with self._db:
+            if replace:
+                self._db.execute("DELETE FROM points WHERE day = ?", (day,))
+            self._db.executemany("INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?)",
+                                 zip([day] * batch.size, batch.series, batch.timestamps, batch.values))
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._db.close()
+
+
+SINK_CLASSES = {"csv": CsvSink, "parquet": ParquetSink, "sqlite": SqliteSink}
+
+
+def parse_sinks(value: str) -> List[str]:
+    """`SEMS_SINK` as a list of sink names; raises ValueError on unknown names."""
+    names = [v.strip().lower() for v in value.split(",") if v.strip()] or ["csv"]
+    unknown = [n for n in names if n not in SINKS]
+    if unknown:
+        raise ValueError(f"unknown sink(s): {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+
+def open_sinks(directory: Path, names: Sequence[str]) -> list:
+    return [SINK_CLASSES[name](directory) for name in names]
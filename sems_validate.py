@@ -0,0 +1,248 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Find partial, gappy or corrupt days in the raw archive and queue them for re-fetch.
+
+A complete day has a point in each of the 288 five-minute slots for every
+series; the portal reports night slots as zeros. `check_day` reports:
+
+    missing slots   count, plus where they are: head, tail or internal gaps
+    stale snapshot  the day was fetched before it ended (manifest `fetched_at`)
+    no data         error body or unreadable payload
+
+The exporter runs the same check on every fetched day and records gappy ones
+as `gaps` in the sync manifest, so the next run re-fetches only those days.
+If a re-fetch returns the same payload, the gap is accepted and the day is
+marked ok. For an existing archive:
+
+    python sems_validate.py json_export              # report
+    python sems_validate.py json_export --requeue    # mark bad days for the next export run
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sems_archive import find_bundles, iter_bundle_raw
+from sems_manifest import MANIFEST_NAME, SyncManifest
+from sems_payload import DayColumns, decode_columns, decode_record
+
+SLOT_MINUTES = 5
+EXPECTED_SLOTS = 24 * 60 // SLOT_MINUTES  # 288
+DEFAULT_TZ_OFFSET = "+08:00"
+
+
+def _hhmm(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class DayCheck(NamedTuple):
+    day: dt.date
+    slots: int                     # filled slots of the emptiest series
+    gaps: List[Tuple[int, int]]    # (first missing minute, missing slots) runs of that series
+    problems: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    @property
+    def detail(self) -> str:
+        return "; ".join(self.problems)
+
+
+def missing_runs(minutes: List[int]) -> List[Tuple[int, int]]:
+    """Runs of empty five-minute slots as (first missing minute, length in slots)."""
+    filled = bytearray(EXPECTED_SLOTS)
+    for m in minutes:
+        if 0 <= m < 24 * 60:
+            filled[m // SLOT_MINUTES] = 1
+    runs, start = [], None
+    for slot, f in enumerate(filled):
+        if not f and start is None:
+            start = slot
+        elif f and start is not None:
+            runs.append((start * SLOT_MINUTES, slot - start))
+            start = None
+    if start is not None:
+        runs.append((start * SLOT_MINUTES, EXPECTED_SLOTS - start))
+    return runs
+
+
+def describe_runs(runs: List[Tuple[int, int]], limit: int = 3) -> str:
+    parts = []
+    for start, length in runs[:limit]:
+        end = start + length * SLOT_MINUTES
+        if start == 0:
+            parts.append(f"head before {_hhmm(end)}")
+        elif end >= 24 * 60:
+            parts.append(f"tail after {_hhmm(start - SLOT_MINUTES)}")
+        else:
+            parts.append(f"gap {_hhmm(start)}–{_hhmm(end - SLOT_MINUTES)}")
+    if len(runs) > limit:
+        parts.append(f"+{len(runs) - limit} more")
+    return ", ".join(parts)
+
+
+def check_day(cols: Optional[DayColumns], day: dt.date, *, fetched_at: Optional[dt.datetime] = None,
+              utc_offset: int = 0) -> DayCheck:
+    """Check one day's decoded payload against the 288-slot grid.
+
+    `fetched_at` (aware) flags snapshots taken before the day ended in the
+    portal's time zone (`utc_offset` minutes east of UTC).
+    """
+    problems: List[str] = []
+    if fetched_at is not None:
+        local = fetched_at.astimezone(dt.timezone(dt.timedelta(minutes=utc_offset)))
+        if local.date() <= day:
+            problems.append(f"stale snapshot (fetched {local:%Y-%m-%d %H:%M} local)")
+    if cols is None or not cols.values:
+        return DayCheck(day, 0, [], problems + ["no data"])
+
+    per_series: Dict[int, List[int]] = {}
+    for s, m in zip(cols.series, cols.minutes):
+        per_series.setdefault(s, []).append(m)
+    worst: List[Tuple[int, int]] = []
+    worst_filled = EXPECTED_SLOTS + 1
+    for s in range(len(cols.line_keys)):
+        runs = missing_runs(per_series.get(s, []))
+        filled = EXPECTED_SLOTS - sum(length for _, length in runs)
+        if filled < worst_filled:
+            worst, worst_filled = runs, filled
+    if worst:
+        problems.append(f"{EXPECTED_SLOTS - worst_filled}/{EXPECTED_SLOTS} slots missing ({describe_runs(worst)})")
+    return DayCheck(day, worst_filled, worst, problems)
+
+
+# ========= Archive scan =========
+def iter_stored_days(folder: Path) -> Iterator[Tuple[dt.date, Optional[DayColumns], Optional[str]]]:
+    """(day, columns or None, decode error) for every stored day; a bundle copy wins over a day file."""
+    seen = set()
+    for bundle in find_bundles(folder):
+        try:
+            for raw in iter_bundle_raw(bundle):
+                day, cols = decode_record(raw)
+                seen.add(day)
+                yield day, cols, None
+        except Exception as exc:  # corrupt member: zlib/zstd, gzip or JSON errors
+            print(f"    ! {bundle.name}: unreadable member ({exc})")
+    for path in sorted(folder.glob("raw_v2_????-??-??.json")):
+        try:
+            day = dt.date.fromisoformat(path.stem.split("raw_v2_")[-1])
+        except ValueError:
+            continue
+        if day in seen:
+            continue
+        try:
+            yield day, decode_columns(path.read_bytes()), None
+        except ValueError as exc:
+            yield day, None, str(exc)
+
+
+def scan(folder: Path, plant_id: str, manifest: Optional[SyncManifest], *, tz_offset: str = DEFAULT_TZ_OFFSET,
+         today: Optional[dt.date] = None) -> List[DayCheck]:
+    """Check every stored day in one plant folder, plus days missing between the first and last."""
+    from merge_sems_json_to_parquet import para_utc_offset, parse_utc_offset
+
+    default_offset = parse_utc_offset(tz_offset)
+    records = manifest.records(plant_id) if manifest is not None else {}
+    checks: Dict[dt.date, DayCheck] = {}
+    for day, cols, error in iter_stored_days(folder):
+        if error is not None:
+            checks[day] = DayCheck(day, 0, [], [f"unreadable payload ({error})"])
+            continue
+        rec = records.get(day.isoformat())
+        fetched_at = dt.datetime.fromisoformat(rec.fetched_at) if rec is not None else None
+        offset = para_utc_offset(cols.para, default_offset)
+        checks[day] = check_day(cols, day, fetched_at=fetched_at, utc_offset=offset)
+    if checks:
+        today = today or dt.date.today()
+        day, last = min(checks), min(max(checks), today - dt.timedelta(days=1))
+        while day <= last:
+            if day not in checks:
+                checks[day] = DayCheck(day, 0, [], ["not stored"])
+            day += dt.timedelta(days=1)
+    return [checks[d] for d in sorted(checks)]
+
+
+def plant_folders(root: Path, default_plant: str) -> List[Tuple[str, Path]]:
+    """(plant id, folder) pairs: the exporter's plant=<id>/ folders, or the flat root."""
+    folders = [(p.name.split("=", 1)[1], p) for p in sorted(root.glob("plant=*")) if p.is_dir()]
+    return folders or [(default_plant, root)]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Validate stored SEMS days and queue bad ones for re-fetch.")
+    parser.add_argument("source", type=Path, help="Exporter output folder (SEMS_OUT)")
+    parser.add_argument("--plant", default=None,
+                        help="Plant ID of a flat single-station folder (default: the one plant in the manifest; "
+                             "required with --requeue otherwise)")
+    parser.add_argument("--tz-offset", default=DEFAULT_TZ_OFFSET,
+                        help="Portal UTC offset when a payload does not echo one (default: %(default)s)")
+    parser.add_argument("--requeue", action="store_true",
+                        help="Mark bad days in the sync manifest so the next export run re-fetches only them")
+    parser.add_argument("--json", type=Path, metavar="PATH", help="Write the full report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List every bad day")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    root = args.source.expanduser()
+    if not root.is_dir():
+        raise SystemExit(f"Source directory not found: {root}")
+    manifest_path = root / MANIFEST_NAME
+    manifest = SyncManifest(manifest_path) if manifest_path.exists() else None
+    known = manifest.plants() if manifest is not None else []
+    default_plant = args.plant or (known[0] if len(known) == 1 else None)
+    folders = plant_folders(root, default_plant or "default")
+    if args.requeue and default_plant is None and folders == [("default", root)]:
+        # Requeueing under a guessed id would mark days the exporter never looks at.
+        raise SystemExit("--requeue on a flat folder needs --plant <id> (the manifest does not name exactly one plant)")
+
+    report = {}
+    total_bad = requeued = 0
+    for plant_id, folder in folders:
+        checks = scan(folder, plant_id, manifest, tz_offset=args.tz_offset)
+        bad = [c for c in checks if not c.ok]
+        total_bad += len(bad)
+        report[plant_id] = [{"day": c.day.isoformat(), "slots": c.slots, "problems": c.problems} for c in bad]
+        print(f"[*] {plant_id}: {len(checks):,} days checked, {len(bad):,} need a re-fetch")
+        for c in bad if args.verbose else bad[:10]:
+            print(f"    {c.day}  {c.detail}")
+        if len(bad) > 10 and not args.verbose:
+            print(f"    … {len(bad) - 10:,} more (-v lists all)")
+        if args.requeue and bad:
+            if manifest is None:
+                manifest = SyncManifest(manifest_path)
+            requeued += manifest.requeue(plant_id, {c.day: c.detail for c in bad})
+
+    if manifest is not None:
+        manifest.close()
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=1), encoding="utf-8")
+        print(f"    report → {args.json}")
+    if args.requeue:
+        print(f"[✓] {requeued:,} day(s) queued; the next export run fetches only those (plus new days)")
+    elif total_bad:
+        print("[!] Run with --requeue to queue them for the next export run")
+    else:
+        print("[✓] Archive complete")
+
+
+if __name__ == "__main__":
+    main()
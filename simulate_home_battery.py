@@ -0,0 +1,404 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#!/usr/bin/env python3
+"""Estimate home-battery savings from the merged SEMS Parquet time series.
+
+Runs a self-consumption dispatch (charge from PV surplus, discharge into the
+household deficit) for every combination of battery capacity and inverter
+power limit, and reports avoided grid import, lost export and money saved
+against a tariff table.
+
+Usage
+-----
+    python simulate_home_battery.py json_export/dataset \
+        --capacities 1:25:0.5 --powers 3,5 --import-price 0.32 --export-price 0.05
+
+The state-of-charge recurrence is compiled with Numba when it is installed;
+otherwise it runs vectorized across all battery configurations with NumPy.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ModuleNotFoundError:  # pragma: no cover - optional accelerator
+    numba = None
+
+
+DEFAULT_PV_SERIES = "PCurve_Power_PV"
+DEFAULT_LOAD_SERIES = "PCurve_Power_Load"
+
+
+# ========= Data =========
+def load_power_frame(
+    path: Path,
+    series: Sequence[str],
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+    plant: Optional[str] = None,
+) -> pd.DataFrame:
+    """Wide frame of power values [W] on the local-time index, one column per series.
+
+    A fleet dataset must be narrowed to one `plant`; several plants left after
+    filtering raise ValueError instead of being averaged into one household.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+
+    path = Path(path)
+    if path.is_dir() and (path / "points").is_dir():
+        path = path / "points"
+    dataset = pads.dataset(path, format="parquet", partitioning="hive" if path.is_dir() else None)
+    names = set(dataset.schema.names)
+    if "period_start" not in names:
+        raise ValueError(f"{path} is not a merged points table (no period_start column).")
+
+    predicate = pads.field("series").isin(list(series))
+    if plant is not None:
+        if "plant" not in names:
+            raise ValueError(f"{path} has no plant column; drop --plant.")
+        predicate = predicate & (pads.field("plant").cast(pa.string()) == str(plant))
+    if start is not None and "day" in names:
+        predicate = predicate & (pads.field("day") >= start.isoformat())
+    if end is not None and "day" in names:
+        predicate = predicate & (pads.field("day") <= end.isoformat())
+    columns = [c for c in ("period_start", "utc_offset", "plant", "series", "value") if c in names]
+    df = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+    if df.empty:
+        raise ValueError(f"No rows for series {', '.join(series)} in {path}"
+                         + (f" for plant {plant}." if plant is not None else "."))
+    if "plant" in df.columns:
+        plants = sorted(df["plant"].astype(str).unique())
+        if len(plants) > 1:
+            raise ValueError(f"{path} holds {len(plants)} plants ({', '.join(plants[:5])}"
+                             + (", …" if len(plants) > 5 else "") + "); choose one with --plant.")
+
+    local = df["period_start"]
+    if "utc_offset" in df.columns:
+        local = local + pd.to_timedelta(df["utc_offset"], unit="min")
+    df["period_start"] = local.dt.tz_localize(None)
+    df["series"] = df["series"].astype(str)
+
+    wide = df.pivot_table(index="period_start", columns="series", values="value", aggfunc="mean")
+    if start is not None:
+        wide = wide[wide.index >= pd.Timestamp(start)]
+    if end is not None:
+        wide = wide[wide.index < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    return wide.sort_index()
+
+
+def fill_gaps(frame: pd.DataFrame, max_slots: int) -> Tuple[pd.DataFrame, int, int]:
+    """Interpolate runs of at most `max_slots` missing steps; drop steps in longer gaps.
+
+    Returns (frame, steps interpolated, steps dropped). Missing steps are never
+    read as 0 W, which would count as neither PV nor load.
+    """
+    missing = frame.isna()
+    filled = frame.interpolate(method="time", limit_area="inside")
+    for column in frame.columns:
+        gap = missing[column]
+        run = gap.groupby((~gap).cumsum()).transform("sum")
+        filled.loc[gap & (run > max_slots), column] = np.nan
+    keep = filled.notna().all(axis=1)
+    interpolated = int((missing.any(axis=1) & keep).sum())
+    return filled[keep], interpolated, int((~keep).sum())
+
+
+def _start_minute(value) -> int:
+    """Minute of the day for a tariff `start` such as "07:00", "7:00" or "7:00:00"."""
+    try:
+        hours, minutes, *seconds = (int(part) for part in str(value).strip().split(":"))
+    except ValueError:
+        raise ValueError(f"Tariff start {value!r} is not HH:MM") from None
+    if not (0 <= hours < 24 and 0 <= minutes < 60) or any(seconds):
+        raise ValueError(f"Tariff start {value!r} is not a time of day (00:00-23:59)")
+    return hours * 60 + minutes
+
+
+def load_tariff(path: Optional[Path], import_price: float, export_price: float) -> pd.DataFrame:
+    """Time-of-use table with `start` (HH:MM), `import_price` and `export_price` per kWh.
+
+    Each row applies from its start time until the next row's start. Without a
+    file the flat `import_price`/`export_price` apply all day. Rows are sorted
+    by time of day; malformed or duplicate starts and non-numeric prices raise
+    ValueError.
+    """
+    if path is None:
+        return pd.DataFrame({"start": ["00:00"], "import_price": [import_price], "export_price": [export_price]})
+    table = pd.read_csv(path, dtype={"start": str})
+    missing = {"start", "import_price", "export_price"} - set(table.columns)
+    if missing:
+        raise KeyError("Tariff file is missing columns: " + ", ".join(sorted(missing)))
+    if table.empty:
+        raise ValueError(f"Tariff file {path} has no rows")
+    minutes = table["start"].map(_start_minute)
+    if minutes.duplicated().any():
+        raise ValueError("Tariff file has duplicate start times: "
+                         + ", ".join(sorted(set(table.loc[minutes.duplicated(keep=False), "start"]))))
+    for column in ("import_price", "export_price"):
+        prices = pd.to_numeric(table[column], errors="coerce")
+        if prices.isna().any():
+            raise ValueError(f"Tariff column {column} has non-numeric values")
+        table[column] = prices
+    table["start"] = [f"{m // 60:02d}:{m % 60:02d}" for m in minutes]
+    return table.iloc[np.argsort(minutes.to_numpy(), kind="stable")].reset_index(drop=True)
+
+
+def tariff_arrays(index: pd.DatetimeIndex, tariff: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-step import/export price looked up from the local time of day."""
+    starts = np.array([_start_minute(s) for s in tariff["start"]])
+    order = np.argsort(starts, kind="stable")
+    minute = (index.hour * 60 + index.minute).to_numpy()
+    # A step before the first start belongs to the last (overnight) band.
+    slot = order[(np.searchsorted(starts[order], minute, side="right") - 1) % len(starts)]
+    return (
+        tariff["import_price"].to_numpy(dtype=np.float64)[slot],
+        tariff["export_price"].to_numpy(dtype=np.float64)[slot],
+    )
+
+
+# ========= Dispatch kernels =========
+def _dispatch_loops(net_kwh, price_imp, price_exp, cap_kwh, step_kwh, eff_c, eff_d, min_soc):
+    """Reference loops (compiled by Numba when available)."""
+    k_count = cap_kwh.shape[0]
+    out = np.zeros((k_count, 4))  # import kWh, export kWh, import cost, export revenue
+    for k in range(k_count):
+        floor = cap_kwh[k] * min_soc
+        soc = floor
+        for t in range(net_kwh.shape[0]):
+            n = net_kwh[t]
+            if n >= 0.0:
+                charge = min(n, step_kwh[k], (cap_kwh[k] - soc) / eff_c)
+                soc += charge * eff_c
+                e = n - charge
+                out[k, 1] += e
+                out[k, 3] += e * price_exp[t]
+            else:
+                d = -n
+                dis = min(d, step_kwh[k], (soc - floor) * eff_d)
+                soc -= dis / eff_d
+                i = d - dis
+                out[k, 0] += i
+                out[k, 2] += i * price_imp[t]
+    return out
+
+
+def _dispatch_numpy(net_kwh, price_imp, price_exp, cap_kwh, step_kwh, eff_c, eff_d, min_soc):
+    """Same recurrence, stepping through time once with every configuration as a vector."""
+    floor = cap_kwh * min_soc
+    soc = floor.copy()
+    headroom = np.empty_like(soc)
+    flow = np.empty_like(soc)
+    out = np.zeros((cap_kwh.shape[0], 4))
+    imp, exp_, cost, rev = out[:, 0], out[:, 1], out[:, 2], out[:, 3]
+    for t, n in enumerate(net_kwh.tolist()):
+        if n >= 0.0:
+            np.subtract(cap_kwh, soc, out=headroom)
+            headroom /= eff_c
+            np.minimum(step_kwh, headroom, out=flow)
+            np.minimum(flow, n, out=flow)
+            soc += flow * eff_c
+            flow -= n  # -(exported energy)
+            exp_ -= flow
+            rev -= flow * price_exp[t]
+        else:
+            np.subtract(soc, floor, out=headroom)
+            headroom *= eff_d
+            np.minimum(step_kwh, headroom, out=flow)
+            np.minimum(flow, -n, out=flow)
+            soc -= flow / eff_d
+            flow += n  # -(imported energy)
+            imp -= flow
+            cost -= flow * price_imp[t]
+    return out
+
+
+_dispatch_numba = numba.njit(cache=True)(_dispatch_loops) if numba is not None else None
+
+
+def simulate(
+    pv_w: np.ndarray,
+    load_w: np.ndarray,
+    step_hours: float,
+    capacities_kwh: Sequence[float],
+    powers_kw: Sequence[float],
+    price_imp: np.ndarray,
+    price_exp: np.ndarray,
+    *,
+    round_trip_efficiency: float = 0.9,
+    min_soc: float = 0.1,
+    engine: str = "auto",
+) -> pd.DataFrame:
+    """Sweep every (capacity, power) pair and return one result row per battery."""
+    net_kwh = np.ascontiguousarray((pv_w - load_w) / 1000.0 * step_hours, dtype=np.float64)
+    grid = [(c, p) for c in capacities_kwh for p in powers_kw]
+    cap_kwh = np.array([c for c, _ in grid], dtype=np.float64)
+    step_kwh = np.array([p for _, p in grid], dtype=np.float64) * step_hours
+    eff = float(np.sqrt(round_trip_efficiency))
+
+    if engine == "auto":
+        engine = "numba" if _dispatch_numba is not None else "numpy"
+    if engine == "numba":
+        if _dispatch_numba is None:
+            raise RuntimeError("numba is not installed; use --engine numpy")
+        kernel = _dispatch_numba
+    else:
+        kernel = _dispatch_numpy
+    out = kernel(net_kwh, price_imp, price_exp, cap_kwh, step_kwh, eff, eff, min_soc)
+
+    base_import = np.clip(-net_kwh, 0, None)
+    base_export = np.clip(net_kwh, 0, None)
+    base_cost = float(base_import @ price_imp - base_export @ price_exp)
+
+    result = pd.DataFrame(
+        {
+            "capacity_kwh": cap_kwh,
+            "power_kw": step_kwh / step_hours,
+            "import_kwh": out[:, 0],
+            "export_kwh": out[:, 1],
+            "avoided_import_kwh": base_import.sum() - out[:, 0],
+            "lost_export_kwh": base_export.sum() - out[:, 1],
+            "net_cost": out[:, 2] - out[:, 3],
+        }
+    )
+    result["savings"] = base_cost - result["net_cost"]
+    result.attrs.update(baseline_cost=base_cost, engine=engine)
+    return result
+
+
+# ========= CLI =========
+def parse_grid(spec: str) -> List[float]:
+    """'5,10,13.5' or 'start:stop:step' (inclusive) → list of floats."""
+    if ":" in spec:
+        start, stop, step = (float(p) for p in spec.split(":"))
+        return [round(v, 6) for v in np.arange(start, stop + step / 2, step)]
+    return [float(p) for p in spec.split(",") if p.strip()]
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Simulate home-battery savings over merged SEMS data.")
+    parser.add_argument("source", type=Path, help="Merged points Parquet file or --dataset directory")
+    parser.add_argument("--pv-series", default=DEFAULT_PV_SERIES, help="PV power series (default: %(default)s)")
+    parser.add_argument(
+        "--load-series",
+        default=DEFAULT_LOAD_SERIES,
+        help="Household consumption series (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--grid-series",
+        help="Grid meter series (positive = export); used to derive load when no load series exists",
+    )
+    parser.add_argument(
+        "--base-load",
+        type=float,
+        help="Constant household load [W] when the account exposes no load or grid series",
+    )
+    parser.add_argument("--capacities", default="2:20:2", help="Usable capacities in kWh (default: %(default)s)")
+    parser.add_argument("--powers", default="5", help="Inverter power limits in kW (default: %(default)s)")
+    parser.add_argument("--round-trip-efficiency", type=float, default=0.9)
+    parser.add_argument("--min-soc", type=float, default=0.1, help="Reserved fraction of capacity")
+    parser.add_argument("--tariff", type=Path, help="CSV with start,import_price,export_price rows")
+    parser.add_argument("--import-price", type=float, default=0.30, help="Flat import price per kWh")
+    parser.add_argument("--export-price", type=float, default=0.05, help="Flat export price per kWh")
+    parser.add_argument("--start", type=dt.date.fromisoformat, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=dt.date.fromisoformat, help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--plant", help="Plant id to simulate; required when the dataset holds several plants")
+    parser.add_argument(
+        "--max-gap",
+        type=float,
+        default=60,
+        help="Interpolate missing steps in gaps up to this many minutes; longer gaps are dropped (default: %(default)s)",
+    )
+    parser.add_argument("--engine", choices=("auto", "numba", "numpy"), default="auto")
+    parser.add_argument("-o", "--output", type=Path, help="Write the result table as CSV")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+
+    wanted = [args.pv_series, args.load_series] + ([args.grid_series] if args.grid_series else [])
+    try:
+        frame = load_power_frame(args.source, wanted, args.start, args.end, args.plant)
+    except ValueError as e:
+        raise SystemExit(str(e)) from None
+    if args.pv_series not in frame.columns:
+        raise SystemExit(f"PV series '{args.pv_series}' not found in {args.source}")
+    if args.load_series in frame.columns:
+        used = [args.pv_series, args.load_series]
+    elif args.grid_series and args.grid_series in frame.columns:
+        used = [args.pv_series, args.grid_series]
+    elif args.base_load is not None:
+        used = [args.pv_series]
+    else:
+        raise SystemExit(
+            f"No load series '{args.load_series}' in {args.source}; pass --grid-series or --base-load."
+        )
+    frame = frame[used]
+
+    step = frame.index.to_series().diff().median()
+    step_hours = (step / pd.Timedelta(hours=1)) if pd.notna(step) else 5 / 60
+    if pd.notna(step):
+        frame = frame.asfreq(step)
+        slots = len(frame)
+        frame, interpolated, dropped = fill_gaps(frame, int(pd.Timedelta(minutes=args.max_gap) // step))
+        if interpolated or dropped:
+            print(f"    {interpolated + dropped:,} of {slots:,} steps had no value: "
+                  f"{interpolated:,} interpolated, {dropped:,} in gaps over {args.max_gap:g} min dropped")
+    else:
+        frame = frame.dropna()
+
+    pv = frame[args.pv_series].to_numpy(dtype=np.float64)
+    if len(used) == 1:
+        load = np.full_like(pv, args.base_load)
+    elif used[1] == args.load_series:
+        load = frame[args.load_series].to_numpy(dtype=np.float64)
+    else:
+        load = pv - frame[args.grid_series].to_numpy(dtype=np.float64)
+
+    price_imp, price_exp = tariff_arrays(frame.index, load_tariff(args.tariff, args.import_price, args.export_price))
+    capacities = parse_grid(args.capacities)
+    powers = parse_grid(args.powers)
+
+    print(
+        f"[*] {len(frame):,} steps of {step_hours * 60:g} min, "
+        f"{len(capacities) * len(powers)} battery configurations"
+    )
+    t0 = time.perf_counter()
+    result = simulate(
+        pv, load, step_hours, capacities, powers, price_imp, price_exp,
+        round_trip_efficiency=args.round_trip_efficiency, min_soc=args.min_soc, engine=args.engine,
+    )
+    elapsed = time.perf_counter() - t0
+
+    print(f"    baseline net cost without battery: {result.attrs['baseline_cost']:,.2f}")
+    with pd.option_context("display.max_rows", None, "display.width", 120):
+        print(result.round(2).to_string(index=False))
+    print(f"[✓] Simulated in {elapsed:.2f}s ({result.attrs['engine']})")
+
+    if args.output is not None:
+        result.to_csv(args.output, index=False)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
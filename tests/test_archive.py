@@ -0,0 +1,103 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime as dt
+import json
+
+import pytest
+
+from sems_archive import (RawArchive, bundle_path, compact_all, index_path, iter_bundle, load_index,
+                          main, read_day)
+
+D1, D2 = dt.date(2025, 9, 1), dt.date(2025, 9, 2)
+
+
+def payload(n):
+    return {"hasError": False, "code": "0", "data": {"n": n, "pad": "x" * 200}}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return RawArchive(tmp_path, "gz")
+
+
+def test_put_and_read_back(archive, tmp_path):
+    archive.put(D1, payload(1))
+    archive.put(D2, payload(2))
+    assert archive.has(D1) and not archive.has(dt.date(2025, 9, 3))
+    assert read_day(tmp_path, D2) == payload(2)
+    assert [day for day, _ in iter_bundle(bundle_path(tmp_path, D1, "gz"))] == [D1, D2]
+
+
+def test_compaction_keeps_only_live_members(archive, tmp_path):
+    bundle = bundle_path(tmp_path, D1, "gz")
+    archive.put(D1, payload(1))
+    archive.put(D2, payload(2))
+    archive.put(D1, payload(3))  # the first D1 member is now stale
+    index = load_index(bundle)
+    assert index["stale_bytes"] > 0
+    size = bundle.stat().st_size
+    reclaimed = archive.compact(bundle)
+    assert reclaimed == index["stale_bytes"]
+    assert bundle.stat().st_size == size - reclaimed
+    assert load_index(bundle)["stale_bytes"] == 0
+    assert read_day(tmp_path, D1) == payload(3)
+    assert read_day(tmp_path, D2) == payload(2)
+
+
+def test_missing_index_is_rebuilt_from_members(archive, tmp_path):
+    bundle = bundle_path(tmp_path, D1, "gz")
+    archive.put(D1, payload(1))
+    archive.put(D1, payload(2))
+    expected = load_index(bundle)
+    index_path(bundle).unlink()
+    assert load_index(bundle) == expected
+    assert read_day(tmp_path, D1) == payload(2)
+
+
+def test_index_past_the_end_is_rebuilt(archive, tmp_path):
+    # A compaction interrupted between the bundle rename and the index write.
+    bundle = bundle_path(tmp_path, D1, "gz")
+    archive.put(D1, payload(1))
+    index = json.loads(index_path(bundle).read_text())
+    index["end"] += 10_000
+    index_path(bundle).write_text(json.dumps(index))
+    assert load_index(bundle)["end"] == bundle.stat().st_size
+    assert read_day(tmp_path, D1) == payload(1)
+
+
+def test_torn_trailing_member_is_dropped(archive, tmp_path):
+    bundle = bundle_path(tmp_path, D1, "gz")
+    archive.put(D1, payload(1))
+    committed = bundle.stat().st_size
+    with bundle.open("ab") as fh:  # an append whose index update never landed
+        fh.write(b"\x1f\x8b\x08\x00partial")
+    index_path(bundle).unlink()
+    assert list(load_index(bundle)["days"]) == ["2025-09-01"]
+    fresh = RawArchive(tmp_path, "gz")
+    fresh.put(D2, payload(2))
+    assert read_day(tmp_path, D1) == payload(1) and read_day(tmp_path, D2) == payload(2)
+    assert load_index(bundle)["days"]["2025-09-02"][0] == committed
+
+
+def test_compact_command_covers_plant_folders(tmp_path, capsys):
+    (tmp_path / "plant=a").mkdir()
+    archive = RawArchive(tmp_path / "plant=a", "gz")
+    archive.put(D1, payload(1))
+    archive.put(D1, payload(2))
+    bundle = bundle_path(tmp_path / "plant=a", D1, "gz")
+    assert load_index(bundle)["stale_bytes"] > 0
+    main(["compact", str(tmp_path)])
+    assert "Compacted 1 bundle(s)" in capsys.readouterr().out
+    assert load_index(bundle)["stale_bytes"] == 0
+    assert read_day(tmp_path / "plant=a", D1) == payload(2)
+    assert compact_all(tmp_path) == (0, 0)
@@ -0,0 +1,70 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import asyncio
+import time
+
+from sems_async import AimdLimiter, backoff_delay, retry_after
+
+
+def test_additive_increase_one_slot_per_window():
+    limiter = AimdLimiter(initial=4, maximum=8)
+    for _ in range(3):
+        limiter.success(0.01)
+    assert int(limiter.limit) == 4
+    for _ in range(2):
+        limiter.success(0.01)
+    assert int(limiter.limit) == 5
+    for _ in range(200):
+        limiter.success(0.01)
+    assert limiter.limit == 8
+
+
+def test_multiplicative_decrease_at_most_once_per_rtt():
+    limiter = AimdLimiter(initial=16, minimum=2)
+    limiter.success(10.0)  # long smoothed RTT
+    before = limiter.limit
+    assert limiter.congestion() is True
+    assert limiter.limit == before / 2
+    assert limiter.congestion() is False  # same congestion event
+    assert limiter.limit == before / 2 and limiter.cuts == 1
+
+
+def test_decrease_stops_at_minimum():
+    limiter = AimdLimiter(initial=4, minimum=3)
+    limiter.congestion()
+    assert limiter.limit == 3
+    limiter._last_cut = float("-inf")
+    limiter.congestion()
+    assert limiter.limit == 3
+
+
+def test_inflight_never_exceeds_limit():
+    limiter = AimdLimiter(initial=3, maximum=3)
+
+    async def request():
+        async with limiter:
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(12)))
+
+    asyncio.run(run())
+    assert limiter.peak == 3 and limiter.inflight == 0
+
+
+def test_backoff_and_retry_after():
+    assert 0 <= backoff_delay(3, 1.0, 2.0) <= 2.0
+    assert retry_after({"Retry-After": "7"}) == 7.0
+    future = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))
+    assert 50 < retry_after({"retry-after": future}) <= 60
+    assert retry_after({}) is None
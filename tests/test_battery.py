@@ -0,0 +1,88 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import simulate_home_battery as battery
+from conftest import EXAMPLE_PAYLOAD
+from simulate_home_battery import fill_gaps, load_tariff, tariff_arrays
+
+
+def write_tariff(tmp_path, *rows):
+    path = tmp_path / "tou.csv"
+    path.write_text("start,import_price,export_price\n" + "\n".join(rows) + "\n", encoding="utf-8")
+    return path
+
+
+def test_tariff_sorted_by_time_not_text(tmp_path):
+    tariff = load_tariff(write_tariff(tmp_path, "22:00,0.1,0.05", "7:00,0.3,0.08", "17:30,0.4,0.1"), 0, 0)
+    assert tariff["start"].tolist() == ["07:00", "17:30", "22:00"]
+    index = pd.DatetimeIndex(["2025-01-01 00:30", "2025-01-01 07:00", "2025-01-01 18:00", "2025-01-01 23:55"])
+    imp, exp = tariff_arrays(index, tariff)
+    assert imp.tolist() == [0.1, 0.3, 0.4, 0.1]  # before 07:00 is still the overnight band
+    assert exp.tolist() == [0.05, 0.08, 0.1, 0.05]
+
+
+def test_flat_tariff_without_file():
+    imp, _ = tariff_arrays(pd.date_range("2025-01-01", periods=3, freq="8h"), load_tariff(None, 0.25, 0.05))
+    assert np.all(imp == 0.25)
+
+
+@pytest.mark.parametrize("rows", [
+    ("24:00,1,1",), ("7h,1,1",), ("07:00,1,1", "7:00,2,2"), ("07:00,cheap,1",),
+])
+def test_invalid_tariff_rows(tmp_path, rows):
+    with pytest.raises(ValueError):
+        load_tariff(write_tariff(tmp_path, *rows), 0, 0)
+
+
+def test_fill_gaps_interpolates_short_and_drops_long_gaps():
+    index = pd.date_range("2025-01-01", periods=30, freq="5min")
+    values = np.arange(30, dtype=float)
+    values[3] = np.nan             # one missing step
+    values[10:25] = np.nan         # 75 minutes
+    frame = pd.DataFrame({"pv": values, "load": 100.0}, index=index)
+    filled, interpolated, dropped = fill_gaps(frame, max_slots=12)
+    assert (interpolated, dropped) == (1, 15)
+    assert filled.loc[index[3], "pv"] == 3.0
+    assert len(filled) == 15 and not filled.isna().any().any()
+
+
+@pytest.fixture
+def fleet_points(tmp_path):
+    pytest.importorskip("pyarrow")
+    import merge_sems_json_to_parquet as merger
+
+    src = tmp_path / "src"
+    for plant in ("a", "b"):
+        (src / f"plant={plant}").mkdir(parents=True)
+        (src / f"plant={plant}" / EXAMPLE_PAYLOAD.name).write_bytes(EXAMPLE_PAYLOAD.read_bytes())
+    merger.write_dataset(sorted(src.glob("plant=*/raw_v2_*.json")), src, tmp_path / "dataset")
+    return tmp_path / "dataset"
+
+
+def test_fleet_needs_a_plant(fleet_points):
+    with pytest.raises(ValueError, match="--plant"):
+        battery.load_power_frame(fleet_points, ["PCurve_Power_PV"])
+    frame = battery.load_power_frame(fleet_points, ["PCurve_Power_PV"], plant="a")
+    assert len(frame) == 288
+    with pytest.raises(ValueError, match="plant c"):
+        battery.load_power_frame(fleet_points, ["PCurve_Power_PV"], plant="c")
+
+
+def test_main_simulates_one_plant(fleet_points, capsys):
+    battery.main([str(fleet_points), "--plant", "b", "--base-load", "300", "--capacities", "5",
+                  "--engine", "numpy"])
+    out = capsys.readouterr().out
+    assert "288 steps of 5 min" in out
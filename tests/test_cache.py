@@ -0,0 +1,100 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime as dt
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import merge_sems_json_to_parquet as merger
+from conftest import EXAMPLE_PAYLOAD
+from sems_cache import FrameCache, source_fingerprint
+
+SEPT, OCT = dt.date(2025, 9, 20), dt.date(2025, 10, 20)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Plants a and b with one September and one October day each."""
+    src = tmp_path / "src"
+    for plant in ("a", "b"):
+        folder = src / f"plant={plant}"
+        folder.mkdir(parents=True)
+        for day in (SEPT, OCT):
+            (folder / f"raw_v2_{day}.json").write_bytes(EXAMPLE_PAYLOAD.read_bytes())
+    out = tmp_path / "dataset"
+    merger.write_dataset(sorted(src.glob("plant=*/raw_v2_*.json")), src, out)
+    return out
+
+
+def touch(path):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def day_file(dataset, plant, day):
+    return merger.partition_path(dataset, merger.POINTS_DIR, plant, Path(f"raw_v2_{day}.json"))
+
+
+def test_fingerprint_only_covers_the_partitions_a_query_reads(dataset):
+    scoped = dict(plants=["a"], start=SEPT, end=SEPT)
+    before = source_fingerprint(dataset, **scoped)
+    touch(day_file(dataset, "b", SEPT))
+    touch(day_file(dataset, "a", OCT))
+    (dataset / "rollups").mkdir()
+    (dataset / "rollups" / "x.parquet").write_bytes(b"")
+    assert source_fingerprint(dataset, **scoped) == before
+    whole = source_fingerprint(dataset)
+    touch(day_file(dataset, "a", SEPT))
+    assert source_fingerprint(dataset, **scoped) != before
+    assert source_fingerprint(dataset) != whole
+
+
+def test_live_fragment_changes_the_fingerprint(dataset):
+    before = source_fingerprint(dataset, plants=["a"])
+    fragment = day_file(dataset, "a", OCT).with_name(f"{merger.LIVE_FRAGMENT_PREFIX}1.parquet")
+    fragment.write_bytes(b"")
+    assert source_fingerprint(dataset, plants=["a"]) != before
+
+
+def test_round_trip_and_invalidation(dataset, tmp_path):
+    import visualize_plant_power as viz
+
+    cache = FrameCache(tmp_path / "cache")
+    key = cache.key(dataset, "test", plants=["a"])
+    built = []
+
+    def build():
+        built.append(1)
+        return viz.load_dataset(dataset, plants=["a"], cache=False)
+
+    first = cache.load(key, build)
+    second = cache.load(key, build)
+    assert (cache.hits, cache.misses, len(built)) == (1, 1, 1)
+    pd.testing.assert_frame_equal(first.reset_index(drop=True), second, check_categorical=False)
+    touch(day_file(dataset, "a", SEPT))
+    assert cache.key(dataset, "test", plants=["a"]) != key
+
+
+def test_eviction_keeps_the_most_recent_entries(tmp_path):
+    frame = pd.DataFrame({"value": range(10_000)})
+    cache = FrameCache(tmp_path, max_bytes=200_000)
+    for key in ("old", "mid", "new"):
+        cache.put(key, frame)
+        os.utime(cache.path(key), (0, {"old": 1, "mid": 2, "new": 3}[key]))
+    cache.evict()
+    assert [p.stem for p, _, _ in cache.entries()] == ["new", "mid"]
+    assert cache.get("old") is None and cache.get("new").num_rows == 10_000
@@ -0,0 +1,100 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime as dt
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import merge_sems_json_to_parquet as merger
+import sems_dashboard as dashboard
+from conftest import EXAMPLE_PAYLOAD
+
+D1, D2 = dt.date(2025, 9, 20), dt.date(2025, 9, 21)
+
+
+def pv_kwh(scale):
+    data = json.loads(EXAMPLE_PAYLOAD.read_text(encoding="utf-8"))
+    return sum(p["y"] for p in data["data"]["lines"][0]["xy"]) * scale * merger.POINT_HOURS / 1000
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    """Plants a, b and c producing 1×, 2× and 3× the example day; c has no second day."""
+    src = tmp_path / "src"
+    for plant, scale, days in (("a", 1, (D1, D2)), ("b", 2, (D1, D2)), ("c", 3, (D1,))):
+        folder = src / f"plant={plant}"
+        folder.mkdir(parents=True)
+        payload = json.loads(EXAMPLE_PAYLOAD.read_text(encoding="utf-8"))
+        for pt in payload["data"]["lines"][0]["xy"]:
+            pt["y"] *= scale
+        for day in days:
+            (folder / f"raw_v2_{day}.json").write_text(json.dumps(payload), encoding="utf-8")
+    dataset = tmp_path / "dataset"
+    merger.write_dataset(sorted(src.glob("plant=*/raw_v2_*.json")), src, dataset)
+    merger.build_rollups(dataset, merger.points_fingerprint(dataset))
+    return dataset
+
+
+def test_fleet_stats_skip_plants_that_did_not_report():
+    wide = pd.DataFrame({"a": [1.0, 2.0, np.nan], "b": [3.0, np.nan, np.nan], "c": [5.0, 4.0, np.nan]},
+                        index=pd.date_range("2025-01-01", periods=3))
+    stats = dashboard.fleet_stats(wide)
+    assert stats["sum"].tolist()[:2] == [9.0, 6.0] and np.isnan(stats["sum"].iloc[2])
+    assert stats["median"].tolist()[:2] == [3.0, 3.0]
+    assert stats["plants"].tolist() == [3, 2, 0]
+    assert (stats["low"] <= stats["median"]).iloc[:2].all() and (stats["median"] <= stats["high"]).iloc[:2].all()
+
+
+def test_even_periods_are_sent_as_start_and_step():
+    even = pd.date_range("2025-01-01", periods=4, freq="D")
+    assert dashboard._x_axis(even) == {"x0": "2025-01-01T00:00:00", "dx": 86_400_000}
+    uneven = dashboard._x_axis(pd.DatetimeIndex(["2025-01-01", "2025-01-02", "2025-01-05"]))
+    assert uneven["x"].tolist() == [pd.Timestamp(d).value // 10**6 for d in ("2025-01-01", "2025-01-02", "2025-01-05")]
+
+
+def test_load_fleet_pivots_the_daily_rollup(fleet):
+    wide = dashboard.load_fleet(fleet)
+    assert sorted(wide.columns) == ["a", "b", "c"]
+    assert [d.date() for d in wide.index] == [D1, D2]
+    for plant, scale in (("a", 1), ("b", 2), ("c", 3)):
+        assert wide.loc[pd.Timestamp(D1), plant] == pytest.approx(pv_kwh(scale), rel=1e-6)
+    assert np.isnan(wide.loc[pd.Timestamp(D2), "c"])
+    narrowed = dashboard.load_fleet(fleet, plants=["a", "c"], start=D2)
+    assert list(narrowed.columns) == ["a"] and len(narrowed) == 1
+    with pytest.raises(ValueError, match="No 'PCurve_Power_Load' rows"):
+        dashboard.load_fleet(fleet, series="PCurve_Power_Load")
+
+
+def test_report_ranks_plants_and_shares_plotly_js(fleet, tmp_path):
+    pytest.importorskip("plotly")
+    for name in ("one.html", "two.html"):
+        wide = dashboard.build_dashboard(fleet, tmp_path / "out" / name, plotly_js="directory")
+    assert list(wide.columns) == ["b", "c", "a"]  # highest total first: b has 2 × 2, c 1 × 3
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == ["one.html", "plotly.min.js", "two.html"]
+    page = (tmp_path / "out" / "one.html").read_text(encoding="utf-8")
+    assert page.count("<script src=\"plotly.min.js\"") == 1
+    assert "3 plant(s), daily" in page
+    assert f"fleet total {pv_kwh(1 * 2 + 2 * 2 + 3):,.0f} kWh" in page
+
+
+def test_missing_rollups_are_reported(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / EXAMPLE_PAYLOAD.name).write_bytes(EXAMPLE_PAYLOAD.read_bytes())
+    merger.write_dataset([src / EXAMPLE_PAYLOAD.name], src, tmp_path / "dataset")
+    with pytest.raises(FileNotFoundError, match="No daily rollup"):
+        dashboard.load_fleet(tmp_path / "dataset")
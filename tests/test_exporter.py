@@ -0,0 +1,116 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime as dt
+import random
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import sems_plant_power_v2 as exporter
+from sems_plant_power_v2 import TokenBucket, TokenManager, fetch_jobs_ordered, month_rows, shape_order
+
+DAYS = [dt.date(2025, 1, 1) + dt.timedelta(days=i) for i in range(40)]
+
+
+def test_token_bucket_holds_the_rate_after_the_burst():
+    bucket = TokenBucket(rate=100, burst=5)
+    t0 = time.monotonic()
+    for _ in range(25):
+        bucket.acquire()
+    elapsed = time.monotonic() - t0
+    assert 0.18 <= elapsed < 1.0  # 20 tokens beyond the burst at 100/s
+
+
+def test_token_bucket_is_shared_between_threads():
+    bucket = TokenBucket(rate=200, burst=1)
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(10)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.monotonic() - t0 >= 39 / 200 * 0.9
+
+
+def test_zero_rate_does_not_limit():
+    bucket = TokenBucket(rate=0)
+    t0 = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire()
+    assert time.monotonic() - t0 < 0.5
+
+
+@pytest.fixture
+def fake_fetch(monkeypatch):
+    state = {"inflight": 0, "peak": 0, "submitted": 0}
+    lock = threading.Lock()
+
+    def fetch_day(auth, plant_id, day, limiter, client):
+        with lock:
+            state["inflight"] += 1
+            state["peak"] = max(state["peak"], state["inflight"])
+        time.sleep(random.uniform(0, 0.01))  # finish out of order
+        with lock:
+            state["inflight"] -= 1
+        return plant_id, day, {}, None, 0
+
+    monkeypatch.setattr(exporter, "fetch_day", fetch_day)
+    return state
+
+
+def test_ordered_results_and_bounded_window(fake_fetch):
+    def jobs():
+        for day in DAYS:
+            fake_fetch["submitted"] += 1
+            yield "p", day
+
+    results = fetch_jobs_ordered(None, jobs(), workers=3, client=object())
+    first = next(results)
+    assert first[1] == DAYS[0]
+    assert fake_fetch["submitted"] <= 3 * 4  # never queues the whole backfill
+    assert [r[1] for r in results] == DAYS[1:]
+    assert fake_fetch["peak"] <= 3
+
+
+def test_shape_order_puts_the_learned_shape_first():
+    assert shape_order(2, None) == [0, 1]
+    assert shape_order(2, 1) == [1, 0]
+    assert shape_order(2, 5) == [0, 1]  # a shape this version no longer sends
+
+
+def test_learned_shape_survives_into_the_next_run(tmp_path):
+    cache = tmp_path / "v2_token_cache.json"
+    auth = TokenManager(None, cache)
+    assert auth.chart_shape is None
+    auth.remember_shape(1)
+    assert TokenManager(None, cache).chart_shape == 1
+    assert cache.stat().st_mode & 0o077 == 0
+
+
+def test_month_rows_read_iso_and_day_of_month_bars():
+    month = dt.date(2025, 2, 1)
+    payload = {"data": {"lines": [
+        {"key": "PVGeneration", "unit": "kWh", "xy": [
+            {"x": "2025-02-01", "y": 12.5}, {"x": "2", "y": 3}, {"x": "2025-03-01", "y": 1.0},
+            {"x": "30", "y": 1.0}, {"x": "2025-02-04", "y": None}, {"x": "2025-02-05", "y": True},
+        ]},
+        {"key": None, "xy": [{"x": "2025-02-01", "y": 1.0}]},
+    ]}}
+    assert month_rows(payload, month) == [
+        {"day": "2025-02-01", "series": "PVGeneration", "value": 12.5, "unit": "kWh"},
+        {"day": "2025-02-02", "series": "PVGeneration", "value": 3.0, "unit": "kWh"},
+    ]
+    assert month_rows({"hasError": True, "data": None}, month) == []
@@ -0,0 +1,121 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""End-to-end exporter runs against the offline portal in sems_mock_server.py."""
+
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from sems_mock_server import MockConfig, MockSemsServer
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+
+
+@pytest.fixture
+def portal():
+    servers = []
+
+    def start(**config):
+        server = MockSemsServer(config=MockConfig(**config))
+        server.start_background()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def export(server, out, *args, **env):
+    settings = {
+        **os.environ, **server.exporter_env(),
+        "SEMS_ACCOUNT": "demo", "SEMS_PASSWORD": "demo", "SEMS_STATION_ID": "st1",
+        "SEMS_START": "2025-01-01", "SEMS_END": "2025-01-03", "SEMS_OUT": str(out),
+        "SEMS_RETRY_BASE": "0.01", "SEMS_RATE_PER_SEC": "0", **env,
+    }
+    result = subprocess.run([sys.executable, str(ROOT / "sems_plant_power_v2.py"), *args],
+                            env=settings, cwd=out, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def rows_per_day(out):
+    counts = {}
+    with (out / "plant_power_v2.csv").open(newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            counts[row["day"]] = counts.get(row["day"], 0) + 1
+    return counts
+
+
+def test_export_then_up_to_date(portal, tmp_path):
+    server = portal()
+    out = export(server, tmp_path)
+    assert out.count("    ✓") == 3
+    counts = rows_per_day(tmp_path)
+    assert sorted(counts) == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    for secret in ("v2_token_cache.json", "auth_v2_status.txt"):
+        assert (tmp_path / secret).stat().st_mode & 0o077 == 0
+    assert "Up to date" in export(server, tmp_path)
+
+
+def test_resync_replaces_rows_and_failed_refetch_keeps_them(portal, tmp_path):
+    export(portal(), tmp_path)
+    before = rows_per_day(tmp_path)
+    (tmp_path / "v2_token_cache.json").unlink()  # each mock server runs on its own port
+    export(portal(), tmp_path, "--resync", SEMS_SINK="csv,sqlite")
+    assert rows_per_day(tmp_path) == before
+    (tmp_path / "v2_token_cache.json").unlink()
+    raw = (tmp_path / "raw_v2_2025-01-02.json").read_bytes()
+    out = export(portal(error_rate=1.0), tmp_path, "--resync", SEMS_MAX_RETRIES="0")
+    assert "kept the previously stored payload" in out
+    assert rows_per_day(tmp_path) == before
+    assert (tmp_path / "raw_v2_2025-01-02.json").read_bytes() == raw
+
+
+def test_auto_discovery_skipped_when_up_to_date(portal, tmp_path):
+    server = portal(stations=2)
+    first = export(server, tmp_path, SEMS_STATION_ID="auto")
+    assert "Discovering stations" in first
+    assert len(list(tmp_path.glob("plant=*/plant_power_v2.csv"))) == 2
+    counters = dict(server.state.counters)
+    second = export(server, tmp_path, SEMS_STATION_ID="auto")
+    assert "Discovering stations" not in second and "Up to date" in second
+    assert server.state.counters == counters  # no login, no station listing
+
+
+def test_learned_body_shape_is_sent_first(portal, tmp_path):
+    server = portal(body_shape="model")
+    export(server, tmp_path, SEMS_WORKERS="1")
+    assert server.state.counters["wrong_shape"] == 1  # only the first day tried the flat body
+    assert sorted(rows_per_day(tmp_path)) == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    export(server, tmp_path, "--resync", SEMS_WORKERS="1")
+    assert server.state.counters["wrong_shape"] == 1
+
+
+def test_days_before_fine_from_get_daily_energy_from_month_charts(portal, tmp_path):
+    server = portal()
+    window = dict(SEMS_END="2025-02-02", SEMS_FINE_FROM="2025-02-01")
+    export(server, tmp_path, **window)
+    with (tmp_path / "daily_energy.csv").open(newline="", encoding="utf-8") as fh:
+        days = [row["day"] for row in csv.DictReader(fh)]
+    assert days == [f"2025-01-{d:02d}" for d in range(1, 32)]
+    assert sorted(rows_per_day(tmp_path)) == ["2025-02-01", "2025-02-02"]
+    assert server.state.counters["month_requests"] == 1
+    assert "Up to date" in export(server, tmp_path, **window)
+    assert server.state.counters["month_requests"] == 1
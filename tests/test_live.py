@@ -0,0 +1,105 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import csv
+import datetime as dt
+import json
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import sems_live
+from conftest import EXAMPLE_PAYLOAD
+from sems_live import LivePoller, LiveState, new_points, next_tick
+from sems_payload import columns_from_payload
+from sems_sink import CsvSink, DayBatch
+
+DAY = dt.date(2025, 9, 20)
+
+
+def payload(slots):
+    """The example day cut off after `slots` 5-minute points."""
+    data = json.loads(EXAMPLE_PAYLOAD.read_text(encoding="utf-8"))
+    for line in data["data"]["lines"]:
+        line["xy"] = line["xy"][:slots]
+    return data
+
+
+def csv_rows(path):
+    with path.open(newline="", encoding="utf-8") as fh:
+        return list(csv.DictReader(fh))
+
+
+def test_next_tick_aligns_to_the_interval_plus_lag():
+    assert next_tick(1000.0, 300, 60) == 1260.0
+    assert next_tick(1260.0, 300, 60) == 1560.0
+
+
+def test_new_points_after_each_series_last_minute():
+    cols = columns_from_payload(payload(10))
+    fresh = new_points(cols, {"PCurve_Power_PV": 20})
+    assert fresh.minutes == [25, 30, 35, 40, 45]
+    assert fresh.agg_keys == [] and fresh.agg_values == []
+    assert len(new_points(cols, {}).values) == 10
+
+
+def test_state_advances_per_day_and_survives_a_restart(tmp_path):
+    state = LiveState(tmp_path / "live_state.json")
+    state.advance("p", DAY, columns_from_payload(payload(10)))
+    assert state.day("p") == DAY and state.last("p") == {"PCurve_Power_PV": 45}
+    state.save()
+    reloaded = LiveState(tmp_path / "live_state.json")
+    assert reloaded.last("p") == {"PCurve_Power_PV": 45}
+    reloaded.advance("p", DAY + dt.timedelta(days=1), columns_from_payload(payload(2)))
+    assert reloaded.last("p") == {"PCurve_Power_PV": 5}
+
+
+@pytest.fixture
+def poller(tmp_path, monkeypatch):
+    responses = []
+    monkeypatch.setattr(sems_live.exporter, "plant_dir", lambda plant_id: tmp_path)
+    monkeypatch.setattr(sems_live.exporter, "get_client", lambda: None)
+    monkeypatch.setattr(sems_live.exporter, "fetch_day",
+                        lambda auth, plant_id, day, limiter, client: (plant_id, day, responses.pop(0), None, 0))
+    live = LivePoller(["p"], None, LiveState(tmp_path / "live_state.json"))
+    live.responses = responses
+    return live
+
+
+def test_poll_appends_only_new_points_through_one_sink(poller, tmp_path):
+    CsvSink(tmp_path).write_day(DayBatch.from_columns(DAY, columns_from_payload(payload(6))))
+    poller.responses += [payload(8), payload(8), payload(12)]
+    assert poller.poll_day("p", DAY) == 8  # restart: the whole day replaces the batch rows
+    rows = csv_rows(tmp_path / "plant_power_v2.csv")
+    assert [r["series"] for r in rows].count("aggregate:Generation") == 1
+    assert sum(r["timestamp"] != "daily" for r in rows) == 8
+    sink = poller._sinks["p"]
+    assert poller.poll_day("p", DAY) == 0
+    assert poller.poll_day("p", DAY) == 4
+    assert poller._sinks["p"] is sink
+    rows = csv_rows(tmp_path / "plant_power_v2.csv")
+    assert [r["timestamp"] for r in rows if r["timestamp"] != "daily"][-1] == "00:55"
+    assert sum(r["timestamp"] != "daily" for r in rows) == 12
+    assert poller.polls == 3 and poller.appended == 12
+
+
+def test_metrics_expose_latest_values_and_counters(poller):
+    poller.csv = False
+    poller.responses.append(payload(12))
+    poller.poll_day("p", DAY)
+    text = poller.metrics()
+    assert 'sems_live_value{plant="p",series="PCurve_Power_PV",unit="W"}' in text
+    assert 'sems_live_daily_total{plant="p",key="Generation"} 6.7' in text
+    assert "sems_live_polls_total 1" in text
+    assert "sems_live_appended_points_total 12" in text
+    assert poller.snapshot()["plants"]["p"]["series"]["PCurve_Power_PV"]["time"].startswith("2025-09-20T00:55")
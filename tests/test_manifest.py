@@ -0,0 +1,81 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime as dt
+
+import pytest
+
+from sems_manifest import (STATUS_FAILED, STATUS_GAPS, STATUS_OK, STATUS_PARTIAL, SyncManifest,
+                           month_end)
+
+TODAY = dt.date(2025, 3, 15)
+D1, D2 = dt.date(2025, 3, 1), dt.date(2025, 3, 2)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    m = SyncManifest(tmp_path / "sync_manifest.sqlite")
+    yield m
+    m.close()
+
+
+def test_unknown_days_are_pending(manifest):
+    assert manifest.pending_days("p", [D1, D2], today=TODAY) == [D1, D2]
+
+
+def test_record_statuses(manifest):
+    assert manifest.record("p", D1, 290, "h1", today=TODAY) == STATUS_OK
+    assert manifest.record("p", D2, 0, None, today=TODAY) == STATUS_FAILED
+    assert manifest.record("p", TODAY, 100, "h2", today=TODAY) == STATUS_PARTIAL
+    assert manifest.record("p", TODAY - dt.timedelta(days=1), 290, "h3", today=TODAY) == STATUS_PARTIAL
+    days = [D1, D2, TODAY - dt.timedelta(days=1), TODAY]
+    assert manifest.pending_days("p", days, today=TODAY) == days[1:]
+    assert manifest.plants() == ["p"]
+
+
+def test_plants_are_tracked_separately(manifest):
+    manifest.record("a", D1, 290, "h", today=TODAY)
+    assert manifest.pending_days("a", [D1], today=TODAY) == []
+    assert manifest.pending_days("b", [D1], today=TODAY) == [D1]
+
+
+def test_gap_is_confirmed_by_an_identical_refetch(manifest):
+    assert manifest.record("p", D1, 200, "same", today=TODAY, gaps="tail 10:00-24:00") == STATUS_GAPS
+    assert manifest.pending_days("p", [D1], today=TODAY) == [D1]
+    assert manifest.record("p", D1, 200, "same", today=TODAY, gaps="tail 10:00-24:00") == STATUS_OK
+    assert "confirmed" in manifest.get("p", D1).detail
+    assert manifest.pending_days("p", [D1], today=TODAY) == []
+
+
+def test_gap_with_changed_payload_stays_pending(manifest):
+    manifest.record("p", D1, 200, "first", today=TODAY, gaps="tail")
+    assert manifest.record("p", D1, 250, "second", today=TODAY, gaps="tail") == STATUS_GAPS
+
+
+def test_requeue_clears_hash_so_the_next_fetch_is_not_a_confirmation(manifest):
+    manifest.record("p", D1, 200, "h", today=TODAY)
+    assert manifest.requeue("p", {D1: "internal gap"}) == 1
+    rec = manifest.get("p", D1)
+    assert (rec.status, rec.content_hash, rec.rows) == (STATUS_GAPS, None, 200)
+    assert manifest.record("p", D1, 200, "h", today=TODAY, gaps="internal gap") == STATUS_GAPS
+
+
+def test_pending_months(manifest):
+    jan, feb, mar = dt.date(2025, 1, 1), dt.date(2025, 2, 1), dt.date(2025, 3, 1)
+    assert manifest.record_month("p", jan, 31, "h", today=TODAY) == STATUS_OK
+    assert manifest.record_month("p", feb, 0, None, today=TODAY) == STATUS_FAILED
+    assert manifest.record_month("p", mar, 14, "h", today=TODAY) == STATUS_PARTIAL
+    assert manifest.pending_months("p", [jan, feb, mar], today=TODAY) == [feb, mar]
+
+
+def test_month_end():
+    assert month_end(dt.date(2024, 2, 1)) == dt.date(2024, 2, 29)
+    assert month_end(dt.date(2025, 12, 1)) == dt.date(2025, 12, 31)
@@ -0,0 +1,161 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime as dt
+import json
+import os
+import shutil
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+import merge_sems_json_to_parquet as merger
+from conftest import EXAMPLE_PAYLOAD
+from sems_payload import DayColumns
+
+DAY = dt.date(2025, 9, 20)
+
+
+@pytest.mark.parametrize("text, minutes", [
+    ("+08:00", 480), ("-01:30", -90), ("+0530", 330), ("-05", -300), ("Z", 0), ("", 0), (" +01:00 ", 60),
+])
+def test_parse_utc_offset(text, minutes):
+    assert merger.parse_utc_offset(text) == minutes
+
+
+def test_para_utc_offset_falls_back_to_default():
+    para = json.dumps({"model": {"date": "2025-09-20T00:00:00+02:00"}})
+    assert merger.para_utc_offset(para, 480) == 120
+    assert merger.para_utc_offset("not json", 480) == 480
+    assert merger.para_utc_offset(None, 480) == 480
+
+
+def test_columns_tables():
+    cols = DayColumns(line_keys=["pv", "load"], line_units=["W", "W"], series=[0, 0, 1],
+                      minutes=[0, 5, 0], values=[1.0, 2.0, 3.0], agg_keys=["sell"],
+                      agg_values=[4.5], agg_units=["kWh"], para=None)
+    points, aggs = merger.columns_tables(cols, DAY, "raw_v2_2025-09-20.json", 120)
+    assert points.schema == merger.points_schema()
+    stamps = points.column("period_start").to_pylist()
+    assert stamps[0] == dt.datetime(2025, 9, 19, 22, 0, tzinfo=dt.timezone.utc)  # local midnight at +02:00
+    assert stamps[1] - stamps[0] == dt.timedelta(minutes=5)
+    assert points.column("utc_offset").to_pylist() == [120] * 3
+    assert points.column("series").to_pylist() == ["pv", "pv", "load"]
+    assert points.column("unit").to_pylist() == ["W"] * 3
+    assert aggs.column("day").to_pylist() == [DAY]
+    assert aggs.column("value").to_pylist() == [4.5]
+
+
+def test_columns_tables_without_points():
+    cols = DayColumns([], [], [], [], [], ["sell"], [1.0], ["kWh"], None)
+    points, aggs = merger.columns_tables(cols, DAY, "x", 0)
+    assert points is None and aggs.num_rows == 1
+
+
+def day_files(folder, days):
+    """Copies of the example payload named for `days`."""
+    folder.mkdir(parents=True, exist_ok=True)
+    payload = EXAMPLE_PAYLOAD.read_bytes()
+    files = []
+    for day in days:
+        path = folder / f"raw_v2_{day}.json"
+        path.write_bytes(payload)
+        files.append(path)
+    return files
+
+
+def test_parallel_merge_matches_serial(tmp_path):
+    import pyarrow.parquet as pq
+
+    files = day_files(tmp_path / "src", [DAY + dt.timedelta(days=i) for i in range(4)])
+    serial = merger.write_parquet(files, tmp_path / "serial.parquet", jobs=1)
+    parallel = merger.write_parquet(files, tmp_path / "parallel.parquet", jobs=2, row_group_size=100)
+    assert serial == parallel and serial[0] > 0
+    for name in ("{}.parquet", "{}_aggregates.parquet"):
+        left = pq.read_table(tmp_path / name.format("serial")).to_pandas()
+        right = pq.read_table(tmp_path / name.format("parallel")).to_pandas()
+        keys = [c for c in ("period_start", "day", "series") if c in left.columns]
+        left, right = (t.sort_values(keys, ignore_index=True) for t in (left, right))
+        assert left.equals(right)
+
+
+def test_dataset_converts_only_new_or_changed_sources(tmp_path):
+    src, dataset = tmp_path / "src", tmp_path / "dataset"
+    first, second = day_files(src, [DAY, DAY + dt.timedelta(days=1)])
+    converted, unchanged, rows = merger.write_dataset([first, second], src, dataset)
+    assert (converted, unchanged) == (2, 0) and rows > 0
+    assert merger.write_dataset([first, second], src, dataset) == (0, 2, 0)
+    stat = first.stat()
+    os.utime(first, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))  # touched, same bytes
+    assert merger.write_dataset([first, second], src, dataset) == (0, 2, 0)
+    (third,) = day_files(src, [DAY + dt.timedelta(days=2)])
+    assert merger.write_dataset([first, second, third], src, dataset)[:2] == (1, 2)
+    assert len(list((dataset / "points").rglob("*.parquet"))) == 3
+
+
+@pytest.fixture
+def fleet_dataset(tmp_path):
+    """Two plants with the example day, merged into a --dataset directory with rollups."""
+    src = tmp_path / "src"
+    for plant, scale in (("a", 1), ("b", 3)):
+        payload = json.loads(EXAMPLE_PAYLOAD.read_text(encoding="utf-8"))
+        for line in payload["data"]["lines"]:
+            for pt in line["xy"]:
+                if isinstance(pt.get("y"), (int, float)):
+                    pt["y"] *= scale
+        folder = src / f"plant={plant}"
+        folder.mkdir(parents=True)
+        (folder / EXAMPLE_PAYLOAD.name).write_text(json.dumps(payload), encoding="utf-8")
+    files = sorted(src.glob("plant=*/raw_v2_*.json"))
+    dataset = tmp_path / "dataset"
+    merger.write_dataset(files, src, dataset)
+    merger.build_rollups(dataset, merger.points_fingerprint(dataset))
+    return dataset
+
+
+@pytest.mark.parametrize("frequency", ["15min", "1h", "1D"])
+def test_rollups_match_resampled_points(fleet_dataset, frequency):
+    import visualize_plant_power as viz
+
+    from_rollup = viz.load_rollup(fleet_dataset, frequency)
+    assert from_rollup is not None
+    from_points = viz.resample_time_series(viz.load_dataset(fleet_dataset, cache=False), frequency)
+    keys = ["plant", "series", "period_start"]
+    left = from_rollup.dropna(subset=["value"]).astype({"plant": str, "series": str}).sort_values(keys)
+    right = from_points.dropna(subset=["value"]).astype({"plant": str, "series": str}).sort_values(keys)
+    assert left[keys].values.tolist() == right[keys].values.tolist()
+    assert left["value"].to_numpy() == pytest.approx(right["value"].to_numpy(), rel=1e-6)
+    assert set(left["plant"]) == {"a", "b"}
+
+
+def test_rollups_rebuild_only_changed_slices(fleet_dataset):
+    rollup_dir = merger.rollup_dir_for(fleet_dataset)
+    before = {p: p.stat().st_mtime_ns for p in rollup_dir.glob("*/plant=a/*.parquet")}
+    target = fleet_dataset / "points" / "plant=b"
+    shutil.rmtree(target)
+    assert merger.build_rollups(fleet_dataset, "changed") == []
+    assert not list(rollup_dir.glob("*/plant=b/*.parquet"))
+    assert {p: p.stat().st_mtime_ns for p in rollup_dir.glob("*/plant=a/*.parquet")} == before
+
+
+def test_fingerprint_does_not_migrate_a_v1_dataset(tmp_path):
+    legacy = tmp_path / "plant=a" / "month=2025-09" / "day=2025-09-20" / "raw_v2_2025-09-20.parquet"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(b"v1")
+    (tmp_path / "points").mkdir()
+    log = {"plant=a/raw_v2_2025-09-20.json": {"partition": legacy.relative_to(tmp_path).as_posix()}}
+    (tmp_path / merger.INGEST_LOG).write_text(json.dumps(log), encoding="utf-8")
+    merger.points_fingerprint(tmp_path)
+    assert legacy.exists()
+    assert merger._load_ingest_log(tmp_path) == {}
+    assert not legacy.exists()
@@ -0,0 +1,101 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime as dt
+import json
+
+import pytest
+
+import sems_payload
+from conftest import EXAMPLE_PAYLOAD
+from sems_payload import columns_from_payload, decode_columns, decode_record, flatten_rows
+
+
+def old_flatten(payload):
+    """The dict walker the exporter and the merger each carried before sems_payload."""
+    rows = []
+    data = payload.get("data") or {}
+    for item in data.get("generateData") or []:
+        key, value = item.get("key"), item.get("value")
+        if key is not None and value is not None:
+            rows.append({"series": f"aggregate:{key}", "timestamp": "daily", "value": value})
+    for line in data.get("lines") or []:
+        for point in line.get("xy") or []:
+            x, y = point.get("x"), point.get("y")
+            if x is not None and y is not None:
+                rows.append({"series": line.get("key") or "line", "timestamp": x, "value": y})
+    return rows
+
+
+@pytest.fixture(params=["msgspec", "portable"])
+def backend(request, monkeypatch):
+    if request.param == "msgspec":
+        pytest.importorskip("msgspec")
+    else:
+        monkeypatch.setattr(sems_payload, "msgspec", None)
+    return request.param
+
+
+def edited(edit):
+    payload = json.loads(EXAMPLE_PAYLOAD.read_text(encoding="utf-8"))
+    edit(payload)
+    return payload
+
+
+def test_example_day_matches_the_old_parser(backend):
+    raw = EXAMPLE_PAYLOAD.read_bytes()
+    payload = json.loads(raw)
+    cols = decode_columns(raw)
+    assert cols == columns_from_payload(payload)
+    assert flatten_rows(cols) == old_flatten(payload)
+    assert cols.para is not None
+
+
+@pytest.mark.parametrize("point, kept", [
+    ({"y": None}, None),  # missing value: dropped, as before
+    ({"y": "12.5"}, 12.5),  # string value: read as a number
+    ({"y": "n/a"}, None),
+    ({"x": None}, None),
+    ({"x": "00:15:00", "y": 7}, 7),  # seconds suffix: same slot
+    ({"x": "late"}, None),
+])
+def test_odd_points_decode_the_same_with_every_backend(backend, point, kept):
+    payload = edited(lambda p: p["data"]["lines"][0]["xy"][3].update(point))
+    cols = decode_columns(json.dumps(payload))
+    assert cols == columns_from_payload(payload)
+    slot = [r["value"] for r in flatten_rows(cols) if r["timestamp"] == "00:15"]
+    assert slot == ([] if kept is None else [kept])
+    assert len(cols.values) == 288 - (kept is None)
+
+
+@pytest.mark.parametrize("body", [
+    {"hasError": True, "code": 100002, "msg": "token expired", "data": None},
+    {"code": 0, "data": {"lines": None, "generateData": None}},
+    {"code": 0, "data": {"lines": "oops"}},
+    [],
+])
+def test_error_bodies_decode_empty(backend, body):
+    cols = decode_columns(json.dumps(body))
+    assert cols.empty and cols.line_keys == [] and cols.para is None
+
+
+def test_invalid_json_raises_value_error(backend):
+    with pytest.raises(ValueError):
+        decode_columns(b"{not json")
+
+
+def test_archive_record_round_trip(backend):
+    payload = json.loads(EXAMPLE_PAYLOAD.read_bytes())
+    line = json.dumps({"day": "2025-09-20", "payload": payload})
+    day, cols = decode_record(line)
+    assert day == dt.date(2025, 9, 20)
+    assert cols == columns_from_payload(payload)
@@ -0,0 +1,109 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import csv
+import datetime as dt
+import json
+
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+import merge_sems_json_to_parquet as merger
+import sems_query as query
+from conftest import EXAMPLE_PAYLOAD
+from sems_archive import RawArchive
+
+D1, D2 = dt.date(2025, 9, 20), dt.date(2025, 9, 21)
+
+
+def payload(scale, meter=False):
+    """The example day with PV scaled by `scale`; `meter` adds a grid series exporting half of it."""
+    data = json.loads(EXAMPLE_PAYLOAD.read_text(encoding="utf-8"))
+    pv = data["data"]["lines"][0]
+    for point in pv["xy"]:
+        point["y"] *= scale
+    if meter:
+        data["data"]["lines"].append({"key": "PCurve_Power_Meter", "unit": "W",
+                                      "xy": [{"x": p["x"], "y": p["y"] / 2} for p in pv["xy"]]})
+    return data
+
+
+def pv_kwh(data):
+    return round(sum(p["y"] for p in data["data"]["lines"][0]["xy"]) * query.KWH_PER_W_POINT, 3)
+
+
+@pytest.fixture
+def raw(tmp_path):
+    """plant=a with an ordinary day and a day producing twice as much."""
+    folder = tmp_path / "raw" / "plant=a"
+    folder.mkdir(parents=True)
+    for day, scale in ((D1, 1), (D2, 2)):
+        (folder / f"raw_v2_{day}.json").write_text(json.dumps(payload(scale, meter=True)), encoding="utf-8")
+    return tmp_path / "raw"
+
+
+@pytest.fixture
+def dataset(raw, tmp_path):
+    out = tmp_path / "dataset"
+    merger.write_dataset(sorted(raw.glob("plant=*/raw_v2_*.json")), raw, out)
+    return out
+
+
+def energy(source, **filters):
+    rel = query.daily_energy(query.connect(source), series=["PCurve_Power_PV"], **filters)
+    return [(plant, day, kwh, points) for plant, _, day, kwh, points in rel.fetchall()]
+
+
+def test_dataset_and_raw_views_agree(raw, dataset):
+    expected = [("a", D1, pv_kwh(payload(1)), 288), ("a", D2, pv_kwh(payload(2)), 288)]
+    assert energy(dataset) == expected
+    assert energy(raw) == expected
+
+
+def test_date_and_plant_filters(dataset):
+    assert [row[1] for row in energy(dataset, start=D2)] == [D2]
+    assert [row[1] for row in energy(dataset, end=D1)] == [D1]
+    assert energy(dataset, plant=["b"]) == []
+
+
+def test_bundled_day_wins_over_its_day_file(raw):
+    RawArchive(raw / "plant=a", "gz").put(D1, payload(3))
+    assert energy(raw)[0] == ("a", D1, pv_kwh(payload(3)), 288)
+
+
+def test_top_days_and_peak(dataset):
+    con = query.connect(dataset)
+    assert [row[1] for row in query.top_days(con, n=1).fetchall()] == [D2]
+    peaks = {row[2]: row[3] for row in query.peak_power(con, series=["PCurve_Power_PV"]).fetchall()}
+    assert peaks[D2] == 2 * peaks[D1] > 0
+
+
+def test_self_consumption_from_a_grid_meter(dataset):
+    con = query.connect(dataset)
+    rows = query.self_consumption(con, grid_series="PCurve_Power_Meter").fetchall()
+    assert [(day, share, sufficiency) for _, day, *_, share, sufficiency in rows] == [(D1, 0.5, 1.0), (D2, 0.5, 1.0)]
+
+
+def test_cli_writes_csv(dataset, tmp_path, capsys):
+    out = tmp_path / "top.csv"
+    query.main([str(dataset), "-o", str(out), "top-days", "-n", "1"])
+    with out.open(newline="", encoding="utf-8") as fh:
+        rows = list(csv.DictReader(fh))
+    assert [(r["plant"], r["day"]) for r in rows] == [("a", D2.isoformat())]
+    assert "top-days" in capsys.readouterr().out
+
+
+def test_source_without_data_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="No Parquet output"):
+        query.connect(tmp_path)
@@ -0,0 +1,144 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import csv
+import datetime as dt
+import json
+import sqlite3
+
+from sems_sink import CsvSink, DayBatch, SqliteSink, purge_csv_days
+
+D1, D2 = dt.date(2025, 1, 1), dt.date(2025, 1, 2)
+
+
+def batch(day, n, value=1.0):
+    return DayBatch(day, ["pv"] * n, [f"00:{i:02d}" for i in range(n)], [value] * n)
+
+
+def csv_days(path):
+    rows = list(csv.reader(path.open(newline="", encoding="utf-8")))
+    assert rows[0] == ["day", "series", "timestamp", "value"]
+    counts = {}
+    for row in rows[1:]:
+        counts[row[0]] = counts.get(row[0], 0) + 1
+    return counts
+
+
+def test_append_and_replace(tmp_path):
+    sink = CsvSink(tmp_path)
+    sink.write_day(batch(D1, 3))
+    sink.write_day(batch(D2, 2))
+    sink.write_day(batch(D1, 4, value=2.0))
+    assert sink.staged and csv_days(sink.path) == {"2025-01-01": 3, "2025-01-02": 2}
+    sink.flush()
+    assert not sink.staged and csv_days(sink.path) == {"2025-01-01": 4, "2025-01-02": 2}
+    sink.write_day(batch(D2, 1), replace=False)
+    assert csv_days(sink.path) == {"2025-01-01": 4, "2025-01-02": 3}
+    assert CsvSink(tmp_path).recovered == 0
+
+
+def test_recover_truncates_an_uncommitted_tail(tmp_path):
+    sink = CsvSink(tmp_path)
+    sink.write_day(batch(D1, 3))
+    committed = sink.path.stat().st_size
+    with sink.path.open("ab") as fh:  # a day half-written when the run was killed
+        fh.write(b"2025-01-02,pv,00:00,1.0\r\n2025-01-02,pv,00:0")
+    torn = sink.path.stat().st_size - committed
+    assert CsvSink(tmp_path).recovered == torn
+    assert sink.path.stat().st_size == committed
+    assert csv_days(sink.path) == {"2025-01-01": 3}
+
+
+def test_recover_without_commit_marker_keeps_whole_lines(tmp_path):
+    sink = CsvSink(tmp_path)
+    sink.write_day(batch(D1, 3))
+    sink.commit_path.unlink()
+    with sink.path.open("ab") as fh:
+        fh.write(b"2025-01-02,pv,00:0")
+    assert CsvSink(tmp_path).recovered == len(b"2025-01-02,pv,00:0")
+    assert csv_days(sink.path) == {"2025-01-01": 3}
+
+
+def test_recover_after_replace_rename_trusts_the_new_file(tmp_path):
+    sink = CsvSink(tmp_path)
+    sink.write_day(batch(D1, 3))
+    sink.write_day(batch(D2, 2))
+    # The replacing rename landed but the marker still describes the old file.
+    stale = json.loads(sink.commit_path.read_text())
+    sink.write_day(batch(D1, 5))
+    sink.flush()
+    sink.commit_path.write_text(json.dumps(stale))
+    assert CsvSink(tmp_path).recovered == 0
+    assert csv_days(sink.path) == {"2025-01-01": 5, "2025-01-02": 2}
+
+
+def test_replacements_share_one_rewrite(tmp_path):
+    sink = CsvSink(tmp_path)
+    for i in range(5):
+        sink.write_day(batch(D1 + dt.timedelta(days=i), 3))
+    inode = sink.path.stat().st_ino
+    sink.write_day(batch(D1, 2, value=2.0))
+    sink.write_day(batch(D2, 1, value=2.0))
+    sink.write_day(batch(D2, 1, value=3.0), replace=False)  # added to the staged replacement
+    assert sink.path.stat().st_ino == inode
+    sink.close()
+    counts = csv_days(sink.path)
+    assert counts["2025-01-01"] == 2 and counts["2025-01-02"] == 2 and len(counts) == 5
+    reopened = CsvSink(tmp_path)
+    assert reopened.stored_days() == set(counts)
+    reopened.write_day(batch(D1, 1), replace=False)
+    assert csv_days(sink.path)["2025-01-01"] == 3
+
+
+def test_append_trusts_the_commit_index(tmp_path, monkeypatch):
+    CsvSink(tmp_path).write_day(batch(D1, 3))
+
+    def scan(self):
+        raise AssertionError("the CSV was read")
+
+    monkeypatch.setattr(CsvSink, "_scan", scan)
+    sink = CsvSink(tmp_path)
+    sink.write_day(batch(D2, 2))
+    sink.write_day(batch(D2, 1), replace=False)
+    assert sink.stored_days() == {"2025-01-01", "2025-01-02"}
+
+
+def test_index_is_rebuilt_from_a_marker_without_one(tmp_path):
+    sink = CsvSink(tmp_path)
+    sink.write_day(batch(D1, 3))
+    sink.write_day(batch(D2, 2))
+    marker = json.loads(sink.commit_path.read_text())
+    del marker["days"]
+    sink.commit_path.write_text(json.dumps(marker))
+    reopened = CsvSink(tmp_path)
+    assert reopened.stored_days() == {"2025-01-01", "2025-01-02"}
+    reopened.write_day(batch(D2, 4))
+    reopened.flush()
+    assert csv_days(sink.path) == {"2025-01-01": 3, "2025-01-02": 4}
+
+
+def test_purge_csv_days(tmp_path):
+    sink = CsvSink(tmp_path)
+    sink.write_day(batch(D1, 3))
+    sink.write_day(batch(D2, 2))
+    assert purge_csv_days(sink.path, [D1]) == 3
+    assert purge_csv_days(sink.path, [D1]) == 0
+    assert csv_days(sink.path) == {"2025-01-02": 2}
+
+
+def test_sqlite_replaces_a_day_in_one_transaction(tmp_path):
+    sink = SqliteSink(tmp_path)
+    sink.write_day(batch(D1, 4))
+    sink.write_day(batch(D1, 2, value=5.0))
+    sink.close()
+    db = sqlite3.connect(str(tmp_path / "plant_power_v2.sqlite"))
+    assert db.execute("SELECT COUNT(*), MIN(value) FROM points WHERE day = '2025-01-01'").fetchone() == (2, 5.0)
@@ -0,0 +1,46 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime as dt
+import shutil
+
+import pytest
+
+import sems_validate
+from conftest import EXAMPLE_PAYLOAD
+from sems_manifest import MANIFEST_NAME, STATUS_GAPS, SyncManifest
+
+
+@pytest.fixture
+def flat_folder(tmp_path):
+    shutil.copy(EXAMPLE_PAYLOAD, tmp_path / EXAMPLE_PAYLOAD.name)
+    shutil.copy(EXAMPLE_PAYLOAD, tmp_path / "raw_v2_2025-09-22.json")  # leaves 09-21 missing
+    return tmp_path
+
+
+def test_requeue_on_a_flat_folder_needs_a_plant(flat_folder):
+    with pytest.raises(SystemExit, match="--plant"):
+        sems_validate.main([str(flat_folder), "--requeue"])
+    assert not (flat_folder / MANIFEST_NAME).exists()
+
+
+def test_requeue_with_plant(flat_folder):
+    sems_validate.main([str(flat_folder), "--requeue", "--plant", "st1"])
+    manifest = SyncManifest(flat_folder / MANIFEST_NAME)
+    assert manifest.get("st1", dt.date(2025, 9, 21)).status == STATUS_GAPS
+    assert manifest.plants() == ["st1"]
+    manifest.close()
+
+
+def test_report_only_needs_no_plant(flat_folder, capsys):
+    sems_validate.main([str(flat_folder)])
+    assert "default:" in capsys.readouterr().out
@@ -0,0 +1,56 @@
+# Copyright 2025 Steven Michiels
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from visualize_plant_power import downsample_time_series, lttb_indices, minmax_indices
+
+
+def test_lttb_keeps_endpoints_and_size():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    idx = lttb_indices(x, y, 100)
+    assert len(idx) == 100
+    assert idx[0] == 0 and idx[-1] == 999
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(500, dtype=np.float64)
+    y = np.zeros(500)
+    y[321] = 10.0
+    assert 321 in lttb_indices(x, y, 20)
+
+
+@pytest.mark.parametrize("n_out", [2, 500, 1000])
+def test_lttb_returns_everything_when_nothing_to_drop(n_out):
+    x = np.arange(500, dtype=np.float64)
+    assert np.array_equal(lttb_indices(x, x, n_out), np.arange(500))
+
+
+def test_minmax_keeps_extremes():
+    y = np.random.default_rng(0).normal(size=1000)
+    idx = minmax_indices(y, 50)
+    assert y.argmax() in idx and y.argmin() in idx
+    assert len(idx) <= 50
+
+
+def test_downsample_is_per_plant_and_series():
+    stamps = pd.date_range("2025-01-01", periods=600, freq="5min")
+    df = pd.concat([
+        pd.DataFrame({"period_start": stamps, "plant": plant, "series": "pv", "value": np.arange(600.0)})
+        for plant in ("a", "b")
+    ], ignore_index=True)
+    out = downsample_time_series(df, max_points=100)
+    assert out.groupby("plant").size().to_dict() == {"a": 100, "b": 100}
@@ -12,12 +12,18 @@
 
 #!/usr/bin/env python3
 
-"""Visualize SEMS plant power data from the CSV export using Plotly.
+"""Visualize SEMS plant power data from the CSV or Parquet export using Plotly.
 
 Usage
 -----
 CLI:
     python visualize_plant_power.py --series PCurve_Power_PV --resample 15min
+    python visualize_plant_power.py json_export/dataset --series PCurve_Power_PV \
+        --start 2025-09-01 --end 2025-09-07
+    python visualize_plant_power.py json_export/dataset --plant 1234 --resample 1h
+
+A fleet dataset (several `plant=` partitions) is plotted as one trace per
+plant and series unless --plant narrows it down.
 
 Notebook:
     from visualize_plant_power import visualize
@@ -32,25 +38,33 @@ Notebook:
 from __future__ import annotations
 
 import argparse
+import datetime as dt
 from pathlib import Path
-from typing import Iterable, Optional, Sequence, Tuple, Union
+from typing import TYPE_CHECKING, Iterable, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 
+if TYPE_CHECKING:  # plotly itself is imported when a figure is built
+    import plotly.graph_objects as go
+
+from sems_metrics import METRICS, PROFILERS, finish as finish_metrics, profiled
 
 DEFAULT_CSV = Path("json_export_example/plant_power_v2.csv")
 
 SERIES_ALIASES = {"PCurve_Power_PV": "Power [W]"}
 
+DEFAULT_MAX_POINTS = 4000  # per trace; ~2 weeks of 5-minute data before downsampling kicks in
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
 
-def load_dataset(csv_path: Path) -> pd.DataFrame:
-    """Load the plant power CSV and normalize columns for plotting."""
-    df = pd.read_csv(csv_path)
-    if df.empty:
-        raise ValueError(f"No rows found in {csv_path}.")
 
+def _group_keys(df: pd.DataFrame) -> list[str]:
+    """Columns that identify one trace: the series, plus the plant for partitioned datasets."""
+    return ["plant", "series"] if "plant" in df.columns else ["series"]
+
+
+def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Derive `period_start` from the CSV-style `day` + `timestamp` columns."""
     if "day" in df.columns:
         df["day"] = pd.to_datetime(df["day"], errors="coerce")
 
@@ -75,28 +89,369 @@ def load_dataset(csv_path: Path) -> pd.DataFrame:
     return df
 
 
+def _filter_frame(
+    df: pd.DataFrame,
+    series: Optional[Sequence[str]],
+    start: Optional[dt.date],
+    end: Optional[dt.date],
+    plants: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    if series and "series" in df.columns:
+        df = df[df["series"].isin(set(series))]
+    if plants and "plant" in df.columns:
+        df = df[df["plant"].astype(str).isin(set(plants))]
+    if "period_start" in df.columns:
+        if start is not None:
+            df = df[df["period_start"] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df["period_start"] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    return df
+
+
+def _is_parquet(path: Path) -> bool:
+    return path.is_dir() or path.suffix.lower() in (".parquet", ".pq")
+
+
+def _load_parquet(
+    path: Path,
+    series: Optional[Sequence[str]],
+    start: Optional[dt.date],
+    end: Optional[dt.date],
+    plants: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """Read only the needed columns and row groups/partitions of a merged Parquet output."""
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+
+    if path.is_dir() and (path / "points").is_dir():
+        path = path / "points"
+    dataset = pads.dataset(path, format="parquet", partitioning="hive" if path.is_dir() else None)
+    names = set(dataset.schema.names)
+
+    if "period_start" not in names:
+        # Legacy merge output with CSV-style columns: no pushdown possible on strings.
+        df = _normalize_columns(dataset.to_table().to_pandas())
+        return _filter_frame(df, series, start, end, plants)
+
+    predicate = None
+
+    def _and(expr):
+        return expr if predicate is None else predicate & expr
+
+    if series:
+        predicate = _and(pads.field("series").isin(list(series)))
+    if plants and "plant" in names:
+        predicate = _and(pads.field("plant").cast(pa.string()).isin(list(plants)))
+    # period_start is UTC; widen by the largest possible offset and trim exactly after load.
+    stamp = pa.timestamp("ms", tz="UTC")
+    if start is not None:
+        lower = dt.datetime.combine(start, dt.time(), dt.timezone.utc) - dt.timedelta(hours=14)
+        predicate = _and(pads.field("period_start") >= pa.scalar(lower, stamp))
+        if "day" in names:
+            predicate = _and(pads.field("day") >= start.isoformat())
+    if end is not None:
+        upper = dt.datetime.combine(end, dt.time(), dt.timezone.utc) + dt.timedelta(days=1, hours=14)
+        predicate = _and(pads.field("period_start") < pa.scalar(upper, stamp))
+        if "day" in names:
+            predicate = _and(pads.field("day") <= end.isoformat())
+
+    columns = [c for c in ("period_start", "utc_offset", "plant", "series", "value") if c in names]
+    df = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+
+    # Plot in the portal's local wall-clock time, like the CSV path does.
+    local = df["period_start"]
+    if "utc_offset" in df.columns:
+        local = local + pd.to_timedelta(df.pop("utc_offset"), unit="min")
+    df["period_start"] = local.dt.tz_localize(None)
+    df["value"] = df["value"].astype("float64")
+    if isinstance(df["series"].dtype, pd.CategoricalDtype):
+        df["series"] = df["series"].cat.remove_unused_categories()
+    if "plant" in df.columns:
+        df["plant"] = df["plant"].astype(str).astype("category")
+    df["day"] = df["period_start"].dt.normalize()
+    return _filter_frame(df, None, start, end)
+
+
+def load_dataset(
+    path: Path,
+    *,
+    series: Optional[Sequence[str]] = None,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+    plants: Optional[Sequence[str]] = None,
+    cache: bool = True,
+) -> pd.DataFrame:
+    """Load the plant power CSV or Parquet output and normalize columns for plotting.
+
+    For Parquet files and datasets the plant, series and date-range filters are
+    pushed down into the reader; the CSV is read in full and filtered after.
+    With `cache` (and pyarrow installed) the normalized frame is kept in the
+    memory-mapped Arrow cache of sems_cache.py, keyed by the source's
+    fingerprint, so repeated loads skip parsing entirely.
+    """
+    path = Path(path)
+    store = None
+    if cache:
+        import sems_cache
+
+        store = sems_cache.FrameCache() if sems_cache.available() else None
+
+    if _is_parquet(path):
+        def build() -> pd.DataFrame:
+            return _load_parquet(path, series, start, end, plants).reset_index(drop=True)
+
+        if store is None:
+            df = build()
+        else:
+            key = store.key(path, "parquet", sorted(series or ()), plants=plants, start=start, end=end)
+            with METRICS.timer("cache.load"):
+                df = store.load(key, build)
+    else:
+        def build() -> pd.DataFrame:
+            raw = pd.read_csv(path)
+            if raw.empty:
+                raise ValueError(f"No rows found in {path}.")
+            raw = _normalize_columns(raw)
+            if "series" in raw.columns:
+                raw["series"] = raw["series"].astype("category")
+            return raw
+
+        # The whole normalized CSV is cached once; filters apply to the mapped frame.
+        if store is None:
+            df = build()
+        else:
+            with METRICS.timer("cache.load"):
+                df = store.load(store.key(path, "csv"), build)
+        df = _filter_frame(df, series, start, end, plants)
+        if "series" in df.columns and isinstance(df["series"].dtype, pd.CategoricalDtype):
+            df = df.assign(series=df["series"].cat.remove_unused_categories())
+    if store is not None:
+        METRICS.count("cache.hits", store.hits)
+        METRICS.count("cache.misses", store.misses)
+
+    if df.empty:
+        raise ValueError(f"No rows found in {path} for the requested filters.")
+    return df
+
+
+def _rollup_for(frequency: str) -> Optional[str]:
+    """Coarsest merger rollup whose buckets tile `frequency` exactly, if any."""
+    try:
+        offset = pd.tseries.frequencies.to_offset(frequency)
+    except ValueError:
+        return None
+    if isinstance(offset, (pd.offsets.MonthBegin, pd.offsets.MonthEnd, pd.offsets.QuarterBegin,
+                           pd.offsets.QuarterEnd, pd.offsets.YearBegin, pd.offsets.YearEnd)):
+        return "monthly"
+    if isinstance(offset, (pd.offsets.Week, pd.offsets.Day)) and not isinstance(offset, pd.offsets.Tick):
+        return "daily"
+    if isinstance(offset, pd.offsets.Tick):
+        for name, step in (("daily", "1D"), ("hourly", "1h"), ("15min", "15min")):
+            if offset.nanos % pd.Timedelta(step).value == 0:
+                return name
+    return None
+
+
+def load_rollup(
+    path: Path,
+    frequency: str,
+    *,
+    series: Optional[Sequence[str]] = None,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+    plants: Optional[Sequence[str]] = None,
+) -> Optional[pd.DataFrame]:
+    """Serve a resample request from the merger's precomputed rollups.
+
+    Returns None (caller falls back to the raw points) for CSV input, when no
+    rollup tiles `frequency`, when the rollups are stale, or when the date
+    range would cut a monthly bucket in half.
+    """
+    path = Path(path)
+    if not frequency or not _is_parquet(path):
+        return None
+    name = _rollup_for(frequency)
+    if name is None:
+        return None
+    if name == "monthly" and (
+        (start is not None and start.day != 1)
+        or (end is not None and (end + dt.timedelta(days=1)).day != 1)
+    ):
+        return None
+
+    from merge_sems_json_to_parquet import points_fingerprint, read_rollup, read_rollup_version, rollup_dir_for
+
+    try:
+        if read_rollup_version(rollup_dir_for(path)).get("points_fingerprint") != points_fingerprint(path):
+            return None
+    except OSError:
+        return None
+
+    filters = []
+    if series:
+        filters.append(("series", "in", list(series)))
+    if plants:
+        filters.append(("plant", "in", list(plants)))
+    if start is not None:
+        filters.append(("period_start", ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append(("period_start", "<", pd.Timestamp(end) + pd.Timedelta(days=1)))
+    table = read_rollup(path, name, ["plant", "series", "period_start", "sum", "count"], filters)
+    if table is None:
+        return None
+    df = table.to_pandas()
+    if df.empty:
+        raise ValueError(f"No rows found in {path} for the requested filters.")
+    return resample_time_series(df, frequency)
+
+
 def resample_time_series(df: pd.DataFrame, frequency: str) -> pd.DataFrame:
-    """Resample the time series to the requested frequency per series."""
+    """Resample the time series to the requested frequency per series (and plant).
+
+    Accepts raw points (`value`) or rollup rows (`sum` + `count`); the latter
+    are re-aggregated as a count-weighted mean, matching a resample of the
+    raw points.
+    """
     if "period_start" not in df.columns:
         raise KeyError("Cannot resample without a 'period_start' column.")
     if frequency is None:
         return df
 
-    resampled = (
-        df.set_index("period_start")
-        .groupby("series")["value"]
-        .resample(frequency)
-        .mean()
-        .reset_index()
-    )
+    if {"sum", "count"}.issubset(df.columns):
+        resampled = (
+            df.set_index("period_start")
+            .groupby(_group_keys(df), observed=True)[["sum", "count"]]
+            .resample(frequency)
+            .sum()
+            .reset_index()
+        )
+        resampled["value"] = resampled["sum"] / resampled["count"].where(resampled["count"] > 0)
+        resampled = resampled.drop(columns=["sum", "count"])
+    else:
+        resampled = (
+            df.set_index("period_start")
+            .groupby(_group_keys(df), observed=True)["value"]
+            .resample(frequency)
+            .mean()
+            .reset_index()
+        )
 
     resampled["day"] = resampled["period_start"].dt.normalize()
     resampled["timestamp"] = resampled["period_start"].dt.strftime("%H:%M")
     return resampled
 
 
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `n_out` points that keep the visual shape."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[prev] - avg_x) * (by - y[prev]) - (x[prev] - bx) * (avg_y - y[prev]))
+        prev = lo + int(area.argmax())
+        selected[i + 1] = prev
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Min and max of each of `n_out / 2` equal buckets (keeps every peak and dip)."""
+    n = len(y)
+    buckets = n_out // 2
+    if buckets < 1 or n_out >= n:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    picks = np.empty(2 * buckets, dtype=np.int64)
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        chunk = y[lo:hi]
+        picks[2 * i] = lo + int(chunk.argmin())
+        picks[2 * i + 1] = lo + int(chunk.argmax())
+    return np.unique(picks)
+
+
+def downsample_time_series(
+    df: pd.DataFrame,
+    max_points: int = DEFAULT_MAX_POINTS,
+    method: str = "lttb",
+) -> pd.DataFrame:
+    """Reduce every series (per plant) to at most `max_points` rows using a shape-preserving method."""
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}; use one of {DOWNSAMPLE_METHODS}.")
+    x_column = "period_start" if "period_start" in df.columns else "day"
+    if not max_points or x_column not in df.columns:
+        return df
+
+    frame = df.dropna(subset=["value", "series", x_column])
+    parts = []
+    for _, group in frame.groupby(_group_keys(frame), observed=True, sort=False):
+        if len(group) <= max_points:
+            parts.append(group)
+            continue
+        group = group.sort_values(x_column)
+        y = group["value"].to_numpy(dtype=np.float64)
+        if method == "lttb":
+            x = group[x_column].to_numpy().astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+            idx = lttb_indices(x, y, max_points)
+        else:
+            idx = minmax_indices(y, max_points)
+        parts.append(group.iloc[idx])
+    if not parts:
+        return frame
+    return pd.concat(parts, ignore_index=True)
+
+
+def attach_zoom_detail(
+    fig: go.Figure,
+    df: pd.DataFrame,
+    *,
+    max_points: int = DEFAULT_MAX_POINTS,
+    method: str = "lttb",
+) -> go.FigureWidget:
+    """Notebook helper: re-slice `df` at full resolution whenever the x-range changes.
+
+    Returns a FigureWidget (needs ipywidgets/anywidget); static HTML exports
+    keep the downsampled overview only.
+    """
+    import plotly.graph_objects as go
+
+    x_column = "period_start" if "period_start" in df.columns else "day"
+    frame = df.dropna(subset=["value", "series", x_column]).sort_values(x_column)
+    widget = go.FigureWidget(fig)
+
+    def _refresh(layout, x_range):
+        view = frame
+        if x_range and None not in x_range:
+            lo, hi = pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1])
+            view = frame[(frame[x_column] >= lo) & (frame[x_column] <= hi)]
+        view = downsample_time_series(view, max_points, method)
+        with widget.batch_update():
+            for trace in widget.data:
+                mask = np.ones(len(view), dtype=bool)
+                for column, value in trace.meta.items():
+                    mask &= (view[column] == value).to_numpy()
+                part = view[mask]
+                trace.x = part[x_column]
+                trace.y = part["value"]
+
+    widget.layout.on_change(_refresh, "xaxis.range")
+    return widget
+
+
 def build_figure(df: pd.DataFrame, *, slider: bool = True) -> go.Figure:
-    """Create a Plotly line chart grouped by series."""
+    """Create a Plotly line chart with one trace per series, or per (plant, series) for a fleet."""
+    import plotly.express as px
+
     x_column = "period_start" if "period_start" in df.columns else "day"
     required = {"value", "series", x_column}
     missing = required - set(df.columns)
@@ -108,21 +463,37 @@ def build_figure(df: pd.DataFrame, *, slider: bool = True) -> go.Figure:
         filtered = filtered.dropna(subset=[x_column])
         filtered = filtered.sort_values(x_column)
 
+    keys = _group_keys(filtered)
+    color = "series"
+    if "plant" in filtered.columns and filtered["plant"].nunique() > 1:
+        color = "trace"
+        filtered = filtered.assign(
+            trace=filtered["series"].astype(str) + " · " + filtered["plant"].astype(str)
+        )
+
     fig = px.line(
         filtered,
         x=x_column,
         y="value",
-        color="series",
+        color=color,
         markers=True,
         title="SEMS Plant Power Metrics",
         labels={
             x_column: "Period" if x_column == "period_start" else x_column.title(),
             "value": "Power [W]",
             "series": "Power_W",
+            "trace": "Series · plant",
         },
     )
 
     fig.update_layout(hovermode="x unified")
+    # Trace name -> the (plant,) series it shows; kept when aliases rename the legend.
+    owners = {
+        str(row[0]): {k: str(v) for k, v in zip(keys, row[1:])}
+        for row in filtered[[color, *keys]].drop_duplicates(color).itertuples(index=False)
+    }
+    for trace in fig.data:
+        trace.meta = owners.get(trace.name, {"series": trace.name})
 
     if slider:
         fig.update_xaxes(
@@ -143,13 +514,15 @@ def build_figure(df: pd.DataFrame, *, slider: bool = True) -> go.Figure:
 def apply_series_aliases(fig: go.Figure) -> go.Figure:
     """Rename legend entries using aliases if defined."""
     for trace in fig.data:
-        alias = SERIES_ALIASES.get(trace.name)
+        series = trace.meta.get("series", trace.name) if isinstance(trace.meta, dict) else trace.name
+        alias = SERIES_ALIASES.get(series)
         if not alias:
             continue
+        name = trace.name.replace(series, alias, 1)
         hovertemplate = trace.hovertemplate
         if hovertemplate:
-            hovertemplate = hovertemplate.replace(trace.name, alias)
-        trace.update(name=alias, legendgroup=alias, hovertemplate=hovertemplate)
+            hovertemplate = hovertemplate.replace(trace.name, name)
+        trace.update(name=name, legendgroup=name, hovertemplate=hovertemplate)
     return fig
 
 
@@ -170,30 +543,56 @@ def visualize(
     renderer: Optional[str] = None,
     show: bool = True,
     series: Optional[Sequence[str]] = None,
+    plants: Optional[Sequence[str]] = None,
     resample: Optional[str] = None,
     slider: bool = True,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+    max_points: Optional[int] = DEFAULT_MAX_POINTS,
+    downsample: str = "lttb",
+    zoom_detail: bool = False,
+    cache: bool = True,
 ) -> Tuple[pd.DataFrame, go.Figure]:
-    """Load the CSV, build the figure, and optionally display/save it."""
+    """Load the CSV/Parquet data, build the figure, and optionally display/save it.
+
+    Resample requests are served from the merger's rollups when a fresh one
+    fits. Each trace is downsampled to `max_points` (``None``/0 disables it); the
+    returned DataFrame keeps full resolution. With `zoom_detail` the figure is
+    a FigureWidget that re-fetches finer detail for the zoomed range.
+    `cache=False` bypasses the Arrow frame cache (see `load_dataset`).
+    """
     csv_path = Path(csv_path)
     if not csv_path.exists():
-        raise FileNotFoundError(f"CSV file not found: {csv_path}")
-
-    df = load_dataset(csv_path)
-
-    if series:
-        selected = set(series)
-        df = df[df["series"].isin(selected)]
-        if df.empty:
+        raise FileNotFoundError(f"Input not found: {csv_path}")
+
+    try:
+        with METRICS.timer("load_rollup"):
+            df = (load_rollup(csv_path, resample, series=series, start=start, end=end, plants=plants)
+                  if resample else None)
+        if df is None:
+            with METRICS.timer("load_dataset"):
+                df = load_dataset(csv_path, series=series, start=start, end=end, plants=plants, cache=cache)
+            if resample:
+                with METRICS.timer("resample"):
+                    df = resample_time_series(df, resample)
+    except ValueError:
+        if series or plants:
             raise ValueError(
-                "No rows remain after filtering for series: "
-                + ", ".join(sorted(selected))
-            )
-
-    if resample:
-        df = resample_time_series(df, resample)
-
-    fig = build_figure(df, slider=slider)
-    fig = apply_series_aliases(fig)
+                "No rows remain after filtering for "
+                + "; ".join(f"{label}: {', '.join(sorted(set(values)))}"
+                            for label, values in (("plants", plants), ("series", series)) if values)
+            ) from None
+        raise
+
+    with METRICS.timer("downsample"):
+        plotted = downsample_time_series(df, max_points, downsample) if max_points else df
+    with METRICS.timer("figure.build"):
+        fig = build_figure(plotted, slider=slider)
+        fig = apply_series_aliases(fig)
+    METRICS.count("points_loaded", len(df))
+    METRICS.count("points_plotted", len(plotted))
+    if zoom_detail:
+        fig = attach_zoom_detail(fig, df, max_points=max_points or DEFAULT_MAX_POINTS, method=downsample)
 
     if renderer is not None:
         from plotly import io as pio
@@ -203,7 +602,8 @@ def visualize(
     if output is not None:
         output = Path(output)
         output.parent.mkdir(parents=True, exist_ok=True)
-        fig.write_html(output)
+        with METRICS.timer("figure.write"):
+            fig.write_html(output)
         print(f"Saved figure to {output}")
 
     if show:
@@ -214,14 +614,14 @@ def visualize(
 
 def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description="Visualize SEMS plant power CSV data using Plotly."
+        description="Visualize SEMS plant power CSV or Parquet data using Plotly."
     )
     parser.add_argument(
         "csv_path",
         nargs="?",
         default=DEFAULT_CSV,
         type=Path,
-        help="Path to the plant_power_v2 CSV file",
+        help="Path to the plant_power_v2 CSV, a merged Parquet file, or a --dataset directory",
     )
     parser.add_argument(
         "--output",
@@ -249,31 +649,84 @@ def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
             "Series to include. Repeat the option or provide a comma-separated list."
         ),
     )
+    parser.add_argument(
+        "--plant",
+        action="append",
+        help=(
+            "Plant(s) to include from a fleet dataset. Repeat the option or provide a "
+            "comma-separated list; without it every plant gets its own traces."
+        ),
+    )
     parser.add_argument(
         "--resample",
         help=(
             "Pandas resample rule applied per series (e.g. '15min' for quarter-hour)."
         ),
     )
+    parser.add_argument(
+        "--start",
+        type=dt.date.fromisoformat,
+        help="First day to plot (YYYY-MM-DD); pushed down into Parquet reads.",
+    )
+    parser.add_argument(
+        "--end",
+        type=dt.date.fromisoformat,
+        help="Last day to plot (YYYY-MM-DD); pushed down into Parquet reads.",
+    )
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=DEFAULT_MAX_POINTS,
+        help="Maximum points per trace after downsampling; 0 plots every point (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--downsample",
+        choices=DOWNSAMPLE_METHODS,
+        default="lttb",
+        help="Shape-preserving downsampling method (default: %(default)s).",
+    )
     parser.add_argument(
         "--no-slider",
         action="store_true",
         help="Disable the x-axis range slider and quick range buttons.",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Load without the memory-mapped Arrow cache (SEMS_CACHE_DIR, default ~/.cache/sems).",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        help="Write per-stage timings (load, resample, figure) at the end; JSON for *.json, else OpenMetrics.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILERS,
+        help="Run under cProfile or pyinstrument and print the hottest calls.",
+    )
     return parser.parse_args(argv)
 
 
 def main(argv: Optional[Sequence[str]] = None) -> None:
     args = parse_args(argv)
-    visualize(
-        csv_path=args.csv_path,
-        output=args.output,
-        renderer=args.renderer,
-        show=not args.no_show,
-        series=_parse_series_args(args.series),
-        resample=args.resample,
-        slider=not args.no_slider,
-    )
+    with profiled(args.profile):
+        visualize(
+            csv_path=args.csv_path,
+            output=args.output,
+            renderer=args.renderer,
+            show=not args.no_show,
+            series=_parse_series_args(args.series),
+            plants=_parse_series_args(args.plant),
+            resample=args.resample,
+            slider=not args.no_slider,
+            start=args.start,
+            end=args.end,
+            max_points=args.max_points,
+            downsample=args.downsample,
+            cache=not args.no_cache,
+        )
+    finish_metrics(args.metrics)
 
 
 if __name__ == "__main__":